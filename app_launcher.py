@@ -168,4 +168,7 @@ def main():
         print("程序已退出")
 
 if __name__ == "__main__":
+    # 打包后文件解析进程池的子进程也由本程序启动，需要先交给 multiprocessing 处理
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -1,5 +1,6 @@
+import asyncio
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncGenerator
 
 from app.services.openai_service import OpenAIService
 from app.models.bidding import (
@@ -57,6 +58,39 @@ class BiddingAgent:
         """
         return await simulate_evaluation(tender_info, company_info, self.openai_service)
 
+    async def full_analysis(self, file_content: str, company_info: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        一次完成解析、风险分析、Go/No-Go 与评分模拟，按完成顺序产出结果事件
+
+        风险分析只依赖原文，与解析同时开始；Go/No-Go 与评分模拟在解析完成后并发执行。
+        事件格式：{"type": "tender_info" | "risk_analysis" | "go_nogo" | "scoring", "data": ...}
+        或 {"type": "error", "step": ..., "message": ...}
+        """
+        pending: Dict[asyncio.Task, str] = {
+            asyncio.create_task(self.parse_tender(file_content)): "tender_info",
+            asyncio.create_task(self.risk_analysis(file_content)): "risk_analysis",
+        }
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    step = pending.pop(task)
+                    if (error := task.exception()) is not None:
+                        yield {"type": "error", "step": step, "message": str(error)}
+                        if step == "tender_info":
+                            for skipped in ("go_nogo", "scoring"):
+                                yield {"type": "error", "step": skipped, "message": "招标文件解析失败，已跳过"}
+                        continue
+                    result = task.result()
+                    yield {"type": step, "data": result.model_dump(mode="json")}
+                    if step == "tender_info":
+                        pending[asyncio.create_task(self.analyze_bid(result, company_info))] = "go_nogo"
+                        pending[asyncio.create_task(self.scoring_simulation(result, company_info))] = "scoring"
+        finally:
+            # 客户端断开等提前结束时取消仍在进行的分析
+            for task in pending:
+                task.cancel()
+
     async def generate_response(self, outline: Dict[str, Any], tender_info: TenderInfo, company_info: str = ""):
         """
         投标文档内容生成
@@ -1,10 +1,13 @@
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List
+from app.config import settings
+from app.services.artifact_cache import artifact_cache, artifact_version, content_md5
 from app.services.openai_service import OpenAIService
 from app.models.bidding import (
     TenderInfo, RiskAnalysisResponse, GoNoGoDecision, 
-    ScoringSimulationResponse
+    ScoringSimulationResponse, RiskItem, RiskLevel
 )
+from app.utils.chunk_util import dedupe, dedupe_key, map_concurrently, split_document
 from app.utils.json_util import clean_json_string
 
 SYSTEM_PROMPT = """你是一个专业的投标文件编制助手，名为"标书助手"。你的职责是帮助企业分析招标文件并生成投标响应。"""
@@ -44,15 +47,27 @@ async def go_nogo_analysis(tender_info: TenderInfo, company_info: str, openai_se
         messages=messages,
         schema=schema,
         response_format={"type": "json_object"},
-        log_prefix="Tool-GoNoGo"
+        log_prefix="Tool-GoNoGo",
+        step="agent_gonogo"
     )
     
     data = json.loads(clean_json_string(response))
     return GoNoGoDecision(**data)
 
-async def detect_risk_clauses(tender_content: str, openai_service: OpenAIService) -> RiskAnalysisResponse:
-    """识别风险条款"""
-    prompt = f"""请对以下招标文件内容进行风险分析。识别其中的风险条款（如严苛的付款条件、不合理的工期、模糊的验收标准、高额违约金等）。
+RISK_SCHEMA = {
+    "overall_risk": "low",
+    "risks": [{
+        "clause": "示例条款",
+        "description": "示例描述",
+        "level": "low",
+        "suggestion": "示例建议"
+    }],
+    "summary": "示例综述"
+}
+
+RISK_LEVEL_ORDER = {level: i for i, level in enumerate(RiskLevel)}
+
+RISK_PROMPT = """请对以下招标文件内容进行风险分析。识别其中的风险条款（如严苛的付款条件、不合理的工期、模糊的验收标准、高额违约金等）。
 
 请返回JSON格式，包含：
 - overall_risk: 整体风险等级 (low, medium, high, critical)
@@ -63,19 +78,61 @@ async def detect_risk_clauses(tender_content: str, openai_service: OpenAIService
     - suggestion: 应对建议
 - summary: 风险综述
 
-招标文件内容片段：
-{tender_content[:15000]}
+{scope}：
+{content}
 """
-    schema = {
-        "overall_risk": "low",
-        "risks": [{
-            "clause": "示例条款",
-            "description": "示例描述",
-            "level": "low",
-            "suggestion": "示例建议"
-        }],
-        "summary": "示例综述"
-    }
+
+RISK_SUMMARY_PROMPT = """以下是对一份招标文件分段进行风险分析后合并去重的结果，请给出整体风险等级与风险综述。
+
+风险项：
+{risk_lines}
+
+各部分综述：
+{part_summaries}
+
+请返回JSON格式：
+- overall_risk: 整体风险等级 (low, medium, high, critical)
+- summary: 风险综述
+"""
+
+
+async def detect_risk_clauses(tender_content: str, openai_service: OpenAIService) -> RiskAnalysisResponse:
+    """识别风险条款
+
+    超过 analysis_chunk_chars 的文件按页切块并发识别，风险项去重合并后再汇总整体风险与综述。
+    结果按文件内容缓存，提示词或模型变化后自动失效。
+    """
+    md5 = content_md5(tender_content)
+    version = artifact_version(
+        SYSTEM_PROMPT, RISK_PROMPT, RISK_SUMMARY_PROMPT, RISK_SCHEMA, settings.analysis_chunk_chars,
+        *(openai_service.routed_model(step) for step in ("agent_risk", "agent_risk_map", "agent_risk_reduce")),
+    )
+    if (cached := await artifact_cache.aget(md5, "risk_analysis", version)) is not None:
+        return RiskAnalysisResponse(**cached)
+
+    chunks = split_document(tender_content, settings.analysis_chunk_chars) or [tender_content]
+    if len(chunks) == 1:
+        report = RiskAnalysisResponse(**await _detect_risk_chunk(chunks[0], openai_service))
+    else:
+        results = await map_concurrently(
+            chunks,
+            lambda i, chunk: _detect_risk_chunk(chunk, openai_service, part=(i + 1, len(chunks))),
+            settings.analysis_map_concurrency,
+        )
+        risks = dedupe(
+            [RiskItem(**risk) for result in results for risk in result.get("risks") or []],
+            key=lambda risk: dedupe_key(risk.clause),
+        )
+        risks.sort(key=lambda risk: RISK_LEVEL_ORDER[risk.level], reverse=True)
+        report = await _summarize_risks(risks, [result.get("summary", "") for result in results], openai_service)
+
+    await artifact_cache.aset(md5, "risk_analysis", version, report.model_dump(mode="json"))
+    return report
+
+
+async def _detect_risk_chunk(content: str, openai_service: OpenAIService, part: tuple[int, int] | None = None) -> Dict[str, Any]:
+    scope = f"招标文件第 {part[0]}/{part[1]} 部分" if part else "招标文件内容"
+    prompt = RISK_PROMPT.format(scope=scope, content=content)
     messages = [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": prompt}
@@ -83,13 +140,34 @@ async def detect_risk_clauses(tender_content: str, openai_service: OpenAIService
     
     response = await openai_service._generate_with_json_check(
         messages=messages,
-        schema=schema,
+        schema=RISK_SCHEMA,
         response_format={"type": "json_object"},
-        log_prefix="Tool-RiskAnalysis"
+        log_prefix="Tool-RiskAnalysis" + (f"[{part[0]}/{part[1]}]" if part else ""),
+        use_cache=True,
+        step="agent_risk_map" if part else "agent_risk"
     )
     
+    return json.loads(clean_json_string(response))
+
+
+async def _summarize_risks(risks: List[RiskItem], summaries: List[str], openai_service: OpenAIService) -> RiskAnalysisResponse:
+    """根据合并后的风险项生成整体风险等级与综述（只输入风险摘要，不再输入原文）"""
+    risk_lines = "\n".join(f"- [{risk.level.value}] {risk.clause}：{risk.description}" for risk in risks) or "无"
+    part_summaries = "\n".join(f"- {summary}" for summary in summaries if summary) or "无"
+    prompt = RISK_SUMMARY_PROMPT.format(risk_lines=risk_lines, part_summaries=part_summaries)
+    response = await openai_service._generate_with_json_check(
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        schema={"overall_risk": "low", "summary": "示例综述"},
+        response_format={"type": "json_object"},
+        log_prefix="Tool-RiskAnalysis[汇总]",
+        use_cache=True,
+        step="agent_risk_reduce"
+    )
     data = json.loads(clean_json_string(response))
-    return RiskAnalysisResponse(**data)
+    return RiskAnalysisResponse(overall_risk=data["overall_risk"], risks=risks, summary=data["summary"])
 
 async def simulate_evaluation(tender_info: TenderInfo, company_info: str, openai_service: OpenAIService) -> ScoringSimulationResponse:
     """模拟评分"""
@@ -131,7 +209,8 @@ async def simulate_evaluation(tender_info: TenderInfo, company_info: str, openai
         messages=messages,
         schema=schema,
         response_format={"type": "json_object"},
-        log_prefix="Tool-Scoring"
+        log_prefix="Tool-Scoring",
+        step="agent_scoring"
     )
     
     data = json.loads(clean_json_string(response))
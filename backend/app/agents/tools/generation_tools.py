@@ -5,7 +5,7 @@ from app.models.bidding import TenderInfo
 async def generate_doc(openai_service: OpenAIService, prompt: str) -> str:
     """通用文档生成工具"""
     messages = [{"role": "user", "content": prompt}]
-    return await openai_service._collect_stream_text(messages)
+    return await openai_service._collect_stream_text(messages, step="agent_generate")
 
 async def generate_technical_response(
     outline: Dict[str, Any], 
@@ -1,8 +1,12 @@
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List
+from app.config import settings
+from app.services.artifact_cache import artifact_cache, artifact_version, content_md5
 from app.services.openai_service import OpenAIService
 from app.models.bidding import TenderInfo
+from app.utils.chunk_util import dedupe, map_concurrently, split_document
 from app.utils.json_util import clean_json_string
+from app.utils.tender_extract import EXTRACTOR_VERSION, extract_tender_fields, locate_sections
 
 SYSTEM_PROMPT = """你是一个专业的投标文件编制助手，名为"标书助手"。你的职责是帮助企业分析招标文件并生成投标响应。"""
 
@@ -27,9 +31,22 @@ async def read_tender_file(file_path: str) -> str:
         print(f"读取文件失败: {e}")
         return ""
 
-async def parse_tender_structure(file_content: str, openai_service: OpenAIService) -> TenderInfo:
-    """解析招标文件结构"""
-    prompt = f"""请分析以下招标文件内容，提取关键信息并以JSON格式返回。
+# 解析结果的示例模版（check_json 基于结构对比）
+TENDER_SCHEMA = {
+    "project_name": "示例项目名称",
+    "project_number": "示例编号",
+    "tender_deadline": "2023-01-01",
+    "budget": "100万元",
+    "purchaser": "示例采购人",
+    "agency": "示例代理机构",
+    "qualifications": ["资格要求1"],
+    "evaluation_method": "综合评分法",
+    "technical_requirements": ["技术要求1"]
+}
+
+TENDER_LIST_FIELDS = ("qualifications", "technical_requirements")
+
+PARSE_TENDER_PROMPT = """请分析以下招标文件内容，提取关键信息并以JSON格式返回。
         
 需提取字段说明：
 - project_name: 项目名称 (必填)
@@ -44,22 +61,69 @@ async def parse_tender_structure(file_content: str, openai_service: OpenAIServic
 
 对于未提及的信息，请统一使用空字符串 "" 或空列表 []，不要使用 null。
 
-招标文件内容片段（仅展示前15000字符）：
-{file_content[:15000]} 
+{scope}：
+{content}
 """
-    # 使用实例模版替代 model_json_schema，因为 check_json 是基于结构对比的
-    schema = {
-        "project_name": "示例项目名称",
-        "project_number": "示例编号",
-        "tender_deadline": "2023-01-01",
-        "budget": "100万元",
-        "purchaser": "示例采购人",
-        "agency": "示例代理机构",
-        "qualifications": ["资格要求1"],
-        "evaluation_method": "综合评分法",
-        "technical_requirements": ["技术要求1"]
-    }
-    
+
+PREFILLED_HINT = """以下字段已从全文中按规则提取，直接沿用即可：
+{known}
+
+"""
+
+
+async def parse_tender_structure(file_content: str, openai_service: OpenAIService) -> TenderInfo:
+    """解析招标文件结构
+
+    先用规则从全文提取固定格式字段，并定位资格要求、评标办法、技术规范所在页，只把这些页发给 LLM；
+    摘录仍超过 analysis_chunk_chars 时按页切块并发提取，再合并为一份 TenderInfo。
+    结果按文件内容缓存，提示词或模型变化后自动失效。
+    """
+    md5 = content_md5(file_content)
+    version = artifact_version(
+        SYSTEM_PROMPT, PARSE_TENDER_PROMPT, PREFILLED_HINT, TENDER_SCHEMA, settings.analysis_chunk_chars,
+        settings.tender_preextract and EXTRACTOR_VERSION,
+        openai_service.routed_model("agent_parse"), openai_service.routed_model("agent_parse_map"),
+    )
+    if (cached := await artifact_cache.aget(md5, "tender_info", version)) is not None:
+        return TenderInfo(**cached)
+
+    prefilled: Dict[str, str] = {}
+    content = file_content
+    if settings.tender_preextract:
+        prefilled = extract_tender_fields(file_content)
+        content, sections = locate_sections(file_content)
+        print(f"规则预提取: 字段 {list(prefilled)}，章节页 {sections}，发送 {len(content)}/{len(file_content)} 字")
+
+    chunks = split_document(content, settings.analysis_chunk_chars) or [content]
+    if len(chunks) == 1:
+        results = [await _parse_tender_chunk(chunks[0], openai_service, prefilled=prefilled)]
+    else:
+        results = await map_concurrently(
+            chunks,
+            lambda i, chunk: _parse_tender_chunk(chunk, openai_service, part=(i + 1, len(chunks)), prefilled=prefilled),
+            settings.analysis_map_concurrency,
+        )
+    # 规则提取的是原文中的"标签：值"，比 LLM 的转述更可靠，优先采用
+    tender_info = merge_tender_info([prefilled, *results])
+
+    await artifact_cache.aset(md5, "tender_info", version, tender_info.model_dump(mode="json"))
+    return tender_info
+
+
+async def _parse_tender_chunk(
+    content: str,
+    openai_service: OpenAIService,
+    part: tuple[int, int] | None = None,
+    prefilled: Dict[str, str] | None = None,
+) -> Dict[str, Any]:
+    if part:
+        scope = f"招标文件第 {part[0]}/{part[1]} 部分（只提取本部分中出现的信息）"
+    else:
+        scope = "招标文件内容"
+    if prefilled:
+        known = "\n".join(f"- {field}: {value}" for field, value in prefilled.items())
+        scope = PREFILLED_HINT.format(known=known) + scope
+    prompt = PARSE_TENDER_PROMPT.format(scope=scope, content=content)
     messages = [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": prompt}
@@ -67,13 +131,26 @@ async def parse_tender_structure(file_content: str, openai_service: OpenAIServic
     
     response = await openai_service._generate_with_json_check(
         messages=messages,
-        schema=schema,
+        schema=TENDER_SCHEMA,
         response_format={"type": "json_object"},
-        log_prefix="Tool-ParseTender"
+        log_prefix="Tool-ParseTender" + (f"[{part[0]}/{part[1]}]" if part else ""),
+        use_cache=True,
+        step="agent_parse_map" if part else "agent_parse"
     )
     
-    data = json.loads(clean_json_string(response))
-    return TenderInfo(**data)
+    return json.loads(clean_json_string(response))
+
+
+def merge_tender_info(results: List[Dict[str, Any]]) -> TenderInfo:
+    """合并各分块的解析结果：单值字段取最先出现的非空值（封面与公告通常在前），列表字段去重合并"""
+    merged: Dict[str, Any] = {}
+    for field in TENDER_SCHEMA:
+        if field in TENDER_LIST_FIELDS:
+            merged[field] = dedupe([item for result in results for item in result.get(field) or [] if item])
+        else:
+            merged[field] = next((str(value).strip() for result in results if (value := result.get(field)) and str(value).strip()), "")
+    return TenderInfo(**merged)
+
 
 async def extract_key_fields(tender_info: TenderInfo) -> Dict[str, Any]:
     """提取关键字段 (辅助工具)"""
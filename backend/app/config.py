@@ -11,6 +11,10 @@ class Settings(BaseSettings):
     app_version: str = "2.0.0"
     debug: bool = False
     
+    # 后端（uvicorn）worker 进程数，run.py 多 worker 启动时自动设置；
+    # 下方注明"所有进程合计"的额度与资源上限按该进程数平分到每个进程
+    worker_processes: int = 1
+
     cors_origins: list = [
         f"http://{host}:{port}" 
         for host in ["localhost", "127.0.0.1"] 
@@ -26,9 +30,82 @@ class Settings(BaseSettings):
     ollama_base_url: str = "http://localhost:11434"
     ollama_embedding_model: str = "nomic-embed-text"
 
+    # LLM HTTP 连接池（所有 OpenAIService 共享）
+    llm_max_connections: int = 200
+    llm_max_keepalive_connections: int = 50
+    llm_keepalive_expiry: float = 60.0
+    llm_http2: bool = True
+    llm_connect_timeout: float = 10.0
+    llm_request_timeout: float = 600.0
+    # 按 (api_key, base_url) 保留的客户端数，超出后把最久未使用的移出池（不主动关闭，仍在使用它的请求照常完成）
+    llm_max_clients: int = 4
+
+    # LLM 响应缓存（内存 LRU + 磁盘），请求头 X-LLM-Cache: bypass 可绕过
+    llm_cache_enabled: bool = True
+    llm_cache_dir: str = str(Path.home() / ".ai_write_helper" / "llm_cache")
+    llm_cache_ttl: int = 7 * 24 * 3600
+    llm_cache_max_memory_entries: int = 256
+    llm_cache_max_disk_entries: int = 5000
+
+    # 招标文件派生结果缓存（TenderInfo、分析报告等），按文件内容 MD5 + 提示词版本 + 模型寻址
+    artifact_cache_enabled: bool = True
+    artifact_cache_dir: str = str(Path.home() / ".ai_write_helper" / "artifacts")
+
+    # LLM 全局调度：RPM/TPM 预算（0 为不限制）与 AIMD 自适应并发
+    # RPM/TPM 是所有后端进程合计的值，每个进程按 worker_processes 平分（调度状态不跨进程共享）；
+    # 并发上限（initial/min/max_concurrency）是每个进程各自的值，遇到 429 时由 AIMD 自行收缩
+    llm_rpm_limit: int = 0
+    llm_tpm_limit: int = 0
+    llm_initial_concurrency: int = 16
+    llm_min_concurrency: int = 1
+    llm_max_concurrency: int = 32
+    llm_max_retries: int = 3
+    llm_base_backoff: float = 1.0
+    llm_max_backoff: float = 30.0
+    # 流式请求附带 stream_options.include_usage 以获取真实 token 用量（上游不支持时自动关闭）
+    llm_stream_usage: bool = True
+    # 合并同时进行的相同 LLM 请求（相同模型、messages 与参数），只向上游调用一次
+    llm_singleflight_enabled: bool = True
+
+    # 章节生成的提示词布局：prefix 将系统提示与项目概述放在固定前缀中以命中服务商的前缀缓存，legacy 为原布局
+    chapter_prompt_layout: str = "prefix"
+    # 长招标文件按页/表格切块后并发提取再合并：每块字符数上限与同时分析的块数
+    analysis_chunk_chars: int = 15000
+    analysis_map_concurrency: int = 8
+    # 解析招标文件前用规则提取固定格式字段并定位相关章节，只把相关页发给 LLM
+    tender_preextract: bool = True
+    # 整份目录内容生成时同时进行的叶子章节数
+    content_generation_concurrency: int = 8
+    # 可续跑的生成任务与后台任务队列的存储（SQLite）
+    job_db_path: str = str(Path.home() / ".ai_write_helper" / "jobs.db")
+    # 后台任务队列：每个进程的 worker 数、最大尝试次数与重试退避（秒）
+    task_workers: int = 2
+    task_max_attempts: int = 3
+    task_base_backoff: float = 2.0
+    task_max_backoff: float = 60.0
+    # PDF/Word 解析进程池：所有后端进程合计的解析 worker 进程数（每个后端进程按 worker_processes 平分，至少 1 个）、
+    # 单个解析任务超时（秒）与每个 worker 的内存上限（MB，0 为不限制）
+    extraction_workers: int = 4
+    extraction_timeout: float = 300.0
+    extraction_memory_limit_mb: int = 4096
+    # 大 PDF 按此页数切成多段并行提取
+    extraction_shard_pages: int = 16
+    # 扫描页 OCR 流水线：待识别页图片的队列长度、同时进行的 OCR 请求数、每批渲染的页数与并行渲染的批数
+    ocr_queue_size: int = 8
+    ocr_max_in_flight: int = 8
+    ocr_render_batch: int = 4
+    ocr_render_workers: int = 2
+
     class Config:
         env_file = ".env"
 
 
+def per_process_share(value: int, processes: int | None = None) -> int:
+    """把所有后端进程合计的额度平分到每个进程；0（不限制）保持为 0，平分后至少为 1"""
+    if value <= 0:
+        return 0
+    return max(1, value // max(1, processes or settings.worker_processes))
+
+
 settings = Settings()
 Path(settings.upload_dir).mkdir(parents=True, exist_ok=True)
\ No newline at end of file
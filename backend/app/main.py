@@ -1,5 +1,7 @@
+import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any
+from typing import Any, AsyncIterator
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -7,12 +9,37 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
 from .config import settings
-from .routers import config, document, outline, content, search, expand, bidding
+from .routers import config, document, outline, content, search, expand, bidding, jobs
+from .services.artifact_cache import artifact_cache
+from .services.extraction_pool import extraction_pool
+from .services.generation_job_service import generation_job_service
+from .services.llm_cache import llm_cache
+from .services.llm_metrics import llm_metrics
+from .services.llm_scheduler import llm_scheduler
+from .services.llm_singleflight import llm_singleflight
+from .services.openai_client_pool import client_pool
+from .services.task_queue import task_queue
+from .utils.request_context import RequestContextMiddleware
+from .utils.sse import disconnect_stats
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # 启动后台任务 worker，继续执行上次关闭时未完成的任务
+    task_queue.start()
+    yield
+    # 中止本进程的生成任务（已完成章节均已落盘，可续跑）与后台任务（放回队列），再关闭解析进程池与共享的 LLM 连接池
+    await generation_job_service.shutdown()
+    await task_queue.shutdown()
+    extraction_pool.shutdown()
+    await client_pool.close_all()
+
 
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
-    description="基于FastAPI的AI写标书助手后端API"
+    description="基于FastAPI的AI写标书助手后端API",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -22,8 +49,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestContextMiddleware)
 
-routers = [config, document, outline, content, search, expand, bidding]
+routers = [config, document, outline, content, search, expand, bidding, jobs]
 for router in routers:
     app.include_router(router.router)
 
@@ -35,10 +63,29 @@ async def health_check() -> dict[str, str]:
         "version": settings.app_version
     }
 
+@app.get("/metrics")
+async def metrics(reset: bool = False) -> dict[str, Any]:
+    """LLM 调用遥测：按接口与调用步骤汇总 token、延迟与重试，并附带缓存、调度与连接池统计"""
+    await llm_metrics.flush()
+    data = {
+        "llm": llm_metrics.snapshot(),
+        "cache": llm_cache.stats(),
+        "artifacts": artifact_cache.stats(),
+        "singleflight": llm_singleflight.stats(),
+        "scheduler": llm_scheduler.stats(),
+        "connection_pool": client_pool.stats(),
+        "tasks": await asyncio.to_thread(task_queue.stats),
+        "extraction": extraction_pool.stats(),
+        "sse": dict(disconnect_stats),
+    }
+    if reset:
+        llm_metrics.reset()
+    return data
+
 app.mount("/api/uploads", StaticFiles(directory=settings.upload_dir), name="uploads")
 
 static_path = Path("static")
-API_PREFIXES = ["api/", "docs", "health"]
+API_PREFIXES = ["api/", "docs", "health", "metrics"]
 
 if static_path.exists():
     app.mount("/static", StaticFiles(directory="static/static"), name="static")
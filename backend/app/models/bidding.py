@@ -59,6 +59,10 @@ class ScoringSimulationResponse(BaseModel):
 class ParseTenderRequest(BaseModel):
     file_content: str = Field(..., description="招标文件文本内容")
 
+class FullAnalysisRequest(BaseModel):
+    file_content: str = Field(..., description="招标文件文本内容")
+    company_info: str = Field(..., description="企业介绍/资质/案例库信息")
+
 class AnalysisRequest(BaseModel):
     tender_info: TenderInfo = Field(..., description="招标文件信息")
     company_info: str = Field(..., description="企业介绍/资质/案例库信息")
@@ -4,6 +4,16 @@ from typing import List, Optional, Dict, Any
 from enum import Enum
 
 
+class ModelRoute(BaseModel):
+    """单类任务的模型路由，未设置的字段沿用全局配置与调用方默认值"""
+    model_config = {"protected_namespaces": ()}
+
+    model: Optional[str] = Field(None, description="模型名称")
+    max_tokens: Optional[int] = Field(None, ge=1, description="最大输出 token 数")
+    temperature: Optional[float] = Field(None, ge=0, le=2, description="采样温度")
+    concurrency: Optional[int] = Field(None, ge=1, description="该类任务同时进行的 LLM 调用上限")
+
+
 class ConfigRequest(BaseModel):
     """OpenAI配置请求"""
     model_config = {"protected_namespaces": ()}
@@ -11,6 +21,10 @@ class ConfigRequest(BaseModel):
     api_key: str = Field(..., description="OpenAI API密钥")
     base_url: Optional[str] = Field(None, description="Base URL")
     model_name: str = Field("gpt-3.5-turbo", description="模型名称")
+    model_routes: Optional[Dict[str, ModelRoute]] = Field(
+        None,
+        description="按任务类型的模型路由，键如 ocr、outline_l1、outline_l2、chapter、expand、analyze、agent（或 agent_parse 等具体工具）",
+    )
 
 
 class ConfigResponse(BaseModel):
@@ -85,11 +99,13 @@ class OutlineRequest(BaseModel):
     uploaded_expand: Optional[bool] = Field(False, description="是否已上传方案扩写文件")
     old_outline: Optional[str] = Field(None, description="上传的方案扩写文件解析出的旧目录JSON")
     old_document: Optional[str] = Field(None, description="上传的方案扩写文件解析出的旧文档")
+    chapter_stream: Optional[bool] = Field(False, description="按章节流式返回（每完成一章立即推送，而非整体完成后分片回放）")
 
 class ContentGenerationRequest(BaseModel):
     """内容生成请求"""
     outline: Dict[str, Any] = Field(..., description="目录结构")
     project_overview: str = Field("", description="项目概述")
+    concurrency: Optional[int] = Field(None, ge=1, le=64, description="同时生成的叶子章节数，默认使用服务端配置")
 
 
 class ChapterContentRequest(BaseModel):
@@ -1,11 +1,15 @@
+import json
 import traceback
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from app.agents.bidding_agent import BiddingAgent
 from app.models.bidding import (
     ParseTenderRequest, TenderInfo, 
     RiskAnalysisResponse, AnalysisRequest, 
-    GoNoGoDecision, ScoringSimulationResponse
+    GoNoGoDecision, ScoringSimulationResponse,
+    FullAnalysisRequest
 )
+from app.utils.sse import sse_response, with_heartbeat
 
 router = APIRouter(
     prefix="/api/bidding",
@@ -57,3 +61,17 @@ async def scoring_simulation(request: AnalysisRequest, agent: BiddingAgent = Dep
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"模拟失败: {str(e)}")
 
+@router.post("/full-analysis")
+async def full_analysis(request: FullAnalysisRequest, http_request: Request, agent: BiddingAgent = Depends(get_bidding_agent)) -> StreamingResponse:
+    """一次完成解析、风险分析、Go/No-Go 与评分模拟，每项完成即通过 SSE 推送"""
+    async def generate():
+        try:
+            events = agent.full_analysis(request.file_content, request.company_info)
+            async for event in with_heartbeat(events, heartbeat={"type": "heartbeat"}, interval=5.0):
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            traceback.print_exc()
+            yield f"data: {json.dumps({'type': 'error', 'message': str(e)}, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return sse_response(generate(), request=http_request)
@@ -1,8 +1,11 @@
 """配置相关API路由"""
 from fastapi import APIRouter, HTTPException
 from ..models.schemas import ConfigRequest, ConfigResponse
+from ..services.llm_cache import llm_cache
+from ..services.llm_scheduler import llm_scheduler
 from ..services.openai_service import OpenAIService
 from ..utils.config_manager import config_manager
+from ..utils.sse import disconnect_stats
 
 router = APIRouter(prefix="/api/config", tags=["配置管理"])
 
@@ -11,10 +14,14 @@ router = APIRouter(prefix="/api/config", tags=["配置管理"])
 async def save_config(config: ConfigRequest) -> ConfigResponse:
     """保存OpenAI配置"""
     try:
+        model_routes = None
+        if config.model_routes is not None:
+            model_routes = {task: route.model_dump(exclude_none=True) for task, route in config.model_routes.items()}
         success = config_manager.save_config(
             api_key=config.api_key,
             base_url=config.base_url or "",
-            model_name=config.model_name
+            model_name=config.model_name,
+            model_routes=model_routes
         )
         
         return ConfigResponse(
@@ -80,4 +87,26 @@ async def get_available_models(config: ConfigRequest) -> dict:
             "success": False,
             "data": [],
             "message": f"获取模型列表失败: {e}"
-        }
\ No newline at end of file
+        }
+
+
+@router.get("/llm-cache")
+async def get_llm_cache_stats() -> dict:
+    """获取 LLM 响应缓存的命中统计"""
+    return {"success": True, "data": llm_cache.stats()}
+
+
+@router.delete("/llm-cache")
+async def clear_llm_cache() -> dict:
+    """清空 LLM 响应缓存"""
+    try:
+        await llm_cache.clear()
+        return {"success": True, "message": "缓存已清空"}
+    except Exception as e:
+        return {"success": False, "message": f"清空缓存失败: {e}"}
+
+
+@router.get("/llm-scheduler")
+async def get_llm_scheduler_stats() -> dict:
+    """获取 LLM 调度器的并发、重试与客户端断开统计"""
+    return {"success": True, "data": {**llm_scheduler.stats(), "client_disconnects": disconnect_stats["disconnects"]}}
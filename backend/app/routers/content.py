@@ -2,12 +2,12 @@
 import json
 from typing import AsyncGenerator
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 
-from ..models.schemas import ChapterContentRequest
+from ..models.schemas import ChapterContentRequest, ContentGenerationRequest
 from ..services.openai_service import OpenAIService
 from ..utils.config_manager import config_manager
-from ..utils.sse import sse_response
+from ..utils.sse import sse_response, with_heartbeat
 
 router = APIRouter(prefix="/api/content", tags=["内容管理"])
 
@@ -26,14 +26,12 @@ async def generate_chapter_content(request: ChapterContentRequest):
         openai_service = OpenAIService()
         
         # 生成单章节内容
-        content = ""
-        async for chunk in openai_service._generate_chapter_content(
+        content = await openai_service._collect_chapter_content(
             chapter=request.chapter,
             parent_chapters=request.parent_chapters,
             sibling_chapters=request.sibling_chapters,
             project_overview=request.project_overview
-        ):
-            content += chunk
+        )
         
         return {"success": True, "content": content}
         
@@ -42,7 +40,7 @@ async def generate_chapter_content(request: ChapterContentRequest):
 
 
 @router.post("/generate-chapter-stream")
-async def generate_chapter_content_stream(request: ChapterContentRequest):
+async def generate_chapter_content_stream(request: ChapterContentRequest, http_request: Request):
     """流式为单个章节生成内容"""
     try:
         # 加载配置
@@ -79,7 +77,43 @@ async def generate_chapter_content_stream(request: ChapterContentRequest):
             # 发送结束信号
             yield "data: [DONE]\n\n"
         
-        return sse_response(generate())
+        return sse_response(generate(), request=http_request)
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"章节内容生成失败: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"章节内容生成失败: {e}")
+
+
+@router.post("/generate-outline-stream")
+async def generate_outline_content_stream(request: ContentGenerationRequest, http_request: Request):
+    """并发生成整份目录的章节内容，逐章流式返回进度，最后返回完整目录"""
+    try:
+        # 加载配置
+        config = config_manager.load_config()
+        
+        if not config.get('api_key'):
+            raise HTTPException(status_code=400, detail="请先配置OpenAI API密钥")
+
+        # 创建OpenAI服务实例
+        openai_service = OpenAIService()
+        
+        async def generate() -> AsyncGenerator[str, None]:
+            try:
+                events = openai_service.generate_content_for_outline_stream(
+                    request.outline,
+                    project_overview=request.project_overview,
+                    concurrency=request.concurrency
+                )
+                async for event in with_heartbeat(events, heartbeat={"type": "heartbeat"}, interval=5.0):
+                    yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            except Exception as e:
+                yield f"data: {json.dumps({'type': 'error', 'message': str(e)}, ensure_ascii=False)}\n\n"
+            
+            # 发送结束信号
+            yield "data: [DONE]\n\n"
+        
+        return sse_response(generate(), request=http_request)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"目录内容生成失败: {e}")
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import io
 import re
@@ -10,14 +11,15 @@ from docx.shared import Pt, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
 from fastapi.responses import StreamingResponse
 
 from ..models.schemas import FileUploadResponse, AnalysisRequest, AnalysisType, WordExportRequest
 from ..services.file_service import FileService
 from ..services.openai_service import OpenAIService
+from ..services.task_queue import task_queue
 from ..utils.config_manager import config_manager
-from ..utils.sse import sse_response
+from ..utils.sse import sse_response, with_heartbeat
 
 router = APIRouter(prefix="/api/document", tags=["文档处理"])
 
@@ -124,22 +126,26 @@ def parse_markdown_blocks(content: str) -> list:
     return blocks
 
 
+UPLOAD_ALLOWED_EXTS = {".pdf", ".docx", ".doc", ".docm"}
+UPLOAD_ALLOWED_TYPES = {
+    "application/pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/msword",
+    "application/vnd.ms-word.document.macroEnabled.12",
+    "application/octet-stream"
+}
+
+
+def is_supported_upload(file: UploadFile) -> bool:
+    ext = Path(file.filename or "").suffix.lower()
+    return file.content_type in UPLOAD_ALLOWED_TYPES or ext in UPLOAD_ALLOWED_EXTS
+
+
 @router.post("/upload", response_model=FileUploadResponse)
 async def upload_file(file: UploadFile = File(...)) -> FileUploadResponse:
     try:
-        allowed_exts = {".pdf", ".docx", ".doc", ".docm"}
-        allowed_types = {
-            "application/pdf",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            "application/msword",
-            "application/vnd.ms-word.document.macroEnabled.12",
-            "application/octet-stream"
-        }
-        
         filename = file.filename or ""
-        ext = Path(filename).suffix.lower()
-        
-        if file.content_type not in allowed_types and ext not in allowed_exts:
+        if not is_supported_upload(file):
             return FileUploadResponse(
                 success=False,
                 message="不支持的文件类型，请上传 PDF 或 Word (.docx) 文档"
@@ -163,8 +169,31 @@ async def upload_file(file: UploadFile = File(...)) -> FileUploadResponse:
         )
 
 
+@router.post("/upload-async")
+async def upload_file_async(file: UploadFile = File(...), vectorize: bool = Form(False)) -> dict:
+    """保存文件后立即返回任务ID，文本提取（含 OCR）在后台任务队列中进行
+
+    通过 /api/jobs/tasks/{task_id} 查询或 /api/jobs/tasks/{task_id}/stream 订阅，完成后结果中包含 file_content 与 file_url。
+    vectorize 为真时，提取完成后再提交一个 document.vectorize 任务把文本写入向量库。
+    """
+    if not is_supported_upload(file):
+        raise HTTPException(status_code=400, detail="不支持的文件类型，请上传 PDF 或 Word (.docx) 文档")
+    try:
+        file_path, is_existing_file = await FileService.store_upload(file)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"文件保存失败: {e}")
+    task_id = await task_queue.submit("document.process", {
+        "file_path": str(file_path),
+        "filename": file.filename or "",
+        "content_type": file.content_type,
+        "is_existing": is_existing_file,
+        "vectorize": vectorize,
+    })
+    return {"success": True, "data": await task_queue.get_status(task_id)}
+
+
 @router.post("/analyze-stream")
-async def analyze_document_stream(request: AnalysisRequest) -> StreamingResponse:
+async def analyze_document_stream(request: AnalysisRequest, http_request: Request) -> StreamingResponse:
     """流式分析文档内容"""
     try:
         config = config_manager.load_config()
@@ -240,14 +269,16 @@ async def analyze_document_stream(request: AnalysisRequest) -> StreamingResponse
                 AnalysisType.STRUCTURAL: "结构化解析"
             }
             analysis_type_cn = mapping.get(request.analysis_type, "分析")
-            user_prompt = f"请分析以下招标文件内容，提取{analysis_type_cn}信息：\n\n{request.file_content}"
-            
-            messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
-            async for chunk in openai_service.stream_chat_completion(messages, temperature=0.3):
-                yield f"data: {json.dumps({'chunk': chunk}, ensure_ascii=False)}\n\n"
+            chunks = openai_service.stream_document_analysis(
+                system_prompt, request.file_content, analysis_type_cn, step=f"analyze_{request.analysis_type.value}"
+            )
+            # 长文件分块提取阶段没有输出，用心跳保持连接
+            async for chunk in with_heartbeat(chunks, heartbeat={"type": "heartbeat"}, interval=5.0):
+                event = chunk if isinstance(chunk, dict) else {"chunk": chunk}
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
             yield "data: [DONE]\n\n"
         
-        return sse_response(generate())
+        return sse_response(generate(), request=http_request)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"文档分析失败: {e}")
@@ -257,141 +288,147 @@ async def analyze_document_stream(request: AnalysisRequest) -> StreamingResponse
 async def export_word(request: WordExportRequest) -> StreamingResponse:
     """根据目录数据导出Word文档（标准标书整合版）"""
     try:
-        doc = docx.Document()
-        
-        # 1. 基础样式优化
-        styles = doc.styles
-        for name in ["Normal", "Heading 1", "Heading 2", "Heading 3", "Title"]:
-            if name in styles:
-                style = styles[name]
-                style.font.name = "宋体"
-                if style._element.rPr is None: style._element._add_rPr()
-                style._element.rPr.rFonts.set(qn("w:eastAsia"), "宋体")
-                
-                if name == "Normal":
-                    style.font.size = Pt(12)  # 小四
-                    style.paragraph_format.line_spacing_rule = WD_LINE_SPACING.ONE_POINT_FIVE
-                    style.paragraph_format.space_after = Pt(6)
-                elif name == "Heading 1":
-                    style.font.size = Pt(16)
-                    style.font.bold = True
-                    style.paragraph_format.space_before = Pt(12)
-                    style.paragraph_format.space_after = Pt(6)
-                elif name == "Heading 2":
-                    style.font.size = Pt(14)
-                    style.font.bold = True
-                    style.paragraph_format.space_before = Pt(10)
-                    style.paragraph_format.space_after = Pt(4)
-
-        # 2. 标书封面生成
-        doc.add_paragraph("\n\n\n")
-        title_p = doc.add_paragraph()
-        title_run = title_p.add_run("投 标 文 件")
-        title_run.bold, title_run.font.size = True, Pt(42)
-        set_font(title_run)
-        title_p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        doc.add_paragraph("\n")
-        tech_p = doc.add_paragraph()
-        tech_run = tech_p.add_run("（技 术 部 分）")
-        tech_run.font.size = Pt(22)
-        set_font(tech_run)
-        tech_p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        doc.add_paragraph("\n\n\n\n")
-        
-        # 封面信息表格
-        info_table = doc.add_table(rows=4, cols=2)
-        info_table.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        labels = ["项 目 名 称：", "项目编号：", "投 标 人：", "日    期："]
-        values = [
-            request.project_name or "————",
-            request.project_number or "————",
-            request.bidder_name or "————",
-            request.bid_date or "202X年XX月XX日"
-        ]
-        for i in range(4):
-            cell_l = info_table.cell(i, 0)
-            cell_l.text = labels[i]
-            p_l = cell_l.paragraphs[0]
-            p_l.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-            set_paragraph_font(p_l, 14)
-            
-            cell_v = info_table.cell(i, 1)
-            cell_v.text = values[i]
-            p_v = cell_v.paragraphs[0]
-            set_paragraph_font(p_v, 14)
-            for run in p_v.runs: run.underline = True
-
-        doc.add_page_break()
-
-        # 3. 页码设置 (从目录页开始)
-        for section in doc.sections:
-            footer = section.footer
-            footer_para = footer.paragraphs[0] if footer.paragraphs else footer.add_paragraph()
-            footer_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            run = footer_para.add_run()
-            set_font(run, 9)
-            add_page_number(run)
-
-        # 4. 目录页
-        doc.add_heading("目  录", level=1).alignment = WD_ALIGN_PARAGRAPH.CENTER
-        doc.add_paragraph()
-        
-        def add_toc_item(items, level=1):
-            for item in items:
-                toc_p = doc.add_paragraph()
-                toc_p.paragraph_format.left_indent = Inches(0.2 * (level - 1))
-                toc_run = toc_p.add_run(f"{item.id} {item.title}")
-                set_font(toc_run, 10.5)
-                if level == 1: toc_run.bold = True
-                if item.children: add_toc_item(item.children, level + 1)
-        
-        add_toc_item(request.outline)
-        doc.add_page_break()
-
-        # 5. 项目概述
-        if request.project_overview:
-            h = doc.add_heading("项目概述", level=1)
-            set_paragraph_font(h)
-            render_markdown_blocks(doc, parse_markdown_blocks(request.project_overview))
-
-        def add_outline_items(items: list, level: int = 1) -> None:
-            for item in items:
-                if level == 1:
-                    doc.add_page_break()
-                h = doc.add_heading(f"{item.id} {item.title}", level=min(level, 3))
-                set_paragraph_font(h)
-                if not item.children:
-                    if c := (item.content or "").strip(): 
-                        render_markdown_blocks(doc, parse_markdown_blocks(c))
-                else:
-                    add_outline_items(item.children, level + 1)
-
-        add_outline_items(request.outline)
-
-        # 7. 落款与盖章页
-        doc.add_page_break()
-        doc.add_paragraph("\n\n\n")
-        signature_lines = [
-            "投标人（盖章）：__________________________",
-            "\n",
-            "法定代表人或授权代表（签字）：________________",
-            "\n",
-            f"日    期：{request.bid_date or '202X年XX月XX日'}"
-        ]
-        for text in signature_lines:
-            p = doc.add_paragraph()
-            run = p.add_run(text)
-            set_font(run, 14)
-            p.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-        buffer = io.BytesIO()
-        doc.save(buffer)
-        buffer.seek(0)
+        # 大文档的排版与保存是纯 CPU 工作，放到线程中执行，避免阻塞事件循环
+        buffer = await asyncio.to_thread(build_word_document, request)
         encoded_filename = quote(f"{request.project_name or '标书文档'}.docx")
         return StreamingResponse(buffer, media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document", headers={"Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"})
     except Exception as e:
         print(f"导出Word失败: {e}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"导出Word失败: {e}")
+
+
+def build_word_document(request: WordExportRequest) -> io.BytesIO:
+    doc = docx.Document()
+    
+    # 1. 基础样式优化
+    styles = doc.styles
+    for name in ["Normal", "Heading 1", "Heading 2", "Heading 3", "Title"]:
+        if name in styles:
+            style = styles[name]
+            style.font.name = "宋体"
+            if style._element.rPr is None: style._element._add_rPr()
+            style._element.rPr.rFonts.set(qn("w:eastAsia"), "宋体")
+            
+            if name == "Normal":
+                style.font.size = Pt(12)  # 小四
+                style.paragraph_format.line_spacing_rule = WD_LINE_SPACING.ONE_POINT_FIVE
+                style.paragraph_format.space_after = Pt(6)
+            elif name == "Heading 1":
+                style.font.size = Pt(16)
+                style.font.bold = True
+                style.paragraph_format.space_before = Pt(12)
+                style.paragraph_format.space_after = Pt(6)
+            elif name == "Heading 2":
+                style.font.size = Pt(14)
+                style.font.bold = True
+                style.paragraph_format.space_before = Pt(10)
+                style.paragraph_format.space_after = Pt(4)
+
+    # 2. 标书封面生成
+    doc.add_paragraph("\n\n\n")
+    title_p = doc.add_paragraph()
+    title_run = title_p.add_run("投 标 文 件")
+    title_run.bold, title_run.font.size = True, Pt(42)
+    set_font(title_run)
+    title_p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    doc.add_paragraph("\n")
+    tech_p = doc.add_paragraph()
+    tech_run = tech_p.add_run("（技 术 部 分）")
+    tech_run.font.size = Pt(22)
+    set_font(tech_run)
+    tech_p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    doc.add_paragraph("\n\n\n\n")
+    
+    # 封面信息表格
+    info_table = doc.add_table(rows=4, cols=2)
+    info_table.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    labels = ["项 目 名 称：", "项目编号：", "投 标 人：", "日    期："]
+    values = [
+        request.project_name or "————",
+        request.project_number or "————",
+        request.bidder_name or "————",
+        request.bid_date or "202X年XX月XX日"
+    ]
+    for i in range(4):
+        cell_l = info_table.cell(i, 0)
+        cell_l.text = labels[i]
+        p_l = cell_l.paragraphs[0]
+        p_l.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        set_paragraph_font(p_l, 14)
+        
+        cell_v = info_table.cell(i, 1)
+        cell_v.text = values[i]
+        p_v = cell_v.paragraphs[0]
+        set_paragraph_font(p_v, 14)
+        for run in p_v.runs: run.underline = True
+
+    doc.add_page_break()
+
+    # 3. 页码设置 (从目录页开始)
+    for section in doc.sections:
+        footer = section.footer
+        footer_para = footer.paragraphs[0] if footer.paragraphs else footer.add_paragraph()
+        footer_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        run = footer_para.add_run()
+        set_font(run, 9)
+        add_page_number(run)
+
+    # 4. 目录页
+    doc.add_heading("目  录", level=1).alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_paragraph()
+    
+    def add_toc_item(items, level=1):
+        for item in items:
+            toc_p = doc.add_paragraph()
+            toc_p.paragraph_format.left_indent = Inches(0.2 * (level - 1))
+            toc_run = toc_p.add_run(f"{item.id} {item.title}")
+            set_font(toc_run, 10.5)
+            if level == 1: toc_run.bold = True
+            if item.children: add_toc_item(item.children, level + 1)
+    
+    add_toc_item(request.outline)
+    doc.add_page_break()
+
+    # 5. 项目概述
+    if request.project_overview:
+        h = doc.add_heading("项目概述", level=1)
+        set_paragraph_font(h)
+        render_markdown_blocks(doc, parse_markdown_blocks(request.project_overview))
+
+    def add_outline_items(items: list, level: int = 1) -> None:
+        for item in items:
+            if level == 1:
+                doc.add_page_break()
+            h = doc.add_heading(f"{item.id} {item.title}", level=min(level, 3))
+            set_paragraph_font(h)
+            if not item.children:
+                if c := (item.content or "").strip(): 
+                    render_markdown_blocks(doc, parse_markdown_blocks(c))
+            else:
+                add_outline_items(item.children, level + 1)
+
+    add_outline_items(request.outline)
+
+    # 7. 落款与盖章页
+    doc.add_page_break()
+    doc.add_paragraph("\n\n\n")
+    signature_lines = [
+        "投标人（盖章）：__________________________",
+        "\n",
+        "法定代表人或授权代表（签字）：________________",
+        "\n",
+        f"日    期：{request.bid_date or '202X年XX月XX日'}"
+    ]
+    for text in signature_lines:
+        p = doc.add_paragraph()
+        run = p.add_run(text)
+        set_font(run, 14)
+        p.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
@@ -49,10 +49,10 @@ async def upload_file(file: UploadFile = File(...)) -> FileUploadResponse:
             {"role": "user", "content": file_content}
         ]
         
-        full_content = ""
-        async for chunk in openai_service.stream_chat_completion(messages, temperature=0.7, response_format={"type": "json_object"}):
-            full_content += chunk
-            
+        full_content = await openai_service._collect_stream_text(
+            messages, temperature=0.7, response_format={"type": "json_object"}, step="expand_outline"
+        )
+
         return FileUploadResponse(
             success=True,
             message=f"文件 {filename} 上传成功",
@@ -103,13 +103,7 @@ async def expand_content(request: ExpandContentRequest):
         ]
         
         # 生成扩展内容
-        expanded_content = ""
-        async for chunk in openai_service.stream_chat_completion(
-            messages, 
-            temperature=0.7,
-            max_tokens=4096
-        ):
-            expanded_content += chunk
+        expanded_content = await openai_service._collect_stream_text(messages, temperature=0.7, step="expand")
         
         return {
             "success": True,
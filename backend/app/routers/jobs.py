@@ -0,0 +1,125 @@
+"""后台生成任务相关API路由"""
+import json
+from typing import AsyncGenerator
+
+from fastapi import APIRouter, HTTPException, Request
+
+from ..models.schemas import ContentGenerationRequest
+from ..services.generation_job_service import generation_job_service
+from ..services.task_queue import task_queue
+from ..utils.config_manager import config_manager
+from ..utils.sse import sse_response
+
+router = APIRouter(prefix="/api/jobs", tags=["生成任务"])
+
+
+def _not_found(job_id: str) -> HTTPException:
+    return HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+
+
+async def _sse_events(events: AsyncGenerator[dict, None]) -> AsyncGenerator[str, None]:
+    try:
+        async for event in events:
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+    except Exception as e:
+        yield f"data: {json.dumps({'type': 'error', 'message': str(e)}, ensure_ascii=False)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@router.post("/generation")
+async def submit_generation_job(request: ContentGenerationRequest) -> dict:
+    """提交整份目录的内容生成任务，立即返回任务ID"""
+    config = config_manager.load_config()
+    if not config.get('api_key'):
+        raise HTTPException(status_code=400, detail="请先配置OpenAI API密钥")
+
+    try:
+        job_id = await generation_job_service.submit(
+            request.outline,
+            project_overview=request.project_overview,
+            concurrency=request.concurrency
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "data": await generation_job_service.get_status(job_id)}
+
+
+@router.get("/generation/{job_id}")
+async def get_generation_job(job_id: str) -> dict:
+    """查询任务状态与进度"""
+    try:
+        return {"success": True, "data": await generation_job_service.get_status(job_id)}
+    except KeyError:
+        raise _not_found(job_id)
+
+
+@router.get("/generation/{job_id}/result")
+async def get_generation_job_result(job_id: str) -> dict:
+    """获取填入已完成章节内容的目录（任务未完成时为部分结果）"""
+    try:
+        return {
+            "success": True,
+            "data": await generation_job_service.get_result(job_id),
+            "status": await generation_job_service.get_status(job_id)
+        }
+    except KeyError:
+        raise _not_found(job_id)
+
+
+@router.get("/generation/{job_id}/stream")
+async def stream_generation_job(job_id: str, http_request: Request):
+    """以SSE推送任务进度；连接断开不影响任务，重新连接会补发已完成的章节"""
+    try:
+        await generation_job_service.get_status(job_id)
+    except KeyError:
+        raise _not_found(job_id)
+
+    return sse_response(_sse_events(generation_job_service.stream_events(job_id)), request=http_request)
+
+
+@router.post("/generation/{job_id}/cancel")
+async def cancel_generation_job(job_id: str) -> dict:
+    """取消任务（已完成的章节会保留）"""
+    try:
+        return {"success": True, "data": await generation_job_service.cancel(job_id)}
+    except KeyError:
+        raise _not_found(job_id)
+
+
+@router.post("/generation/{job_id}/resume")
+async def resume_generation_job(job_id: str) -> dict:
+    """续跑被取消、中断或失败的任务，只生成缺失的章节"""
+    try:
+        return {"success": True, "data": await generation_job_service.resume(job_id)}
+    except KeyError:
+        raise _not_found(job_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/tasks/{task_id}")
+async def get_background_task(task_id: str) -> dict:
+    """查询后台任务（文件解析、向量化等）的状态、进度与结果"""
+    try:
+        return {"success": True, "data": await task_queue.get_status(task_id)}
+    except KeyError:
+        raise _not_found(task_id)
+
+
+@router.get("/tasks/{task_id}/stream")
+async def stream_background_task(task_id: str, http_request: Request):
+    """以SSE推送后台任务的状态变化，任务结束后发送 [DONE]"""
+    try:
+        await task_queue.get_status(task_id)
+    except KeyError:
+        raise _not_found(task_id)
+    return sse_response(_sse_events(task_queue.stream_events(task_id)), request=http_request)
+
+
+@router.post("/tasks/{task_id}/cancel")
+async def cancel_background_task(task_id: str) -> dict:
+    """取消排队中或执行中的后台任务"""
+    try:
+        return {"success": True, "data": await task_queue.cancel(task_id)}
+    except KeyError:
+        raise _not_found(task_id)
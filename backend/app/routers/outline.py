@@ -3,19 +3,19 @@ import json
 import asyncio
 from typing import AsyncGenerator
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 
 from ..models.schemas import OutlineRequest
 from ..services.openai_service import OpenAIService
 from ..utils.config_manager import config_manager
 from ..utils import prompt_manager
-from ..utils.sse import sse_response
+from ..utils.sse import sse_response, with_heartbeat
 
 router = APIRouter(prefix="/api/outline", tags=["目录管理"])
 
 
 @router.post("/generate")
-async def generate_outline(request: OutlineRequest):
+async def generate_outline(request: OutlineRequest, http_request: Request):
     """生成标书目录结构（以SSE流式返回）"""
     try:
         # 加载配置
@@ -27,7 +27,11 @@ async def generate_outline(request: OutlineRequest):
         # 创建OpenAI服务实例
         openai_service = OpenAIService()
         
+        if request.chapter_stream:
+            return sse_response(_generate_outline_by_chapter(openai_service, request), request=http_request)
+
         async def generate() -> AsyncGenerator[str, None]:
+            compute_task = None
             try:
                 # 后台计算主任务
                 compute_task = asyncio.create_task(openai_service.generate_outline_v2(
@@ -47,13 +51,11 @@ async def generate_outline(request: OutlineRequest):
                 # 确保为字符串
                 result_str = json.dumps(result, ensure_ascii=False) if isinstance(result, dict) else str(result)
 
-                # 分片发送实际数据
-                chunk_size = 128
-                chunk_delay = 0.1  # 每个分片之间增加一点点延迟，增强SSE逐步展示效果
+                # 分片发送实际数据（不再人为插入延迟）
+                chunk_size = 4096
                 for i in range(0, len(result_str), chunk_size):
                     piece = result_str[i:i+chunk_size]
                     yield f"data: {json.dumps({'chunk': piece}, ensure_ascii=False)}\n\n"
-                    await asyncio.sleep(chunk_delay)
                 # 发送结束信号
                 yield "data: [DONE]\n\n"
             except Exception as e:
@@ -66,15 +68,36 @@ async def generate_outline(request: OutlineRequest):
                 }
                 yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
                 yield "data: [DONE]\n\n"
+            finally:
+                # 客户端断开时不再让后台任务继续消耗 token
+                if compute_task is not None and not compute_task.done():
+                    compute_task.cancel()
 
-        return sse_response(generate())
+        return sse_response(generate(), request=http_request)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"目录生成失败: {e}")
 
 
+async def _generate_outline_by_chapter(openai_service: OpenAIService, request: OutlineRequest) -> AsyncGenerator[str, None]:
+    """按章节流式返回目录：level1 事件给出一级提纲，之后每完成一章发送一个 chapter 事件"""
+    events = openai_service.generate_outline_v2_stream(
+        overview=request.overview,
+        requirements=request.requirements,
+        project_type=request.project_type,
+        project_sub_type=request.project_sub_type
+    )
+    try:
+        async for event in with_heartbeat(events, heartbeat={"type": "heartbeat"}, interval=1.0):
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+    except Exception as e:
+        payload = {"type": "error", "error": True, "message": f"目录生成失败: {e}"}
+        yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
 @router.post("/generate-stream")
-async def generate_outline_stream(request: OutlineRequest):
+async def generate_outline_stream(request: OutlineRequest, http_request: Request):
     """流式生成标书目录结构"""
     try:
         # 加载配置
@@ -111,14 +134,15 @@ async def generate_outline_stream(request: OutlineRequest):
                 messages, 
                 temperature=0.7, 
                 response_format={"type": "json_object"},
-                max_tokens=4096  # 明确设置较大的 token 限制，防止大纲被截断
+                max_tokens=4096,  # 明确设置较大的 token 限制，防止大纲被截断
+                step="outline"
             ):
                 yield f"data: {json.dumps({'chunk': chunk}, ensure_ascii=False)}\n\n"
             
             # 发送结束信号
             yield "data: [DONE]\n\n"
         
-        return sse_response(generate())
+        return sse_response(generate(), request=http_request)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"目录生成失败: {e}")
@@ -0,0 +1,89 @@
+"""招标文件派生结果缓存
+
+按文件内容的 MD5 保存解析出的 TenderInfo、项目概述 / 评分要求分析、风险报告等，
+每项结果记录生成时的版本（提示词 + 模型 + 分块参数的哈希），版本不一致即视为失效，
+提示词修改或切换模型后自动重新生成。与 LLM 响应缓存不同，这里不过期也不做 LRU 淘汰：
+同一份招标文件再次打开时，所有分析结果都能直接返回。
+
+结果不放在 upload_dir（该目录通过 /api/uploads 公开访问）。
+协程中通过 aget / aset 访问，磁盘读写与 JSON 编解码经 asyncio.to_thread 在线程中执行，不阻塞事件循环。
+"""
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from ..config import settings
+from ..utils.request_context import llm_cache_bypass
+
+
+def content_md5(text: str) -> str:
+    """招标文件文本的 MD5（同一文件的提取文本固定，等价于按上传文件寻址）"""
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def artifact_version(*parts: Any) -> str:
+    """由提示词模版、模型名等生成版本号"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class ArtifactCache:
+    """磁盘上的派生结果缓存：{root}/{md5[:2]}/{md5}/{kind}.json"""
+
+    def __init__(self, root: str | Path, enabled: bool = True) -> None:
+        self.root = Path(root)
+        self.enabled = enabled
+        self.counters: Dict[str, int] = {"hits": 0, "misses": 0, "stale": 0, "stores": 0}
+
+    def _path(self, md5: str, kind: str) -> Path:
+        return self.root / md5[:2] / md5 / f"{kind}.json"
+
+    def get(self, md5: str, kind: str, version: str) -> Optional[Any]:
+        if not self.enabled or llm_cache_bypass.get():
+            return None
+        try:
+            data = json.loads(self._path(md5, kind).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            self.counters["misses"] += 1
+            return None
+        except Exception as e:
+            print(f"读取派生结果缓存失败: {e}")
+            self.counters["misses"] += 1
+            return None
+        if data.get("version") != version:
+            self.counters["stale"] += 1
+            return None
+        self.counters["hits"] += 1
+        return data["value"]
+
+    def set(self, md5: str, kind: str, version: str, value: Any) -> None:
+        if not self.enabled or not value:
+            return
+        path = self._path(md5, kind)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps({"version": version, "value": value}, ensure_ascii=False), encoding="utf-8")
+            tmp_path.replace(path)
+            self.counters["stores"] += 1
+        except Exception as e:
+            print(f"写入派生结果缓存失败: {e}")
+
+    async def aget(self, md5: str, kind: str, version: str) -> Optional[Any]:
+        if not self.enabled or llm_cache_bypass.get():
+            return None
+        return await asyncio.to_thread(self.get, md5, kind, version)
+
+    async def aset(self, md5: str, kind: str, version: str, value: Any) -> None:
+        if not self.enabled or not value:
+            return
+        await asyncio.to_thread(self.set, md5, kind, version, value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, **self.counters}
+
+
+# 全局派生结果缓存
+artifact_cache = ArtifactCache(settings.artifact_cache_dir, enabled=settings.artifact_cache_enabled)
@@ -0,0 +1,154 @@
+"""文件解析进程池
+
+fitz / pdfplumber / docx2python 的解析都是纯 CPU 的同步调用，直接在事件循环里执行时，
+一份几百页的标书会卡住所有用户的 SSE 流。这里把解析函数放到独立进程中执行：
+
+- 同时执行的解析数不超过 worker 数，多份上传可以在多个核心上并行；
+- 每个 worker 是一个独立的单进程执行器，任务只分配给空闲的 worker；
+- 每个任务有超时，超时后只终止并重建执行该任务的 worker，其他用户正在进行的解析不受影响；
+- worker 进程通过 RLIMIT_AS 限制内存（仅类 Unix 系统），异常文件触发 MemoryError 而不是拖垮整机；
+- extraction_workers 是所有后端进程合计的 worker 数，每个后端进程按进程数平分，整机的解析进程数有上限。
+
+提交的函数及其参数、返回值需可 pickle（模块级函数或类的静态方法）。
+"""
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures import Future
+from contextlib import suppress
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from ..config import per_process_share, settings
+
+R = TypeVar("R")
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionError(Exception):
+    """解析进程超时、超出内存限制或异常退出"""
+
+
+def _limit_worker_memory(memory_limit_mb: int) -> None:
+    """worker 进程初始化：限制虚拟内存上限"""
+    if memory_limit_mb <= 0:
+        return
+    try:
+        import resource
+    except ImportError:  # Windows 不支持 RLIMIT_AS
+        return
+    limit = memory_limit_mb * 1024 * 1024
+    try:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError) as e:
+        # 部分平台或沙箱不允许设置 RLIMIT_AS：不限制内存继续运行，而不是让 worker 初始化失败
+        logger.warning(f"无法限制解析进程内存（RLIMIT_AS），将不限制内存: {e}")
+
+
+class ExtractionPool:
+    """有界的解析进程池：每个 worker 一个单进程执行器，按需创建，超时或崩溃后单独重建"""
+
+    def __init__(self, workers: int, timeout: float, memory_limit_mb: int) -> None:
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._executors: List[Optional[ProcessPoolExecutor]] = [None] * self.workers
+        # 空闲 worker 的序号；worker 进程真正执行完（而不是调用方不再等待）才放回
+        self._idle: Optional[asyncio.Queue] = None
+        self.counters: Dict[str, int] = {"jobs": 0, "failed": 0, "timeouts": 0, "memory_errors": 0, "crashes": 0, "restarts": 0}
+
+    def _get_executor(self, index: int) -> ProcessPoolExecutor:
+        if self._executors[index] is None:
+            # spawn：不继承父进程的事件循环、连接池线程等状态
+            self._executors[index] = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_limit_worker_memory,
+                initargs=(self.memory_limit_mb,),
+            )
+        return self._executors[index]
+
+    def _restart(self, index: int, executor: ProcessPoolExecutor) -> None:
+        """终止该 worker 的进程（包括卡住的），下次分配到它时重建；其他 worker 不受影响"""
+        if self._executors[index] is not executor:
+            return
+        self._executors[index] = None
+        self.counters["restarts"] += 1
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            with suppress(Exception):
+                process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release_when_done(self, index: int, future: Future) -> None:
+        loop, idle = asyncio.get_running_loop(), self._idle
+
+        def release(_: Future) -> None:
+            with suppress(RuntimeError):  # 事件循环已关闭
+                loop.call_soon_threadsafe(idle.put_nowait, index)
+
+        future.add_done_callback(release)
+
+    async def run(self, func: Callable[..., R], *args: Any, timeout: Optional[float] = None) -> R:
+        """在解析进程中执行 func(*args)"""
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for index in range(self.workers):
+                self._idle.put_nowait(index)
+        timeout = timeout or self.timeout
+        self.counters["jobs"] += 1
+        # 进程异常退出（如被系统 OOM 终止）时换一个新进程重试一次
+        for attempt in range(2):
+            index = await self._idle.get()
+            executor = self._get_executor(index)
+            try:
+                future = executor.submit(func, *args)
+            except BaseException:
+                self._idle.put_nowait(index)
+                raise
+            self._release_when_done(index, future)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+            except asyncio.TimeoutError:
+                self.counters["timeouts"] += 1
+                self.counters["failed"] += 1
+                self._restart(index, executor)
+                raise ExtractionError(f"文件解析超时（超过 {timeout:.0f} 秒）") from None
+            except MemoryError:
+                self.counters["memory_errors"] += 1
+                self.counters["failed"] += 1
+                raise ExtractionError(f"文件解析超出内存限制（{self.memory_limit_mb} MB）") from None
+            except BrokenProcessPool as e:
+                self._restart(index, executor)
+                if attempt == 0:
+                    continue
+                self.counters["crashes"] += 1
+                self.counters["failed"] += 1
+                raise ExtractionError("文件解析进程异常退出") from e
+        raise AssertionError("unreachable")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "started": sum(executor is not None for executor in self._executors),
+            "memory_limit_mb": self.memory_limit_mb,
+            **self.counters,
+        }
+
+    def shutdown(self) -> None:
+        executors, self._executors = self._executors, [None] * self.workers
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 全局解析进程池（每个后端进程一个，worker 数按进程数平分）
+extraction_pool = ExtractionPool(
+    per_process_share(settings.extraction_workers),
+    timeout=settings.extraction_timeout,
+    memory_limit_mb=settings.extraction_memory_limit_mb,
+)
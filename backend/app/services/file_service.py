@@ -4,9 +4,10 @@ import base64
 import gc
 import io
 import re
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List, Tuple
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, List, Set, Tuple
 from contextlib import suppress
 
 import aiofiles
@@ -18,6 +19,31 @@ from docx2python import docx2python
 from fastapi import UploadFile
 
 from ..config import settings
+from ..utils.chunk_util import map_concurrently, replace_pages
+from .extraction_pool import ExtractionError, extraction_pool
+from .task_queue import TaskContext, task_queue
+
+# 解析文本中的图片占位符
+IMAGE_PLACEHOLDER = re.compile(r'----.*?(?:image|img|media).*?----', re.IGNORECASE)
+IMAGE_UPLOAD_CONCURRENCY = 4
+# 扫描页判定：只有图片，或图片覆盖页面比例不低于 SCANNED_PAGE_MIN_COVERAGE 且文本层有效字数低于 SCANNED_PAGE_MAX_CHARS
+# （扫描件常带少量页眉页脚文字）
+SCANNED_PAGE_MIN_COVERAGE = 0.5
+SCANNED_PAGE_MAX_CHARS = 50
+# 解析进程返回的待上传图片：(文本中的标记, 原占位符, 图片数据, 文件名)
+PendingImages = List[Tuple[str, str, bytes, str]]
+# 进度回调（后台任务中为 TaskContext.report_progress），参数形如 {"stage": "ocr", "done": 3, "total": 10}
+ProgressCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+async def _report_progress(on_progress: Optional[ProgressCallback], stage: str, done: int, total: int) -> None:
+    """上报进度；写入失败只记录日志，不影响提取本身"""
+    if on_progress is None:
+        return
+    try:
+        await on_progress({"stage": stage, "done": done, "total": total})
+    except Exception as e:
+        print(f"上报进度失败: {e}")
 
 
 class FileService:
@@ -50,12 +76,14 @@ class FileService:
             return None
 
     @staticmethod
-    def extract_images_from_pdf(file_path: str | Path) -> List[Tuple[bytes, str, int, int]]:
-        """从PDF提取图片，返回 (图片数据, 扩展名, 页码, 图片索引) 列表"""
+    def extract_images_from_pdf(file_path: str | Path, pages: Optional[Set[int]] = None) -> List[Tuple[bytes, str, int, int]]:
+        """从PDF提取图片，返回 (图片数据, 扩展名, 页码, 图片索引) 列表；pages 为要解码的页码（从 1 开始），默认全部"""
         images = []
         try:
             with fitz.open(str(file_path)) as doc:
                 for page_num in range(doc.page_count):
+                    if pages is not None and page_num + 1 not in pages:
+                        continue
                     page = doc[page_num]
                     for img_index, img in enumerate(page.get_images(full=True)):
                         with suppress(Exception):
@@ -158,102 +186,214 @@ class FileService:
     
     @staticmethod
     async def extract_text_from_pdf(file_path: str | Path) -> str:
-        """从PDF文件提取文本"""
+        """从PDF文件提取文本（解析在进程池中执行）"""
+        text, _ = await FileService.extract_pdf(file_path)
+        return text
+
+    @staticmethod
+    async def extract_pdf(file_path: str | Path, on_progress: Optional[ProgressCallback] = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """从PDF文件提取文本，返回 (文本, 逐页报告)，报告为空表示走了整份回退提取；每完成一个页范围上报一次进度"""
         try:
-            text = await FileService._extract_pdf_with_pymupdf(file_path)
-            if len(text.strip()) < 200:
-                plumber_text = await FileService._extract_pdf_with_pdfplumber(file_path)
+            text, pages = await FileService._extract_pdf_sharded(file_path, on_progress)
+            # 没有扫描页却几乎没有文字时，再用 pdfplumber 整份试一次
+            if len(text.strip()) < 200 and not any(page["kind"] == "scanned" for page in pages):
+                plumber_text = await FileService._run_extractor(FileService._extract_pdf_with_pdfplumber, file_path)
                 if len(plumber_text.strip()) > len(text.strip()):
-                    text = plumber_text
-            return text
+                    return plumber_text, []
+            return text, pages
+        except ExtractionError:
+            # 超时或超出内存限制时换一种解析方式通常也一样，直接报错
+            raise
         except Exception as e:
             print(f"高级 PDF 提取失败，尝试基础提取: {e}")
             with suppress(Exception):
-                return await FileService._extract_pdf_with_pdfplumber(file_path)
-            return FileService._extract_pdf_with_pypdf2(file_path)
-    
+                return await FileService._run_extractor(FileService._extract_pdf_with_pdfplumber, file_path), []
+            return await extraction_pool.run(FileService._extract_pdf_with_pypdf2, str(file_path)), []
+
     @staticmethod
-    async def _extract_pdf_with_pdfplumber(file_path: str | Path) -> str:
-        """使用pdfplumber提取PDF文本"""
-        try:
-            extracted_text = []
-            image_references = []
-            global_img_counter = 1
+    async def _extract_pdf_sharded(
+        file_path: str | Path, on_progress: Optional[ProgressCallback] = None
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """按页范围把逐页提取拆到多个解析进程（各自打开文件），再按页序合并"""
+        page_count = await extraction_pool.run(FileService._pdf_page_count, str(file_path))
+        shard_pages = max(1, settings.extraction_shard_pages)
+        ranges = [(start, min(start + shard_pages, page_count)) for start in range(0, page_count, shard_pages)]
+        if len(ranges) <= 1:
+            await _report_progress(on_progress, "extract", 0, page_count)
+            result = await extraction_pool.run(FileService._extract_pdf_pages, str(file_path))
+            await _report_progress(on_progress, "extract", page_count, page_count)
+            return result
 
-            all_images = FileService.extract_images_from_pdf(file_path)
-            page_images_map = {}
-            for img_data, ext, page_num, img_index in all_images:
-                page_images_map.setdefault(page_num, []).append((img_data, ext, img_index))
+        done = 0
+        await _report_progress(on_progress, "extract", done, page_count)
 
-            with pdfplumber.open(str(file_path)) as pdf:
-                for page_num, page in enumerate(pdf.pages, 1):
-                    extracted_text.append(f"\n--- 第 {page_num} 页 ---\n")
-                    if text := page.extract_text():
-                        img_pattern = r'----.*?(?:image|img|media).*?----'
-                        img_matches = list(re.finditer(img_pattern, text, re.IGNORECASE))
-
-                        if img_matches and (page_images := page_images_map.get(page_num)):
-                            processed_text = text
-                            for match in img_matches:
-                                if global_img_counter - 1 < len(page_images):
-                                    img_data, ext, img_index = page_images[global_img_counter - 1]
-                                    img_name = f"pdf_p{page_num}_i{img_index}.{ext}"
-                                    if image_url := await FileService.upload_image_to_server(img_data, img_name):
-                                        processed_text = processed_text.replace(match.group(), f"[图片{global_img_counter}]", 1)
-                                        image_references.append(f"[图片{global_img_counter}]: {image_url}")
-                                        global_img_counter += 1
-                            extracted_text.append(processed_text)
-                        else:
-                            extracted_text.append(text)
+        async def extract_range(start: int, end: int) -> Tuple[str, List[Dict[str, Any]]]:
+            nonlocal done
+            shard = await extraction_pool.run(FileService._extract_pdf_pages, str(file_path), start, end)
+            done += end - start
+            await _report_progress(on_progress, "extract", done, page_count)
+            return shard
 
-                    if tables := page.extract_tables():
-                        for table_num, table in enumerate(tables, 1):
-                            extracted_text.append(f"\n[表格 {table_num}]")
-                            for row in table:
-                                if row:
-                                    extracted_text.append(" | ".join(str(c) if c else "" for c in row))
-                            extracted_text.append("[表格结束]\n")
+        shards = await asyncio.gather(*(extract_range(start, end) for start, end in ranges))
+        return "\n".join(text for text, _ in shards).strip(), [page for _, pages in shards for page in pages]
 
-            if image_references:
-                extracted_text.extend(["\n\n--- 图片引用 ---", *image_references])
+    @staticmethod
+    def summarize_pdf_pages(pages: List[Dict[str, Any]]) -> str:
+        """逐页报告的摘要：各类页数、表格识别页数、总耗时与最慢的页"""
+        kinds: Dict[str, int] = {}
+        for page in pages:
+            kinds[page["kind"]] = kinds.get(page["kind"], 0) + 1
+        slowest = max(pages, key=lambda page: page["ms"])
+        return (
+            f"共 {len(pages)} 页（{'，'.join(f'{kind} {count}' for kind, count in kinds.items())}），"
+            f"识别表格 {sum('tables' in page['strategy'] for page in pages)} 页，"
+            f"解析耗时 {sum(page['ms'] for page in pages) / 1000:.1f} 秒，最慢第 {slowest['page']} 页 {slowest['ms']:.0f} ms"
+        )
 
-            result = "\n".join(extracted_text).strip()
-            
-            if len(result.replace("--- 第", "").strip()) < 100 and all_images:
-                fitz_text = await FileService._extract_pdf_with_pymupdf(file_path)
-                if len(fitz_text) > len(result):
-                    return fitz_text
+    @staticmethod
+    def _pdf_page_count(file_path: str | Path) -> int:
+        with fitz.open(str(file_path)) as doc:
+            return doc.page_count
 
-            return result
+    @staticmethod
+    async def _run_extractor(extractor: Callable[[str], Tuple[str, PendingImages]], file_path: str | Path) -> str:
+        """在解析进程中执行提取函数，再在本进程上传其中的图片"""
+        text, pending_images = await extraction_pool.run(extractor, str(file_path))
+        return await FileService._upload_pending_images(text, pending_images)
+
+    @staticmethod
+    def _mark_images(text: str, images: Iterator[Tuple[bytes, str]], pending_images: PendingImages) -> str:
+        """把文本中的图片占位符依次对应到 images，替换为唯一标记并记录待上传的图片"""
+        for match in IMAGE_PLACEHOLDER.finditer(text):
+            if (image := next(images, None)) is None:
+                break
+            token = f"\x00IMG{len(pending_images)}\x00"
+            text = text.replace(match.group(), token, 1)
+            pending_images.append((token, match.group(), *image))
+        return text
+
+    @staticmethod
+    async def _upload_pending_images(text: str, pending_images: PendingImages) -> str:
+        """并发上传图片，成功的标记替换为 [图片N] 并追加图片引用，失败的恢复原占位符"""
+        if not pending_images:
+            return text
+        urls = await map_concurrently(
+            pending_images,
+            lambda _, image: FileService.upload_image_to_server(image[2], image[3]),
+            IMAGE_UPLOAD_CONCURRENCY,
+        )
+        image_references = []
+        for (token, original, _, _), url in zip(pending_images, urls):
+            if url:
+                label = f"[图片{len(image_references) + 1}]"
+                text = text.replace(token, label, 1)
+                image_references.append(f"{label}: {url}")
+            else:
+                text = text.replace(token, original, 1)
+        if image_references:
+            text = "\n".join([text, "\n\n--- 图片引用 ---", *image_references])
+        return text
+
+    @staticmethod
+    def _extract_pdf_with_pdfplumber(file_path: str | Path) -> Tuple[str, PendingImages]:
+        """使用pdfplumber提取PDF文本，返回 (文本, 待上传的图片)"""
+        try:
+            extracted_text = []
+            pending_images: PendingImages = []
+
+            with pdfplumber.open(str(file_path)) as pdf:
+                pages = [(page.extract_text(), page.extract_tables()) for page in pdf.pages]
+
+            # 只解码文本中引用了图片的页
+            referenced = {page_num for page_num, (text, _) in enumerate(pages, 1) if text and IMAGE_PLACEHOLDER.search(text)}
+            page_images_map = {}
+            for img_data, ext, page_num, img_index in FileService.extract_images_from_pdf(file_path, referenced) if referenced else []:
+                page_images_map.setdefault(page_num, []).append((img_data, f"pdf_p{page_num}_i{img_index}.{ext}"))
+
+            for page_num, (text, tables) in enumerate(pages, 1):
+                extracted_text.append(f"\n--- 第 {page_num} 页 ---\n")
+                if text:
+                    if page_images := page_images_map.get(page_num):
+                        text = FileService._mark_images(text, iter(page_images), pending_images)
+                    extracted_text.append(text)
+
+                for table_num, table in enumerate(tables or [], 1):
+                    extracted_text.append(f"\n[表格 {table_num}]")
+                    for row in table:
+                        if row:
+                            extracted_text.append(" | ".join(str(c) if c else "" for c in row))
+                    extracted_text.append("[表格结束]\n")
+
+            return "\n".join(extracted_text).strip(), pending_images
         except Exception as e:
             with suppress(Exception):
-                return await FileService._extract_pdf_with_pymupdf(file_path)
+                return FileService._extract_pdf_pages(file_path)[0], []
             raise Exception(f"PDF文件读取失败: {e}") from e
-    
+
     @staticmethod
-    async def _extract_pdf_with_pymupdf(file_path: str | Path) -> str:
-        """使用PyMuPDF提取PDF文本和图片"""
+    def _extract_pdf_pages(file_path: str | Path, start: int = 0, end: Optional[int] = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """只打开一次文档，逐页分类并选择最省的提取方式，返回 (文本, 逐页报告)
+
+        页面类型：text（文本层）、mixed（文本层 + 图片）、scanned（图片占满页面且文字很少，或只有图片，需 OCR）、empty。
+        图片一律不解码；find_tables 按矢量线条识别表格，只在有线条的页上执行。
+        start/end 为页范围（从 0 开始，不含 end）；指定 end 时返回未 strip 的文本，各段按页序直接拼接即与整份提取一致。
+        """
         try:
-            extracted_text = []
+            extracted_text, report = [], []
             with fitz.open(str(file_path)) as doc:
-                for page_num in range(doc.page_count):
+                for page_num in range(start, doc.page_count if end is None else min(end, doc.page_count)):
+                    started = time.perf_counter()
                     page = doc[page_num]
                     extracted_text.append(f"\n--- 第 {page_num + 1} 页 ---\n")
-                    if text := page.get_text("text", sort=True):
+                    text = page.get_text("text", sort=True)
+                    if text:
                         extracted_text.append(text)
-                    
-                    with suppress(Exception):
-                        if tabs := page.find_tables():
-                            for table_num, table in enumerate(tabs.tables, 1):
-                                extracted_text.append(f"\n[表格 {table_num}]")
-                                for row in table.extract():
-                                    if row:
-                                        extracted_text.append(" | ".join(str(c) if c else "" for c in row))
-                                extracted_text.append("[表格结束]\n")
-            return "\n".join(extracted_text).strip()
+
+                    chars = len(re.sub(r"\s+", "", text))
+                    coverage = FileService._image_coverage(page)
+                    if coverage and (chars == 0 or (coverage >= SCANNED_PAGE_MIN_COVERAGE and chars < SCANNED_PAGE_MAX_CHARS)):
+                        kind = "scanned"
+                    elif coverage:
+                        kind = "mixed"
+                    else:
+                        kind = "text" if chars else "empty"
+
+                    strategy = "text"
+                    if page.get_cdrawings():
+                        strategy = "text+tables"
+                        with suppress(Exception):
+                            if tabs := page.find_tables():
+                                for table_num, table in enumerate(tabs.tables, 1):
+                                    extracted_text.append(f"\n[表格 {table_num}]")
+                                    for row in table.extract():
+                                        if row:
+                                            extracted_text.append(" | ".join(str(c) if c else "" for c in row))
+                                    extracted_text.append("[表格结束]\n")
+
+                    report.append({
+                        "page": page_num + 1,
+                        "kind": kind,
+                        "strategy": strategy,
+                        "chars": chars,
+                        "image_coverage": round(coverage, 2),
+                        "ms": round((time.perf_counter() - started) * 1000, 1),
+                    })
+            text = "\n".join(extracted_text)
+            return (text if end is not None else text.strip()), report
         except Exception as e:
             raise Exception(f"PyMuPDF 提取失败: {e}") from e
     
+    @staticmethod
+    def _image_coverage(page: "fitz.Page") -> float:
+        """图片占页面面积的比例（按图片外框估算，不解码图片）"""
+        page_area = abs(page.rect)
+        if not page_area:
+            return 0.0
+        covered = 0.0
+        for info in page.get_image_info():
+            covered += abs(fitz.Rect(info["bbox"]) & page.rect)
+        return min(1.0, covered / page_area)
+
     @staticmethod 
     def _extract_pdf_with_pypdf2(file_path: str | Path) -> str:
         """使用PyPDF2提取PDF文本（原方法）"""
@@ -267,32 +407,34 @@ class FileService:
     
     @staticmethod
     async def extract_text_from_docx(file_path: str | Path) -> str:
-        """从Word文档提取文本 (增强版)"""
+        """从Word文档提取文本 (增强版，解析在进程池中执行)"""
         try:
             # 1. 尝试使用 docx2python
-            return await FileService._extract_docx_with_docx2python(file_path)
+            return await FileService._run_extractor(FileService._extract_docx_with_docx2python, file_path)
+        except ExtractionError:
+            raise
         except Exception as e1:
             print(f"docx2python 提取失败: {e1}")
             try:
                 # 2. 尝试使用 python-docx
-                return await FileService._extract_docx_with_python_docx(file_path)
+                return await FileService._run_extractor(FileService._extract_docx_with_python_docx, file_path)
             except Exception as e2:
                 print(f"python-docx 提取失败: {e2}")
                 # 3. 尝试使用 win32com (仅限 Windows，处理 .doc 或 伪装 .docx)
                 try:
-                    return await FileService._extract_word_with_win32com(file_path)
+                    return await extraction_pool.run(FileService._extract_word_with_win32com, str(file_path))
                 except Exception as e3:
                     print(f"win32com 提取失败: {e3}")
                     raise Exception(f"Word 文档解析全面失败。请检查文件是否损坏或加密。")
 
     @staticmethod
-    async def _extract_word_with_win32com(file_path: str | Path) -> str:
+    def _extract_word_with_win32com(file_path: str | Path) -> str:
         """使用 win32com 调用 Word 应用程序提取文本 (Windows Only)"""
         import win32com.client
         import pythoncom
         from pathlib import Path
         
-        # 初始化 COM 库 (在异步线程中是必须的)
+        # 初始化 COM 库 (在解析进程中是必须的)
         pythoncom.CoInitialize()
         
         word = None
@@ -323,13 +465,12 @@ class FileService:
             pythoncom.CoUninitialize()
     
     @staticmethod
-    async def _extract_docx_with_docx2python(file_path: str | Path) -> str:
-        """使用docx2python提取Word文档内容"""
+    def _extract_docx_with_docx2python(file_path: str | Path) -> Tuple[str, PendingImages]:
+        """使用docx2python提取Word文档内容，返回 (文本, 待上传的图片)"""
         try:
             extracted_text = []
-            image_references = []
-            global_img_counter = 1
-            all_images = FileService.extract_images_from_docx(file_path)
+            pending_images: PendingImages = []
+            images = iter([(img_data, f"docx_i{i}.{ext}") for img_data, ext, i in FileService.extract_images_from_docx(file_path)])
 
             with docx2python(str(file_path)) as content:
                 if hasattr(content, 'document'):
@@ -347,52 +488,24 @@ class FileService:
                             else:
                                 text = str(element).strip()
                                 if text:
-                                    img_matches = list(re.finditer(r'----.*?(?:image|img|media).*?----', text, re.IGNORECASE))
-                                    if img_matches and all_images:
-                                        processed_text = text
-                                        for match in img_matches:
-                                            if global_img_counter <= len(all_images):
-                                                img_data, ext, _ = all_images[global_img_counter - 1]
-                                                if url := await FileService.upload_image_to_server(img_data, f"docx_i{global_img_counter}.{ext}"):
-                                                    processed_text = processed_text.replace(match.group(), f"[图片{global_img_counter}]", 1)
-                                                    image_references.append(f"[图片{global_img_counter}]: {url}")
-                                                    global_img_counter += 1
-                                        extracted_text.append(processed_text)
-                                    else:
-                                        extracted_text.append(text)
+                                    extracted_text.append(FileService._mark_images(text, images, pending_images))
 
-            if image_references:
-                extracted_text.extend(["\n\n--- 图片引用 ---", *image_references])
-
-            return "\n".join(extracted_text).strip()
+            return "\n".join(extracted_text).strip(), pending_images
         except Exception:
-            return await FileService._extract_docx_with_python_docx(file_path)
+            return FileService._extract_docx_with_python_docx(file_path)
     
     @staticmethod
-    async def _extract_docx_with_python_docx(file_path: str | Path) -> str:
-        """使用python-docx提取Word文档内容"""
+    def _extract_docx_with_python_docx(file_path: str | Path) -> Tuple[str, PendingImages]:
+        """使用python-docx提取Word文档内容，返回 (文本, 待上传的图片)"""
         try:
             doc = docx.Document(str(file_path))
             extracted_text = []
-            image_references = []
-            global_img_counter = 1
-            all_images = FileService.extract_images_from_docx(file_path)
+            pending_images: PendingImages = []
+            images = iter([(img_data, f"docx_i{i}.{ext}") for img_data, ext, i in FileService.extract_images_from_docx(file_path)])
 
             for paragraph in doc.paragraphs:
                 if text := paragraph.text.strip():
-                    img_matches = list(re.finditer(r'----.*?(?:image|img|media).*?----', text, re.IGNORECASE))
-                    if img_matches and all_images:
-                        processed_text = text
-                        for match in img_matches:
-                            if global_img_counter <= len(all_images):
-                                img_data, ext, _ = all_images[global_img_counter - 1]
-                                if url := await FileService.upload_image_to_server(img_data, f"docx_i{global_img_counter}.{ext}"):
-                                    processed_text = processed_text.replace(match.group(), f"[图片{global_img_counter}]", 1)
-                                    image_references.append(f"[图片{global_img_counter}]: {url}")
-                                    global_img_counter += 1
-                        extracted_text.append(processed_text)
-                    else:
-                        extracted_text.append(text)
+                    extracted_text.append(FileService._mark_images(text, images, pending_images))
 
             for table_num, table in enumerate(doc.tables, 1):
                 extracted_text.append(f"\n[表格 {table_num}]")
@@ -401,44 +514,49 @@ class FileService:
                     if row_text: extracted_text.append(row_text)
                 extracted_text.append("[表格结束]\n")
 
-            if image_references:
-                extracted_text.extend(["\n\n--- 图片引用 ---", *image_references])
-
-            return "\n".join(extracted_text).strip()
+            return "\n".join(extracted_text).strip(), pending_images
         except Exception as e:
             raise Exception(f"Word文档读取失败: {e}") from e
     
     @staticmethod
-    async def process_vectorization_background(text: str, file_path: Path):
-        """后台异步处理向量化任务"""
-        try:
-            from .milvus_service import MilvusService
-            from langchain_text_splitters import RecursiveCharacterTextSplitter
-            
-            print(f"后台任务启动: 开始为 {file_path.name} 进行向量化...")
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                separators=["\n\n", "\n", "。", "！", "？", " ", ""]
-            )
-            chunks = text_splitter.split_text(text)
-            
-            if not chunks:
-                print("文档内容过少，跳过向量化")
-                return
-
-            milvus_service = MilvusService()
-            await milvus_service.add_documents(
-                texts=chunks,
-                metadatas=[{"source": str(file_path.name), "path": str(file_path)}] * len(chunks)
-            )
-            print(f"后台任务完成: {len(chunks)} 个片段已存入 Milvus")
-        except Exception as e:
-            print(f"后台向量化任务失败: {e}")
+    async def vectorize_document(text: str, file_path: Path, on_progress: Optional[ProgressCallback] = None) -> int:
+        """切分文本并写入 Milvus，返回片段数（失败时抛出异常，由任务队列重试）"""
+        from .milvus_service import MilvusService
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        
+        print(f"后台任务启动: 开始为 {file_path.name} 进行向量化...")
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200,
+            separators=["\n\n", "\n", "。", "！", "？", " ", ""]
+        )
+        chunks = text_splitter.split_text(text)
+        
+        if not chunks:
+            print("文档内容过少，跳过向量化")
+            return 0
+
+        await _report_progress(on_progress, "vectorize", 0, len(chunks))
+        milvus_service = MilvusService()
+        await milvus_service.add_documents(
+            texts=chunks,
+            metadatas=[{"source": str(file_path.name), "path": str(file_path)}] * len(chunks)
+        )
+        await _report_progress(on_progress, "vectorize", len(chunks), len(chunks))
+        print(f"后台任务完成: {len(chunks)} 个片段已存入 Milvus")
+        return len(chunks)
 
     @staticmethod
-    async def process_uploaded_file(file: UploadFile, background_tasks = None) -> Tuple[str, str]:
+    async def process_uploaded_file(file: UploadFile, vectorize: bool = False) -> Tuple[str, str]:
         """处理上传的文件并提取文本内容，返回 (文本内容, 文件URL)"""
+        file_path, is_existing_file = await FileService.store_upload(file)
+        return await FileService.process_saved_file(
+            file_path, file.filename or "", file.content_type, is_existing_file, vectorize=vectorize
+        )
+
+    @staticmethod
+    async def store_upload(file: UploadFile) -> Tuple[Path, bool]:
+        """按 MD5 去重保存上传文件，返回 (文件路径, 是否已存在)"""
         print(f"开始处理文件: {file.filename}, 类型: {file.content_type}")
         
         # 1. 计算 MD5 并保存文件 (去重)
@@ -456,16 +574,26 @@ class FileService:
         file_path = upload_dir / safe_filename
         
         # 检查是否已存在
-        is_existing_file = False
         if file_path.exists():
             print(f"文件已存在 (MD5命中): {file_path}")
-            is_existing_file = True
-        else:
-            async with aiofiles.open(file_path, 'wb') as f:
-                await f.write(content)
-            print(f"文件已保存至: {file_path}")
-            
-        file_url = f"/api/uploads/{safe_filename}"
+            return file_path, True
+        async with aiofiles.open(file_path, 'wb') as f:
+            await f.write(content)
+        print(f"文件已保存至: {file_path}")
+        return file_path, False
+
+    @staticmethod
+    async def process_saved_file(
+        file_path: Path,
+        filename: str,
+        content_type: Optional[str],
+        is_existing_file: bool,
+        vectorize: bool = False,
+        cleanup_on_error: bool = True,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> Tuple[str, str]:
+        """提取已保存文件的文本内容，返回 (文本内容, 文件URL)；on_progress 接收提取与 OCR 的进度"""
+        file_url = f"/api/uploads/{file_path.name}"
         
         # 2. 检查是否有缓存的解析结果
         # 我们约定：解析后的文本保存在 {filename}.txt 中
@@ -480,12 +608,12 @@ class FileService:
             return text, file_url
 
         try:
-            filename_lower = (file.filename or "").lower()
-            is_pdf = file.content_type == "application/pdf" or filename_lower.endswith(".pdf")
-            is_docx = (file.content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document" or 
+            filename_lower = filename.lower()
+            is_pdf = content_type == "application/pdf" or filename_lower.endswith(".pdf")
+            is_docx = (content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document" or 
                        filename_lower.endswith((".docx", ".docm")))
-            is_doc = file.content_type == "application/msword" or filename_lower.endswith(".doc")
-            is_image = (file.content_type and file.content_type.startswith("image/")) or filename_lower.endswith(('.png', '.jpg', '.jpeg', '.bmp', '.webp'))
+            is_doc = content_type == "application/msword" or filename_lower.endswith(".doc")
+            is_image = (content_type and content_type.startswith("image/")) or filename_lower.endswith(('.png', '.jpg', '.jpeg', '.bmp', '.webp'))
             
             needs_new_file = False
             text = ""
@@ -493,25 +621,43 @@ class FileService:
             if is_pdf:
                 print("检测到 PDF 文件，开始提取...")
                 # 1. 尝试快速提取文本层
-                text = await FileService.extract_text_from_pdf(file_path)
+                text, pages = await FileService.extract_pdf(file_path, on_progress)
+                if pages:
+                    print(f"PDF 提取完成，{FileService.summarize_pdf_pages(pages)}")
+                    if settings.debug:
+                        for page in pages:
+                            print(f"  第 {page['page']} 页: {page['kind']} / {page['strategy']}，{page['chars']} 字，{page['ms']} ms")
                 
-                # 2. 智能判定是否需要 OCR
+                # 2. 只对扫描页 OCR，结果按页序并回文本；没有逐页报告（回退提取）时按全文字数判断
                 clean_text = re.sub(r'\s+', '', text)
-                
-                if len(clean_text) > 100:
-                    print(f"PDF 文本层提取成功，有效字数: {len(clean_text)}，跳过 OCR。")
+                if pages:
+                    scanned = [page["page"] for page in pages if page["kind"] == "scanned"]
+                elif len(clean_text) <= 100:
+                    scanned = None
                 else:
-                    print(f"PDF 文本层提取内容过少 ({len(clean_text)} 字)，判定为扫描件或纯图片，启动 OCR...")
-                    ocr_text = await FileService.perform_ocr_on_pdf(file_path)
-                    if len(ocr_text) > len(text):
-                        text = ocr_text
-                        needs_new_file = True
+                    scanned = []
+
+                if scanned == []:
+                    print(f"PDF 文本层提取成功，有效字数: {len(clean_text)}，没有扫描页，跳过 OCR。")
+                elif scanned is None:
+                    print(f"PDF 文本层提取内容过少 ({len(clean_text)} 字)，判定为扫描件或纯图片，对全部页面 OCR...")
+                    if ocr_pages := await FileService.ocr_pdf_pages(file_path, on_progress=on_progress):
+                        ocr_text = "\n".join(f"\n--- 第 {number} 页 ---\n{page_text}" for number, page_text in sorted(ocr_pages.items())).strip()
+                        if len(ocr_text) > len(text):
+                            text = ocr_text
+                            needs_new_file = True
+                else:
+                    print(f"检测到 {len(scanned)} 个扫描页，启动 OCR...")
+                    if ocr_pages := await FileService.ocr_pdf_pages(file_path, scanned, on_progress=on_progress):
+                        text = replace_pages(text, ocr_pages)
+                        # 整份都是扫描件时，生成 OCR 结果 PDF 供预览
+                        needs_new_file = len(scanned) == len(pages)
             
             elif is_docx:
                 print("检测到 Word (Docx) 文件，开始提取...")
                 text = await FileService.extract_text_from_docx(file_path)
                 if not text.strip():
-                    if images := FileService.extract_images_from_docx(file_path):
+                    if images := await extraction_pool.run(FileService.extract_images_from_docx, str(file_path)):
                         print("检测到 Word 文档包含图片但无文字，尝试对图片进行 OCR...")
                         ocr_texts = []
                         from .openai_service import OpenAIService
@@ -520,6 +666,7 @@ class FileService:
                             base64_img = base64.b64encode(img_data).decode('utf-8')
                             if img_text := await openai_service.ocr_image(base64_img):
                                 ocr_texts.append(f"--- 图片 {i} (OCR) ---\n{img_text}")
+                            await _report_progress(on_progress, "ocr", i, len(images))
                         
                         if ocr_texts:
                             text = "\n\n".join(ocr_texts)
@@ -533,14 +680,14 @@ class FileService:
                 raise Exception("暂不支持旧版 Word (.doc) 格式。请将其转换为 .docx 格式后再上传。")
             
             elif is_image:
-                print(f"检测到图片文件: {file.filename}，开始 OCR 识别...")
+                print(f"检测到图片文件: {filename}，开始 OCR 识别...")
                 if text := await FileService.perform_ocr_on_image(file_path):
                     needs_new_file = True
                 else:
                     raise Exception("无法从该图片中提取文字内容，OCR 识别结果为空。")
             
             else:
-                raise Exception(f"不支持的文件类型: {file.content_type}")
+                raise Exception(f"不支持的文件类型: {content_type}")
 
             if not text or not text.strip():
                 raise Exception("无法从该文件中提取文字内容。")
@@ -562,9 +709,9 @@ class FileService:
             except Exception as e:
                 print(f"缓存写入失败: {e}")
 
-            # 将耗时的向量化操作移入后台任务
-            if background_tasks:
-                background_tasks.add_task(FileService.process_vectorization_background, text, file_path)
+            # 将耗时的向量化操作移入后台任务队列（从 .txt 缓存读取文本）
+            if vectorize:
+                await task_queue.submit("document.vectorize", {"file_path": str(file_path)})
                 print("已将向量化任务加入后台队列")
             
             return text, file_url
@@ -573,83 +720,126 @@ class FileService:
             # 注意：如果不删除文件，下次上传相同文件可能会因为找不到缓存而再次失败，
             # 但如果文件本身有问题，删除它是对的。
             # 如果是 existing_file，我们不应该删除它，因为它可能在其他地方被引用
-            if 'file_path' in locals() and not is_existing_file:
+            if cleanup_on_error and not is_existing_file:
                 FileService._safe_file_cleanup(file_path)
             raise e
 
     @staticmethod
     async def generate_pdf_from_text(text: str, output_path: str | Path) -> None:
-        """将文字内容生成 PDF 文件"""
+        """将文字内容生成 PDF 文件（排版在进程池中执行）"""
         try:
-            with fitz.open() as doc:
-                page = doc.new_page()
-                font_name = "china-s"
-                lines = text.split("\n")
-                y_offset, margin, line_height, font_size = 50, 50, 15, 10
-                chars_per_line = int((page.rect.width - 2 * margin) / (font_size * 0.8))
-                
-                for line in lines:
-                    if not line.strip():
-                        y_offset += line_height
-                        continue
-                    while len(line) > 0:
-                        if y_offset > page.rect.height - margin:
-                            page = doc.new_page()
-                            y_offset = 50
-                        chunk = line[:chars_per_line]
-                        line = line[chars_per_line:]
-                        with suppress(Exception):
-                            page.insert_text((margin, y_offset), chunk, fontname=font_name, fontsize=font_size)
-                        y_offset += line_height
-                doc.save(str(output_path))
+            await extraction_pool.run(FileService._write_text_pdf, text, str(output_path))
         except Exception as e:
             print(f"生成 PDF 失败: {e}")
 
     @staticmethod
-    async def perform_ocr_on_pdf(file_path: str | Path) -> str:
-        """对 PDF 文件进行 OCR 识别 (并发优化版)"""
+    def _write_text_pdf(text: str, output_path: str | Path) -> None:
+        with fitz.open() as doc:
+            page = doc.new_page()
+            font_name = "china-s"
+            lines = text.split("\n")
+            y_offset, margin, line_height, font_size = 50, 50, 15, 10
+            chars_per_line = int((page.rect.width - 2 * margin) / (font_size * 0.8))
+            
+            for line in lines:
+                if not line.strip():
+                    y_offset += line_height
+                    continue
+                while len(line) > 0:
+                    if y_offset > page.rect.height - margin:
+                        page = doc.new_page()
+                        y_offset = 50
+                    chunk = line[:chars_per_line]
+                    line = line[chars_per_line:]
+                    with suppress(Exception):
+                        page.insert_text((margin, y_offset), chunk, fontname=font_name, fontsize=font_size)
+                    y_offset += line_height
+            doc.save(str(output_path))
+
+    @staticmethod
+    async def ocr_pdf_pages(
+        file_path: str | Path, pages: Optional[List[int]] = None, on_progress: Optional[ProgressCallback] = None
+    ) -> Dict[int, str]:
+        """对 PDF 的指定页（页码从 1 开始，默认全部）OCR，返回 {页码: 识别文本}，失败或无内容的页不包含在内；
+        每处理完一页（含识别失败）上报一次进度，渲染失败的批按页数一并计入"""
         from .openai_service import OpenAIService
         openai_service = OpenAIService()
         
         try:
-            with fitz.open(str(file_path)) as doc:
-                max_pages = 35  
-                num_pages = min(doc.page_count, max_pages)
-                print(f"开始对 PDF 进行 OCR 识别，共 {num_pages} 页 (并发处理)...")
-                
-                tasks = []
-                for page_num in range(num_pages):
-                    page = doc[page_num]
-                    # 降低分辨率以加快传输和处理，matrix=1.5 通常足够识别文字
-                    pix = page.get_pixmap(matrix=fitz.Matrix(1.5, 1.5))
-                    base64_image = base64.b64encode(pix.tobytes("jpeg")).decode('utf-8')
-                    tasks.append(openai_service.ocr_image(base64_image))
-
-            # 并发执行 OCR 请求
-            # 注意：这可能会瞬间消耗大量 Token 或触发 API 速率限制
-            # 建议分批执行，例如每批 5 页
-            batch_size = 5
-            results = []
-            for i in range(0, len(tasks), batch_size):
-                batch = tasks[i:i + batch_size]
-                print(f"正在处理 OCR 批次 {i//batch_size + 1}/{(len(tasks)+batch_size-1)//batch_size}...")
-                batch_results = await asyncio.gather(*batch, return_exceptions=True)
-                results.extend(batch_results)
-
-            full_text = []
-            for i, res in enumerate(results):
-                if isinstance(res, Exception):
-                    print(f"PDF 第 {i + 1} 页 OCR 失败: {res}")
-                    full_text.append(f"--- 第 {i + 1} 页 (OCR 失败) ---")
-                elif res:
-                    full_text.append(f"--- 第 {i + 1} 页 (OCR) ---\n{res}")
-                else:
-                    full_text.append(f"--- 第 {i + 1} 页 (无内容) ---")
-            
-            return "\n\n".join(full_text)
+            if pages is None:
+                pages = list(range(1, await extraction_pool.run(FileService._pdf_page_count, str(file_path)) + 1))
+            print(f"开始对 PDF 进行 OCR 识别，共 {len(pages)} 页 (流水线处理)...")
+            started = time.perf_counter()
+
+            # 生产者按批在进程池中渲染页面放入有界队列，队列满时暂停渲染；
+            # 消费者保持固定数量的 OCR 请求在途，一页完成立即取下一页；内存中的页图片不超过 队列长度 + 在途数 + 渲染中的批
+            queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, settings.ocr_queue_size))
+            batch_size = max(1, settings.ocr_render_batch)
+            batches = iter([pages[i:i + batch_size] for i in range(0, len(pages), batch_size)])
+            texts: Dict[int, str] = {}
+            done = 0
+            await _report_progress(on_progress, "ocr", done, len(pages))
+
+            async def render() -> None:
+                nonlocal done
+                for batch in batches:
+                    try:
+                        images = await extraction_pool.run(FileService._render_pdf_pages, str(file_path), batch)
+                    except Exception as e:
+                        print(f"PDF 第 {batch[0]}-{batch[-1]} 页渲染失败: {e}")
+                        # 渲染失败的页不会再被识别，同样计入已处理，进度才能走到 total
+                        done += len(batch)
+                        await _report_progress(on_progress, "ocr", done, len(pages))
+                        continue
+                    for number, image in zip(batch, images):
+                        await queue.put((number, image))
+
+            async def recognize() -> None:
+                # 以后台优先级进入全局 LLM 调度器，由其统一控制并发与 RPM/TPM，不会挤占交互式的章节生成
+                nonlocal done
+                while (item := await queue.get()) is not None:
+                    number, image = item
+                    try:
+                        if res := await openai_service.ocr_image(image):
+                            texts[number] = res
+                        else:
+                            print(f"PDF 第 {number} 页 OCR 无内容")
+                    except Exception as e:
+                        print(f"PDF 第 {number} 页 OCR 失败: {e}")
+                    done += 1
+                    await _report_progress(on_progress, "ocr", done, len(pages))
+
+            recognizers = [asyncio.create_task(recognize()) for _ in range(max(1, settings.ocr_max_in_flight))]
+            try:
+                await asyncio.gather(*(render() for _ in range(max(1, settings.ocr_render_workers))))
+                for _ in recognizers:
+                    await queue.put(None)
+                await asyncio.gather(*recognizers)
+            finally:
+                for task in recognizers:
+                    task.cancel()
+
+            elapsed = time.perf_counter() - started
+            print(f"PDF OCR 完成：{len(texts)}/{len(pages)} 页，耗时 {elapsed:.1f} 秒（{len(pages) / max(elapsed, 1e-6):.1f} 页/秒）")
+            return texts
         except Exception as e:
             print(f"PDF OCR 异常: {e}")
-            return ""
+            return {}
+
+    @staticmethod
+    def _render_pdf_pages(file_path: str | Path, pages: List[int]) -> List[str]:
+        """把 PDF 的指定页（页码从 1 开始）渲染为 base64 编码的 JPEG"""
+        images = []
+        try:
+            with fitz.open(str(file_path)) as doc:
+                for number in pages:
+                    # 降低分辨率以加快传输和处理，matrix=1.5 通常足够识别文字
+                    pix = doc[number - 1].get_pixmap(matrix=fitz.Matrix(1.5, 1.5))
+                    images.append(base64.b64encode(pix.tobytes("jpeg")).decode('utf-8'))
+        finally:
+            # MuPDF 会缓存解码后的扫描图（默认上限 256MB），渲染进程常驻，每批结束后清空
+            fitz.TOOLS.store_shrink(100)
+        return images
 
     @staticmethod
     async def perform_ocr_on_image(file_path: str | Path) -> str:
@@ -664,3 +854,29 @@ class FileService:
         except Exception as e:
             print(f"图片 OCR 失败: {e}")
             return ""
+
+
+async def _process_document_task(payload: Dict[str, Any], context: TaskContext) -> Dict[str, Any]:
+    """后台任务：提取已保存上传文件的文本（重试期间保留文件，最后一次失败才清理）"""
+    text, file_url = await FileService.process_saved_file(
+        Path(payload["file_path"]),
+        payload["filename"],
+        payload.get("content_type"),
+        payload["is_existing"],
+        vectorize=payload.get("vectorize", False),
+        cleanup_on_error=context.is_last_attempt,
+        on_progress=context.report_progress,
+    )
+    return {"filename": payload["filename"], "file_content": text, "file_url": file_url}
+
+
+async def _vectorize_document_task(payload: Dict[str, Any], context: TaskContext) -> Dict[str, Any]:
+    """后台任务：把已提取的文本（.txt 缓存）写入向量库"""
+    file_path = Path(payload["file_path"])
+    async with aiofiles.open(file_path.with_suffix(file_path.suffix + ".txt"), 'r', encoding='utf-8') as f:
+        text = await f.read()
+    return {"chunks": await FileService.vectorize_document(text, file_path, context.report_progress)}
+
+
+task_queue.register("document.process", _process_document_task)
+task_queue.register("document.vectorize", _vectorize_document_task)
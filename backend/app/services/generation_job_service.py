@@ -0,0 +1,317 @@
+"""可断点续跑的整份标书内容生成任务
+
+提交目录后立即返回 job_id，生成在服务端后台进行，每完成一个叶子章节就写入本地 SQLite。
+浏览器断开、SSE 中断甚至服务重启都不会丢失已完成的章节，resume 时只生成缺失的叶子章节。
+
+任务状态与章节内容都以 SQLite 为准，因此多 worker 部署下任意进程都能查询、订阅和取消任务：
+取消通过写入 cancelling 状态实现，由实际执行任务的进程轮询发现后停止。
+sqlite3 是同步调用（锁等待最长 30 秒），协程中的数据库读写都经 asyncio.to_thread 放到线程中执行。
+"""
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from ..config import settings
+
+# 运行中的任务超过该时间没有心跳，视为所在进程已退出（可续跑）
+STALE_AFTER_SECONDS = 60
+HEARTBEAT_INTERVAL = 10
+FINAL_STATUSES = {"completed", "failed", "cancelled", "interrupted"}
+
+
+class GenerationJobService:
+    """内容生成任务的提交、执行、查询、取消与续跑"""
+
+    def __init__(self, db_path: str | Path) -> None:
+        self.db_path = Path(db_path)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._initialized = False
+        self._closing = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS generation_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    outline TEXT NOT NULL,
+                    project_overview TEXT NOT NULL DEFAULT '',
+                    concurrency INTEGER,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS generation_job_chapters (
+                    job_id TEXT NOT NULL,
+                    leaf_index INTEGER NOT NULL,
+                    chapter_id TEXT,
+                    content TEXT NOT NULL,
+                    error INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, leaf_index)
+                );
+            """)
+            self._initialized = True
+        return conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> None:
+        with self._connect() as conn:
+            conn.execute(sql, params)
+
+    def _set_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        self._execute(
+            "UPDATE generation_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            (status, error, time.time(), job_id),
+        )
+
+    def _set_status_unless_cancelled(self, job_id: str, status: str, error: Optional[str] = None) -> bool:
+        """执行进程写入的状态，不覆盖其他进程写入的 cancelling/cancelled；返回是否写入"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE generation_jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE id = ? AND status NOT IN ('cancelling', 'cancelled')",
+                (status, error, time.time(), job_id),
+            )
+        return cursor.rowcount > 0
+
+    def _failed_count(self, job_id: str) -> int:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS failed FROM generation_job_chapters WHERE job_id = ? AND error = 1",
+                (job_id,),
+            ).fetchone()
+        return row["failed"]
+
+    def _finish(self, job_id: str) -> None:
+        """生成结束：有出错章节时记为 failed（可续跑重新生成这些章节），否则记为 completed"""
+        failed = self._failed_count(job_id)
+        if failed:
+            self._set_status_unless_cancelled(job_id, "failed", f"{failed} 个章节生成失败")
+        else:
+            self._set_status_unless_cancelled(job_id, "completed")
+
+    def _load_job(self, job_id: str) -> Optional[sqlite3.Row]:
+        with self._connect() as conn:
+            return conn.execute("SELECT * FROM generation_jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def _completed_contents(self, job_id: str) -> Dict[int, str]:
+        """已成功完成的叶子章节 {叶子序号: 内容}（出错的章节不计入，续跑时会重新生成）"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT leaf_index, content FROM generation_job_chapters WHERE job_id = ? AND error = 0",
+                (job_id,),
+            ).fetchall()
+        return {row["leaf_index"]: row["content"] for row in rows}
+
+    @staticmethod
+    def _effective_status(job: sqlite3.Row) -> str:
+        if job["status"] in ("running", "cancelling") and time.time() - job["updated_at"] > STALE_AFTER_SECONDS:
+            return "interrupted"
+        return job["status"]
+
+    async def submit(self, outline: Dict[str, Any], project_overview: str = "", concurrency: Optional[int] = None) -> str:
+        """创建任务并在后台开始生成，返回 job_id"""
+        if not isinstance(outline, dict) or 'outline' not in outline:
+            raise ValueError("无效的outline数据格式")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO generation_jobs (id, status, outline, project_overview, concurrency, created_at, updated_at) "
+            "VALUES (?, 'pending', ?, ?, ?, ?, ?)",
+            (job_id, json.dumps(outline, ensure_ascii=False), project_overview, concurrency, now, now),
+        )
+        self._start(job_id)
+        return job_id
+
+    async def resume(self, job_id: str) -> Dict[str, Any]:
+        """续跑未完成的任务：只生成尚未成功的叶子章节"""
+        job = await asyncio.to_thread(self._load_job, job_id)
+        if job is None:
+            raise KeyError(job_id)
+        status = self._effective_status(job)
+        if status == "completed" and not await asyncio.to_thread(self._failed_count, job_id):
+            return await self.get_status(job_id)
+        if status in ("pending", "running", "cancelling") and job_id in self._tasks:
+            return await self.get_status(job_id)
+        if status in ("running", "cancelling"):
+            raise RuntimeError("任务正在其他进程中执行")
+        await asyncio.to_thread(self._set_status, job_id, "pending")
+        self._start(job_id)
+        return await self.get_status(job_id)
+
+    async def cancel(self, job_id: str) -> Dict[str, Any]:
+        job = await asyncio.to_thread(self._load_job, job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if self._effective_status(job) in ("pending", "running"):
+            await asyncio.to_thread(self._set_status, job_id, "cancelling")
+            if task := self._tasks.get(job_id):
+                task.cancel()
+        return await self.get_status(job_id)
+
+    async def get_status(self, job_id: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._get_status, job_id)
+
+    def _get_status(self, job_id: str) -> Dict[str, Any]:
+        job = self._load_job(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        with self._connect() as conn:
+            counts = conn.execute(
+                "SELECT COUNT(*) AS done, COALESCE(SUM(error), 0) AS failed FROM generation_job_chapters WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        return {
+            "job_id": job_id,
+            "status": self._effective_status(job),
+            "total": job["total"],
+            "completed": counts["done"],
+            "failed": counts["failed"],
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+        }
+
+    async def get_result(self, job_id: str) -> Dict[str, Any]:
+        """返回填入已完成章节内容的目录（任务未完成时为部分结果）"""
+        return await asyncio.to_thread(self._get_result, job_id)
+
+    def _get_result(self, job_id: str) -> Dict[str, Any]:
+        from .openai_service import OpenAIService
+
+        job = self._load_job(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        outline = json.loads(job["outline"])
+        contents = self._completed_contents(job_id)
+        for i, (chapter, _, _) in enumerate(OpenAIService._collect_leaf_chapters(outline['outline'])):
+            if contents.get(i):
+                chapter['content'] = contents[i]
+        return outline
+
+    def _poll(self, job_id: str) -> Tuple[Dict[str, Any], List[sqlite3.Row]]:
+        status = self._get_status(job_id)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT leaf_index, chapter_id, content, error, created_at FROM generation_job_chapters WHERE job_id = ? ORDER BY created_at",
+                (job_id,),
+            ).fetchall()
+        return status, rows
+
+    async def stream_events(self, job_id: str, poll_interval: float = 1.0) -> AsyncGenerator[Dict[str, Any], None]:
+        """轮询数据库推送任务进度：每个新完成（或续跑时重新生成）的章节一个 chapter 事件，状态或计数变化时一个 status 事件"""
+        # 章节行每次写入（INSERT OR REPLACE）都会刷新 created_at，以它作为行版本：
+        # 出错后在续跑中重新生成的章节版本变化，会再推送一次
+        sent: Dict[int, float] = {}
+        last_snapshot = None
+        while True:
+            status, rows = await asyncio.to_thread(self._poll, job_id)
+            for row in rows:
+                if sent.get(row["leaf_index"]) != row["created_at"]:
+                    sent[row["leaf_index"]] = row["created_at"]
+                    yield {
+                        "type": "chapter",
+                        "index": row["leaf_index"],
+                        "id": row["chapter_id"],
+                        "content": row["content"],
+                        "error": bool(row["error"]),
+                    }
+            snapshot = (status["status"], status["completed"], status["failed"])
+            if snapshot != last_snapshot:
+                last_snapshot = snapshot
+                yield {"type": "status", **status}
+            if status["status"] in FINAL_STATUSES:
+                return
+            await asyncio.sleep(poll_interval)
+
+    def _start(self, job_id: str) -> None:
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _heartbeat(self, job_id: str) -> None:
+        """定期刷新 updated_at，并检查是否被其他进程标记为取消"""
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            job = await asyncio.to_thread(self._load_job, job_id)
+            if job is None or job["status"] == "cancelling":
+                if task := self._tasks.get(job_id):
+                    task.cancel()
+                return
+            await asyncio.to_thread(self._execute, "UPDATE generation_jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def _mark_stopped(self, job_id: str) -> None:
+        """任务被中止：用户取消（cancelling）记为 cancelled；应用关闭时运行中的任务记为 interrupted 以便续跑。
+        只更新尚未进入终态的任务，不覆盖已写入的 completed/failed 等状态"""
+        self._execute(
+            "UPDATE generation_jobs SET status = CASE WHEN status = 'cancelling' THEN 'cancelled' ELSE ? END, updated_at = ? "
+            "WHERE id = ? AND status IN ('pending', 'running', 'cancelling')",
+            ("interrupted" if self._closing else "cancelled", time.time(), job_id),
+        )
+
+    async def _run(self, job_id: str) -> None:
+        from .openai_service import OpenAIService
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            job = await asyncio.to_thread(self._load_job, job_id)
+            if not await asyncio.to_thread(self._set_status_unless_cancelled, job_id, "running"):
+                # 开始执行前已被其他进程取消
+                await asyncio.to_thread(self._mark_stopped, job_id)
+                return
+            openai_service = OpenAIService()
+            events = openai_service.generate_content_for_outline_stream(
+                json.loads(job["outline"]),
+                project_overview=job["project_overview"],
+                concurrency=job["concurrency"],
+                completed_contents=await asyncio.to_thread(self._completed_contents, job_id),
+            )
+            async for event in events:
+                if event["type"] == "started":
+                    await asyncio.to_thread(self._execute, "UPDATE generation_jobs SET total = ? WHERE id = ?", (event["total"], job_id))
+                elif event["type"] == "leaf_completed":
+                    await asyncio.to_thread(
+                        self._execute,
+                        "INSERT OR REPLACE INTO generation_job_chapters (job_id, leaf_index, chapter_id, content, error, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (job_id, event["index"], event["id"], event["content"], int(event["error"]), time.time()),
+                    )
+            await asyncio.to_thread(self._finish, job_id)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self._mark_stopped, job_id)
+            raise
+        except Exception as e:
+            print(f"生成任务 {job_id} 失败: {e}")
+            await asyncio.to_thread(self._set_status_unless_cancelled, job_id, "failed", str(e))
+        finally:
+            heartbeat.cancel()
+            with suppress(asyncio.CancelledError):
+                await heartbeat
+
+    async def shutdown(self) -> None:
+        """应用关闭时中止本进程的任务，运行中的任务记为 interrupted 以便重启后续跑（已结束或已取消的任务保持原状态）"""
+        self._closing = True
+        tasks = list(self._tasks.items())
+        for _, task in tasks:
+            task.cancel()
+        for job_id, task in tasks:
+            with suppress(BaseException):
+                await task
+            # 尚未开始执行就被取消的任务不会经过 _run 的取消分支
+            await asyncio.to_thread(self._mark_stopped, job_id)
+
+
+# 全局生成任务服务实例
+generation_job_service = GenerationJobService(settings.job_db_path)
@@ -0,0 +1,213 @@
+"""LLM 响应缓存（内容寻址）
+
+以 (上游地址, model, messages, temperature, response_format, max_tokens) 的哈希为键，
+内存中保存一份 LRU，磁盘上按键落盘 JSON 文件，两者都受 TTL 约束。
+重复解析同一份招标文件时直接命中缓存，不再消耗 token。
+磁盘读写与容量清理都经 asyncio.to_thread 在线程中执行，不阻塞事件循环。
+磁盘文件的 mtime 固定为写入时间（TTL 据此判断），atime 记录最近访问时间（容量淘汰据此判断），
+命中只刷新 atime，频繁读取的条目到期后照样失效。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import settings
+from ..utils.request_context import llm_cache_bypass
+
+
+class LLMResponseCache:
+    """内存 LRU + 磁盘两级缓存"""
+
+    # 每写入多少次检查一次磁盘容量
+    PRUNE_INTERVAL = 50
+
+    def __init__(
+        self,
+        cache_dir: str | Path,
+        ttl: int,
+        max_memory_entries: int,
+        max_disk_entries: int,
+        enabled: bool = True,
+    ) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.enabled = enabled
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._writes_since_prune = 0
+        self.counters: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "bypassed": 0,
+        }
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: list,
+        temperature: float,
+        response_format: Optional[dict] = None,
+        max_tokens: Optional[int] = None,
+        base_url: str = "",
+    ) -> str:
+        """base_url 区分服务商：不同上游暴露同名模型时不共用缓存"""
+        payload = json.dumps(
+            {
+                "base_url": base_url,
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "response_format": response_format,
+                "max_tokens": max_tokens,
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _is_expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def _remember(self, key: str, created: float, value: str) -> None:
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中、过期或请求要求绕过时返回 None"""
+        if not self.enabled:
+            return None
+        if llm_cache_bypass.get():
+            self.counters["bypassed"] += 1
+            return None
+
+        if (entry := self._memory.get(key)) is not None:
+            created, value = entry
+            if not self._is_expired(created):
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return value
+            self._memory.pop(key, None)
+
+        if (entry := await asyncio.to_thread(self._read_disk, key)) is not None:
+            created, value = entry
+            self._remember(key, created, value)
+            self.counters["disk_hits"] += 1
+            return value
+
+        self.counters["misses"] += 1
+        return None
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, str]]:
+        path = self._disk_path(key)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            created, value = float(data["created"]), data["value"]
+            if self._is_expired(created):
+                path.unlink(missing_ok=True)
+                return None
+            # 只刷新 atime 作为磁盘 LRU 的访问时间，mtime 保持为写入时间
+            os.utime(path, (time.time(), created))
+            return created, value
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"读取 LLM 缓存失败: {e}")
+        return None
+
+    def _write_disk(self, key: str, created: float, value: str) -> bool:
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps({"created": created, "value": value}, ensure_ascii=False), encoding="utf-8")
+            tmp_path.replace(path)
+            os.utime(path, (created, created))
+            return True
+        except Exception as e:
+            print(f"写入 LLM 缓存失败: {e}")
+            return False
+
+    async def set(self, key: str, value: str) -> None:
+        if not self.enabled or not value:
+            return
+        created = time.time()
+        self._remember(key, created, value)
+        self.counters["stores"] += 1
+
+        if not await asyncio.to_thread(self._write_disk, key, created, value):
+            return
+
+        self._writes_since_prune += 1
+        if self._writes_since_prune >= self.PRUNE_INTERVAL:
+            self._writes_since_prune = 0
+            await asyncio.to_thread(self.prune)
+
+    async def delete(self, key: str) -> None:
+        self._memory.pop(key, None)
+        await asyncio.to_thread(self._disk_path(key).unlink, missing_ok=True)
+
+    def prune(self) -> int:
+        """删除过期文件（按 mtime 即写入时间），并按访问时间（atime）淘汰超出容量的磁盘条目，返回删除数量"""
+        if not self.cache_dir.exists():
+            return 0
+        removed = 0
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if self._is_expired(stat.st_mtime):
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                entries.append((stat.st_atime, path))
+
+        overflow = len(entries) - self.max_disk_entries
+        if overflow > 0:
+            for _, path in sorted(entries)[:overflow]:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    async def clear(self) -> None:
+        self._memory.clear()
+        await asyncio.to_thread(self._clear_disk)
+
+    def _clear_disk(self) -> None:
+        if self.cache_dir.exists():
+            for path in self.cache_dir.glob("*/*.json"):
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            "enabled": self.enabled,
+            **self.counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+# 全局 LLM 响应缓存实例
+llm_cache = LLMResponseCache(
+    cache_dir=settings.llm_cache_dir,
+    ttl=settings.llm_cache_ttl,
+    max_memory_entries=settings.llm_cache_max_memory_entries,
+    max_disk_entries=settings.llm_cache_max_disk_entries,
+    enabled=settings.llm_cache_enabled,
+)
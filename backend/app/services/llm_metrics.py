@@ -0,0 +1,218 @@
+"""LLM 调用遥测
+
+按 (接口路径, 调用步骤) 汇总每次 LLM 调用的 token 用量、首 token 延迟、总耗时、生成速度与重试次数，
+用于定位哪个流水线步骤主导了成本与延迟。token 用量优先取上游返回的 usage，
+上游未返回时（不支持 stream_options、流被提前关闭等）用本地分词估算，
+分词经 asyncio.to_thread 在线程中执行，长 prompt 不会阻塞事件循环，结果就绪后再计入汇总。
+因上游不支持 stream_options 而去掉该参数重新请求的次数单独计为 stream_options_fallbacks，不计入 retries。
+"""
+import asyncio
+import re
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from ..utils.request_context import request_endpoint
+from ..utils.stream_util import StreamAccumulator
+from ..utils.token_util import count_tokens, estimate_message_tokens
+
+# 每个标签保留的最近延迟样本数（用于计算分位数）
+LATENCY_SAMPLES = 512
+
+_ID_SEGMENT = re.compile(r"/[0-9a-fA-F-]{16,}(?=/|$)")
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LLMCallRecord:
+    """单次 LLM 调用的计时与用量"""
+
+    def __init__(self, endpoint: str, step: str, model: str, messages: list) -> None:
+        self.endpoint = endpoint
+        self.step = step
+        self.model = model
+        self.messages = messages
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.retries = 0
+        self.stream_options_fallbacks = 0
+        self.usage: Optional[Dict[str, int]] = None
+        self._output = StreamAccumulator()
+
+    def add_output(self, content: str) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self._output.append(content)
+
+    def set_usage(self, usage: Any) -> None:
+        """记录上游返回的 usage（兼容 openai 对象与 dict）"""
+        if usage is None:
+            return
+        get = usage.get if isinstance(usage, dict) else lambda name: getattr(usage, name, None)
+        details = get("prompt_tokens_details")
+        if details is not None:
+            cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)
+        else:
+            cached = None
+        self.usage = {
+            "prompt_tokens": int(get("prompt_tokens") or 0),
+            "completion_tokens": int(get("completion_tokens") or 0),
+            "cached_tokens": int(cached or 0),
+        }
+
+    def resolve_usage(self) -> Tuple[Dict[str, int], bool]:
+        """返回 (用量, 是否为上游上报)；上游未上报时用 tiktoken 分词，耗时与文本长度成正比，不要在事件循环中直接调用"""
+        if self.usage is not None:
+            return self.usage, True
+        return {
+            "prompt_tokens": estimate_message_tokens(self.messages, counter=count_tokens),
+            "completion_tokens": count_tokens(self._output.getvalue()),
+            "cached_tokens": 0,
+        }, False
+
+
+class _TagStats:
+    def __init__(self) -> None:
+        self.counters: Dict[str, int] = {
+            "calls": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "cache_hits": 0,
+            "retries": 0,
+            "stream_options_fallbacks": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+            "usage_reported": 0,
+            "usage_estimated": 0,
+        }
+        self.total_seconds = 0.0
+        self.ttft: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.latency: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.tokens_per_second: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def snapshot(self) -> Dict[str, Any]:
+        ttft, latency, tps = list(self.ttft), list(self.latency), list(self.tokens_per_second)
+        return {
+            **self.counters,
+            "total_tokens": self.counters["prompt_tokens"] + self.counters["completion_tokens"],
+            # 上游报告的前缀缓存命中占 prompt token 的比例（服务商对命中部分打折且首 token 更快）
+            "prompt_cache_ratio": round(self.counters["cached_tokens"] / self.counters["prompt_tokens"], 4)
+            if self.counters["prompt_tokens"] else 0.0,
+            "total_seconds": round(self.total_seconds, 3),
+            "ttft_p50": round(_percentile(ttft, 0.5), 3),
+            "ttft_p95": round(_percentile(ttft, 0.95), 3),
+            "latency_p50": round(_percentile(latency, 0.5), 3),
+            "latency_p95": round(_percentile(latency, 0.95), 3),
+            "tokens_per_second_avg": round(sum(tps) / len(tps), 1) if tps else 0.0,
+        }
+
+
+class LLMMetrics:
+    """进程内 LLM 调用指标汇总"""
+
+    def __init__(self) -> None:
+        self._stats: Dict[Tuple[str, str], _TagStats] = {}
+        self._pending: Set[asyncio.Task] = set()
+        self.started_at = time.time()
+
+    def _tag_stats(self, endpoint: str, step: str) -> _TagStats:
+        key = (endpoint, step)
+        if key not in self._stats:
+            self._stats[key] = _TagStats()
+        return self._stats[key]
+
+    @staticmethod
+    def _current_endpoint() -> str:
+        # 路径中的任务 ID 等替换为占位符，避免标签无限增长
+        return _ID_SEGMENT.sub("/{id}", request_endpoint.get()) or "-"
+
+    def start(self, step: str, model: str, messages: list) -> LLMCallRecord:
+        return LLMCallRecord(self._current_endpoint(), step or "-", model, messages)
+
+    def finish(self, record: LLMCallRecord, status: str) -> None:
+        """status: succeeded / failed / cancelled
+
+        在 finally 中同步调用；上游未上报用量时，本地分词放到线程中执行，完成后再计入 token 统计。
+        """
+        stats = self._tag_stats(record.endpoint, record.step)
+        now = time.perf_counter()
+
+        stats.counters["calls"] += 1
+        stats.counters[status] += 1
+        stats.counters["retries"] += record.retries
+        stats.counters["stream_options_fallbacks"] += record.stream_options_fallbacks
+
+        elapsed = now - record.started
+        stats.total_seconds += elapsed
+        if status == "succeeded":
+            stats.latency.append(elapsed)
+        generation_seconds = None
+        if record.first_token_at is not None:
+            stats.ttft.append(record.first_token_at - record.started)
+            if status == "succeeded":
+                generation_seconds = now - record.first_token_at
+
+        if record.usage is not None:
+            self._add_usage(record, record.usage, True, generation_seconds)
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._add_estimated_usage(record, generation_seconds))
+        except RuntimeError:  # 没有运行中的事件循环，直接在当前线程分词
+            self._add_usage(record, *record.resolve_usage(), generation_seconds)
+            return
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _add_estimated_usage(self, record: LLMCallRecord, generation_seconds: Optional[float]) -> None:
+        usage, reported = await asyncio.to_thread(record.resolve_usage)
+        self._add_usage(record, usage, reported, generation_seconds)
+
+    def _add_usage(self, record: LLMCallRecord, usage: Dict[str, int], reported: bool, generation_seconds: Optional[float]) -> None:
+        stats = self._tag_stats(record.endpoint, record.step)
+        stats.counters["prompt_tokens"] += usage["prompt_tokens"]
+        stats.counters["completion_tokens"] += usage["completion_tokens"]
+        stats.counters["cached_tokens"] += usage["cached_tokens"]
+        stats.counters["usage_reported" if reported else "usage_estimated"] += 1
+        if generation_seconds is not None and generation_seconds > 0 and usage["completion_tokens"]:
+            stats.tokens_per_second.append(usage["completion_tokens"] / generation_seconds)
+
+    async def flush(self) -> None:
+        """等待尚在线程中分词的用量计入汇总（读取快照前调用）"""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def record_cache_hit(self, step: str) -> None:
+        self._tag_stats(self._current_endpoint(), step or "-").counters["cache_hits"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        by_tag = [
+            {"endpoint": endpoint, "step": step, **stats.snapshot()}
+            for (endpoint, step), stats in self._stats.items()
+        ]
+        # 按 token 消耗降序，最贵的步骤排在最前
+        by_tag.sort(key=lambda item: item["total_tokens"], reverse=True)
+        totals: Dict[str, Any] = {}
+        for item in by_tag:
+            for name in ("calls", "succeeded", "failed", "cancelled", "cache_hits", "retries",
+                         "stream_options_fallbacks", "prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens"):
+                totals[name] = totals.get(name, 0) + item[name]
+        return {
+            "since": self.started_at,
+            "totals": totals,
+            "by_tag": by_tag,
+        }
+
+    def reset(self) -> None:
+        self._stats.clear()
+        self.started_at = time.time()
+
+
+# 全局 LLM 遥测实例
+llm_metrics = LLMMetrics()
@@ -0,0 +1,232 @@
+"""LLM 调用全局调度器
+
+所有经由 OpenAIService 的调用都在这里排队：
+- 按 RPM / TPM 两个令牌桶限速（0 表示不限制）
+- 并发槽位按优先级分配：交互式章节流 > 普通分析 > 后台 OCR 等批处理
+- 并发上限采用 AIMD：遇到 429/502 等过载错误时减半，健康时线性回升
+
+调度状态只在本进程内：多 worker 部署（run.py 按 CPU 核数启动）时每个进程各有一个调度器。
+RPM/TPM 是服务商的真实配额，按 worker_processes 平分，所有进程合计不超过配置值；
+并发上限是每个进程各自的值，不平分（否则一个进程内的整份目录生成只剩 1~2 个章节并行），
+由 AIMD 在遇到 429 时自行收缩。429 退避只作用于收到它的进程，其余进程由各自的平分 RPM/TPM 兜底。
+"""
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import openai
+
+from ..config import per_process_share, settings
+
+OVERLOAD_STATUS_CODES = {429, 502, 503, 504}
+
+
+class Priority(IntEnum):
+    """调度优先级，数值越小越先获得并发槽位"""
+    INTERACTIVE = 0  # 用户正在等待的流式输出（章节生成、文档分析）
+    NORMAL = 1       # 目录、Agent 等结构化调用
+    BACKGROUND = 2   # OCR、批量任务
+
+
+class TokenBucket:
+    """令牌桶：容量为每分钟额度，按秒连续回填"""
+
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float) -> None:
+        if not self.enabled:
+            return
+        # 单次请求超过桶容量时按容量计，避免永远等待
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        """事后记账（允许透支，透支部分由后续请求等待偿还）"""
+        if self.enabled:
+            self._refill()
+            self.tokens -= amount
+
+
+class SchedulerTicket:
+    """一次调用持有的槽位凭证，用于补记实际消耗的 token"""
+
+    def __init__(self, scheduler: "LLMScheduler") -> None:
+        self._scheduler = scheduler
+
+    def add_tokens(self, amount: int) -> None:
+        self._scheduler.tpm_bucket.consume(amount)
+
+
+class LLMScheduler:
+    """带优先级与 AIMD 自适应并发的调度器"""
+
+    def __init__(
+        self,
+        rpm: int = 0,
+        tpm: int = 0,
+        initial_concurrency: int = 16,
+        min_concurrency: int = 1,
+        max_concurrency: int = 32,
+        backoff_cooldown: float = 2.0,
+    ) -> None:
+        self.rpm_bucket = TokenBucket(rpm)
+        self.tpm_bucket = TokenBucket(tpm)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(max(min_concurrency, min(initial_concurrency, max_concurrency)))
+        self.backoff_cooldown = backoff_cooldown
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._last_backoff = 0.0
+        self.counters: Dict[str, int] = {
+            "completed": 0,
+            "overloads": 0,
+            "retries": 0,
+            "cancelled_streams": 0,
+            "tokens_saved_estimate": 0,
+        }
+        # 已完成调用的平均输出 token 数（指数滑动平均），用于估算提前取消节省的 token
+        self.avg_completion_tokens = 0.0
+
+    def _has_capacity(self) -> bool:
+        return self.active < int(self.limit)
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self._has_capacity():
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.active += 1
+            future.set_result(None)
+
+    async def _acquire_slot(self, priority: Priority) -> None:
+        if not self._waiters and self._has_capacity():
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已分配到槽位但调用方被取消，归还槽位
+                self._release_slot()
+            raise
+
+    def _release_slot(self) -> None:
+        self.active -= 1
+        self._wake_waiters()
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.NORMAL, estimated_tokens: int = 0) -> AsyncIterator[SchedulerTicket]:
+        """获取一个并发槽位，并按 RPM/TPM 预算限速"""
+        await self._acquire_slot(priority)
+        try:
+            await self.rpm_bucket.acquire(1)
+            await self.tpm_bucket.acquire(estimated_tokens)
+            yield SchedulerTicket(self)
+        finally:
+            self._release_slot()
+
+    def record_success(self, completion_tokens: int = 0) -> None:
+        """加性增：每个成功请求使上限增加 1/limit，约每轮并发 +1"""
+        self.counters["completed"] += 1
+        if completion_tokens:
+            self.avg_completion_tokens = (
+                completion_tokens if not self.avg_completion_tokens
+                else 0.9 * self.avg_completion_tokens + 0.1 * completion_tokens
+            )
+        self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+        self._wake_waiters()
+
+    def record_overload(self) -> None:
+        """乘性减：冷却期内的多次过载只减半一次"""
+        self.counters["overloads"] += 1
+        now = time.monotonic()
+        if now - self._last_backoff >= self.backoff_cooldown:
+            self._last_backoff = now
+            self.limit = max(float(self.min_concurrency), self.limit / 2)
+
+    def record_cancelled(self, emitted_tokens: int, max_tokens: int) -> None:
+        """流在完成前被关闭（客户端断开、校验失败等），按平均输出长度估算节省的 token"""
+        self.counters["cancelled_streams"] += 1
+        expected = self.avg_completion_tokens or max_tokens / 2
+        self.counters["tokens_saved_estimate"] += int(max(0.0, min(expected, max_tokens) - emitted_tokens))
+
+    def record_retry(self) -> None:
+        self.counters["retries"] += 1
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "worker_processes": settings.worker_processes,
+            "rpm_limit": int(self.rpm_bucket.capacity),
+            "tpm_limit": int(self.tpm_bucket.capacity),
+            "concurrency_limit": round(self.limit, 2),
+            "active": self.active,
+            "waiting": sum(1 for *_, f in self._waiters if not f.done()),
+            **self.counters,
+        }
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """是否为可退避重试的过载类错误（429 / 5xx 网关错误）"""
+    if isinstance(error, openai.RateLimitError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in OVERLOAD_STATUS_CODES
+    message = str(error)
+    return "502 Bad Gateway" in message or "rate limit" in message.lower()
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """是否为可直接重试的网络错误（连接失败、连接被重置、超时），不代表服务过载，不触发降并发"""
+    # APITimeoutError 是 APIConnectionError 的子类
+    return isinstance(error, openai.APIConnectionError)
+
+
+def backoff_delay(attempt: int, error: Optional[BaseException] = None) -> float:
+    """指数退避 + 抖动，优先遵循服务端返回的 Retry-After"""
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), settings.llm_max_backoff)
+            except ValueError:
+                pass
+    delay = min(settings.llm_max_backoff, settings.llm_base_backoff * (2 ** attempt))
+    return delay * (0.5 + random.random() / 2)
+
+
+# 全局调度器实例（每个进程一个，RPM/TPM 按进程数平分，并发上限为每进程的值）
+llm_scheduler = LLMScheduler(
+    rpm=per_process_share(settings.llm_rpm_limit),
+    tpm=per_process_share(settings.llm_tpm_limit),
+    initial_concurrency=settings.llm_initial_concurrency,
+    min_concurrency=settings.llm_min_concurrency,
+    max_concurrency=settings.llm_max_concurrency,
+)
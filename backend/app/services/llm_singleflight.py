@@ -0,0 +1,110 @@
+"""相同 LLM 请求的合并（single-flight）
+
+双击、前端重复渲染等会并发发出完全相同的请求（相同模型、messages 与参数）。
+同一时刻只向上游发起一次流式调用，后到的订阅者先补发已产出的片段，再与首个订阅者同步接收后续输出。
+所有订阅者都离开（如客户端全部断开）时取消上游调用。
+
+合并只在本进程内进行：多 worker 部署时，落到不同进程的相同请求仍会各自调用上游。
+请求键由调用方构造，需包含区分上游与凭据的部分（OpenAIService 使用 base_url + API Key 摘要 + 请求键），
+避免不同账号的请求共用一次调用。
+"""
+import asyncio
+from contextlib import suppress
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional
+
+from ..config import settings
+
+
+class _Flight:
+    """一次进行中的上游调用及其已产出的片段"""
+
+    __slots__ = ("chunks", "done", "error", "subscribers", "task", "_changed")
+
+    def __init__(self) -> None:
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: Optional[str] = None, done: bool = False) -> None:
+        if chunk:
+            self.chunks.append(chunk)
+        if done:
+            self.done = True
+        # 每次更新换一个新 Event，等待方先取旧 Event 再检查状态，不会丢失唤醒
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+class LLMSingleFlight:
+    """按请求键合并进行中的流式调用"""
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._flights: Dict[str, _Flight] = {}
+        self.counters: Dict[str, int] = {"flights": 0, "coalesced": 0, "abandoned": 0}
+
+    async def stream(self, key: str, factory: Callable[[], AsyncGenerator[str, None]]) -> AsyncGenerator[str, None]:
+        """订阅 key 对应的调用，不存在时用 factory() 创建上游生成器"""
+        if not self.enabled:
+            async for chunk in factory():
+                yield chunk
+            return
+
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            self.counters["flights"] += 1
+            flight.task = asyncio.create_task(self._run(key, flight, factory()))
+        else:
+            self.counters["coalesced"] += 1
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                changed = flight._changed
+                while index < len(flight.chunks):
+                    yield flight.chunks[index]
+                    index += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # 没有订阅者了，停止上游调用以免继续消耗 token
+                self.counters["abandoned"] += 1
+                self.forget(key, flight)
+                flight.task.cancel()
+
+    async def _run(self, key: str, flight: _Flight, generator: AsyncGenerator[str, None]) -> None:
+        try:
+            async for chunk in generator:
+                flight.publish(chunk)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            flight.error = e
+        finally:
+            with suppress(RuntimeError):
+                await generator.aclose()
+            self.forget(key, flight)
+            flight.publish(done=True)
+
+    def forget(self, key: str, flight: Optional[_Flight] = None) -> None:
+        """让后续请求不再加入该调用（如输出已被判定为无效、需要重新生成时）"""
+        if flight is None or self._flights.get(key) is flight:
+            self._flights.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "in_flight": len(self._flights), **self.counters}
+
+
+# 全局请求合并实例
+llm_singleflight = LLMSingleFlight(enabled=settings.llm_singleflight_enabled)
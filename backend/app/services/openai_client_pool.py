@@ -0,0 +1,77 @@
+"""进程级共享的 AsyncOpenAI 客户端池
+
+每个 OpenAIService 实例不再各自创建 AsyncOpenAI（以及其内部的 httpx 连接池），
+而是按 (api_key, base_url) 复用同一个客户端，使并发的章节流共享已建立的 keep-alive 连接。
+客户端按最近使用保留 llm_max_clients 个，设置页更换 API Key / base_url 后旧客户端会被移出池。
+淘汰时不主动关闭：OpenAIService（以及持有它的生成任务）可能仍在使用该客户端，
+池只释放自己的引用，待所有使用方结束后由垃圾回收释放连接。
+"""
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+import httpx
+import openai
+
+from ..config import settings
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class OpenAIClientPool:
+    """按 (api_key, base_url) 缓存 AsyncOpenAI 客户端（LRU）"""
+
+    def __init__(self, max_clients: int) -> None:
+        self.max_clients = max(1, max_clients)
+        self._clients: "OrderedDict[Tuple[str, str], openai.AsyncOpenAI]" = OrderedDict()
+        self.evicted = 0
+
+    def _build_http_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry,
+        )
+        timeout = httpx.Timeout(settings.llm_request_timeout, connect=settings.llm_connect_timeout)
+        return httpx.AsyncClient(
+            limits=limits,
+            timeout=timeout,
+            http2=settings.llm_http2 and HTTP2_AVAILABLE,
+        )
+
+    def get_client(self, api_key: str, base_url: str = "") -> openai.AsyncOpenAI:
+        """获取（或创建）与配置对应的共享客户端"""
+        key = (api_key or "", base_url or "")
+        client = self._clients.get(key)
+        if client is None or client.is_closed():
+            client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url if base_url else None,
+                http_client=self._build_http_client(),
+                # 重试由 OpenAIService 经 LLMScheduler 统一负责（过载错误触发 AIMD 降并发，连接/超时错误直接退避重试），
+                # SDK 内部重试会掩盖过载信号
+                max_retries=0,
+            )
+            self._clients[key] = client
+        self._clients.move_to_end(key)
+        while len(self._clients) > self.max_clients:
+            # 只丢弃引用，不关闭：其他 OpenAIService 可能仍持有该客户端并有请求在途
+            self._clients.popitem(last=False)
+            self.evicted += 1
+        return client
+
+    def stats(self) -> Dict[str, int]:
+        return {"clients": len(self._clients), "max_clients": self.max_clients, "evicted": self.evicted}
+
+    async def close_all(self) -> None:
+        """关闭池中所有客户端（应用关闭时调用）"""
+        clients, self._clients = list(self._clients.values()), OrderedDict()
+        await asyncio.gather(*(c.close() for c in clients), return_exceptions=True)
+
+
+# 全局客户端池实例
+client_pool = OpenAIClientPool(settings.llm_max_clients)
@@ -1,26 +1,84 @@
 import json
 import asyncio
 import copy
+import hashlib
 import traceback
 from typing import Dict, Any, List, AsyncGenerator
 
 import openai
 
+from ..config import settings
+from .artifact_cache import artifact_cache, artifact_version, content_md5
+from .llm_cache import llm_cache
+from .llm_metrics import LLMCallRecord, llm_metrics
+from .llm_singleflight import llm_singleflight
+from .llm_scheduler import Priority, llm_scheduler, is_overload_error, is_transient_error, backoff_delay
+from .openai_client_pool import client_pool
 from ..utils.outline_util import get_random_indexes, calculate_nodes_distribution, generate_one_outline_json_by_level1
-from ..utils.json_util import check_json, clean_json_string
+from ..utils.json_util import check_json, clean_json_string, collect_json_errors, StreamingJsonValidator
 from ..utils.config_manager import config_manager
+from ..utils.token_util import estimate_tokens, estimate_message_tokens
+from ..utils.stream_util import StreamAccumulator, ThinkTagFilter
+from ..utils.chunk_util import map_concurrently, split_document
+
+
+CHAPTER_SYSTEM_PROMPT = """你是一个专业的标书编写专家，负责为投标文件的技术标部分生成具体内容。
+
+要求：
+1. 内容要专业、准确，与章节标题和描述保持一致
+2. 这是技术方案，不是宣传报告，注意朴实无华，不要假大空
+3. 语言要正式、规范，符合标书写作要求，但不要使用奇怪的连接词，不要让人觉得内容像是AI生成的
+4. 内容要详细具体，避免空泛的描述
+5. 注意避免与同级章节内容重复，保持内容的独特性和互补性
+6. 如果提供了参考资料库中的内容，请优先参考其中的事实、数据和技术参数，但不要生硬照搬
+7. 直接返回章节内容，不生成标题，不要任何额外说明或格式标记
+"""
+
+# 招标文件分析的用户提示词：整份分析 / 分块提取 / 合并分块结果
+ANALYSIS_PROMPT = "请分析以下招标文件内容，提取{name}信息：\n\n{content}"
+ANALYSIS_MAP_PROMPT = "以下是招标文件的第 {index}/{total} 部分，请提取其中的{name}信息，本部分没有相关内容时只回复“无”：\n\n{content}"
+ANALYSIS_REDUCE_PROMPT = "以下是从同一份招标文件各部分分别提取的{name}信息，请合并去重，整理为一份完整的结果，输出格式与要求不变：\n\n{sections}"
 
 
 class OpenAIService:
+    # 拒绝 stream_options 参数的上游 base_url，后续请求不再附带
+    _usage_unsupported_urls: set = set()
+    # 模型路由的并发限制 {(任务类型, 上限): 信号量}，进程内所有实例共享
+    _route_semaphores: Dict[tuple, asyncio.Semaphore] = {}
+
     def __init__(self) -> None:
         config = config_manager.load_config()
         self.api_key = config.get('api_key', '')
         self.base_url = config.get('base_url', '')
         self.model_name = config.get('model_name', 'gpt-3.5-turbo')
-        self.client = openai.AsyncOpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url if self.base_url else None
+        self.model_routes: Dict[str, Dict[str, Any]] = config.get('model_routes') or {}
+        self.client = client_pool.get_client(self.api_key, self.base_url)
+
+    def _resolve_route(self, step: str, temperature: float, max_tokens: int) -> tuple[str, float, int, asyncio.Semaphore | None]:
+        """按调用步骤查找模型路由，返回 (模型, temperature, max_tokens, 并发信号量)
+
+        依次尝试完整步骤名与去掉末段后的前缀（analyze_overview -> analyze，agent_parse -> agent），
+        都未配置时使用全局 model_name 与调用方参数。
+        """
+        name = step
+        while name and name not in self.model_routes:
+            name = name.rpartition("_")[0]
+        route = self.model_routes.get(name) or {}
+
+        semaphore = None
+        if concurrency := route.get("concurrency"):
+            key = (name, int(concurrency))
+            semaphore = self._route_semaphores.setdefault(key, asyncio.Semaphore(int(concurrency)))
+        return (
+            route.get("model") or self.model_name,
+            temperature if route.get("temperature") is None else route["temperature"],
+            max_tokens if route.get("max_tokens") is None else route["max_tokens"],
+            semaphore,
         )
+
+    def routed_model(self, step: str) -> str:
+        """step 实际使用的模型名（用于派生结果缓存的版本号）"""
+        return self._resolve_route(step, 0.0, 0)[0]
     
     async def get_available_models(self) -> List[str]:
         try:
@@ -39,48 +97,54 @@ class OpenAIService:
         messages: list, 
         temperature: float = 0.7,
         response_format: dict = None,
-        max_tokens: int = 4096
+        max_tokens: int = 4096,
+        use_cache: bool = False,
+        priority: Priority = Priority.INTERACTIVE,
+        step: str = ""
     ) -> AsyncGenerator[str, None]:
-        try:
-            stream = await self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                temperature=temperature,
-                stream=True,
-                max_tokens=max_tokens,
-                **({"response_format": response_format} if response_format else {})
-            )
+        """流式调用 LLM
 
-            is_thinking = False
-            async for chunk in stream:
-                try:
-                    if not chunk.choices:
-                        continue
-                    
-                    content = chunk.choices[0].delta.content
-                    if content is None:
-                        continue
-                    
-                    if "<think>" in content:
-                        is_thinking = True
-                        if parts := content.split("<think>")[0]:
-                            yield parts
-                        continue
-                    
-                    if "</think>" in content:
-                        is_thinking = False
-                        if parts := content.split("</think>")[1]:
-                            yield parts
-                        continue
-                    
-                    if not is_thinking:
-                        yield content
-                        
-                except Exception as e:
-                    if isinstance(e, IndexError):
-                        traceback.print_exc()
-                    continue
+        step 为调用步骤（如 chapter、outline_l1、ocr），用于模型路由与遥测标签。
+        """
+        model, temperature, max_tokens, limiter = self._resolve_route(step, temperature, max_tokens)
+        key = self._cache_key(messages, temperature, response_format, max_tokens, model)
+        if use_cache and (cached := await llm_cache.get(key)) is not None:
+            llm_metrics.record_cache_hit(step)
+            yield cached
+            return
 
+        # 相同请求正在进行时直接订阅其输出，不再重复调用上游
+        upstream = llm_singleflight.stream(
+            self._flight_key(key),
+            lambda: self._stream_upstream(messages, temperature, response_format, max_tokens, priority, step, model, limiter,
+                                          cache_key=key if use_cache else None),
+        )
+        try:
+            async for content in upstream:
+                yield content
+        finally:
+            await upstream.aclose()
+
+    async def _stream_upstream(
+        self,
+        messages: list,
+        temperature: float,
+        response_format: dict | None,
+        max_tokens: int,
+        priority: Priority,
+        step: str,
+        model: str,
+        limiter: asyncio.Semaphore | None,
+        cache_key: str | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """调用上游并把异常转换为 "错误: ..." 文本，成功完成时写入缓存"""
+        parts = StreamAccumulator()
+        upstream = self._iter_completion(messages, temperature, response_format, max_tokens, priority, step, model, limiter)
+        try:
+            async for content in upstream:
+                if cache_key:
+                    parts.append(content)
+                yield content
         except Exception as e:
             traceback.print_exc()
             error_msg = str(e)
@@ -90,22 +154,211 @@ class OpenAIService:
                 yield "错误: 触发 API 频率限制，请稍后重试。"
             else:
                 yield f"错误: {error_msg}"
+            return
+        finally:
+            # 显式关闭上游生成器，使消费方提前退出时立即释放连接与调度槽位
+            await upstream.aclose()
+
+        if cache_key:
+            await llm_cache.set(cache_key, parts.getvalue())
+
+    async def _iter_completion(
+        self,
+        messages: list,
+        temperature: float,
+        response_format: dict | None,
+        max_tokens: int,
+        priority: Priority = Priority.INTERACTIVE,
+        step: str = "",
+        model: str | None = None,
+        limiter: asyncio.Semaphore | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """经全局调度器调用上游流式接口并过滤 think 块
+
+        过载错误（429/502 等）与网络错误（连接失败、超时）若发生在首个 token 之前则退避重试，其余异常直接抛出。
+        limiter 为模型路由配置的任务级并发限制。每次调用的用量、延迟与重试次数记入 llm_metrics。
+        """
+        model = model or self.model_name
+        estimated_tokens = estimate_message_tokens(messages)
+        record = llm_metrics.start(step, model, messages)
+        status = "failed"
+        if limiter is not None:
+            await limiter.acquire()
+        try:
+            for attempt in range(settings.llm_max_retries + 1):
+                # 去掉 stream_options 的重新请求不是失败重试，单独计数
+                record.retries = attempt - record.stream_options_fallbacks
+                emitted, emitted_tokens = False, 0
+                stream_usage = settings.llm_stream_usage and self.base_url not in self._usage_unsupported_urls
+                try:
+                    async with llm_scheduler.slot(priority, estimated_tokens) as ticket:
+                        stream = await self.client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            temperature=temperature,
+                            stream=True,
+                            max_tokens=max_tokens,
+                            **({"response_format": response_format} if response_format else {}),
+                            **({"stream_options": {"include_usage": True}} if stream_usage else {})
+                        )
+                        try:
+                            async for content in self._filter_think(stream, record):
+                                emitted = True
+                                tokens = estimate_tokens(content)
+                                emitted_tokens += tokens
+                                ticket.add_tokens(tokens)
+                                record.add_output(content)
+                                yield content
+                        except (GeneratorExit, asyncio.CancelledError):
+                            llm_scheduler.record_cancelled(emitted_tokens, max_tokens)
+                            raise
+                        finally:
+                            # 提前退出（如校验失败、客户端断开）时关闭底层 HTTP 流，停止继续计费
+                            await stream.close()
+                    llm_scheduler.record_success(emitted_tokens)
+                    status = "succeeded"
+                    return
+                except Exception as e:
+                    if stream_usage and isinstance(e, openai.BadRequestError) and "stream_options" in str(e) \
+                            and attempt < settings.llm_max_retries:
+                        # 部分 OpenAI 兼容服务不认识 stream_options，去掉后立即重试
+                        self._usage_unsupported_urls.add(self.base_url)
+                        record.stream_options_fallbacks += 1
+                        print(f"上游不支持 stream_options，改用本地估算 token 用量: {self.base_url}")
+                        continue
+                    overloaded = is_overload_error(e)
+                    if overloaded:
+                        llm_scheduler.record_overload()
+                    if emitted or not (overloaded or is_transient_error(e)) or attempt >= settings.llm_max_retries:
+                        raise
+                    delay = backoff_delay(attempt, e)
+                    llm_scheduler.record_retry()
+                    reason = "服务过载" if overloaded else "网络错误"
+                    print(f"LLM {reason} ({e.__class__.__name__})，{delay:.1f}s 后第 {attempt + 1} 次重试")
+                await asyncio.sleep(delay)
+        except (GeneratorExit, asyncio.CancelledError):
+            status = "cancelled"
+            raise
+        finally:
+            if limiter is not None:
+                limiter.release()
+            llm_metrics.finish(record, status)
+
+    @staticmethod
+    async def _filter_think(stream, record: LLMCallRecord | None = None) -> AsyncGenerator[str, None]:
+        """从流式 chunk 中提取正文，丢弃 <think> 块（标签可跨 chunk）；末尾携带 usage 的 chunk 记入 record"""
+        think_filter = ThinkTagFilter()
+        async for chunk in stream:
+            if record is not None and getattr(chunk, "usage", None):
+                record.set_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content and (visible := think_filter.feed(content)):
+                yield visible
+        if tail := think_filter.flush():
+            yield tail
+
+    def _cache_key(self, messages: list, temperature: float, response_format: dict | None, max_tokens: int, model: str | None = None) -> str:
+        return llm_cache.make_key(model or self.model_name, messages, temperature, response_format, max_tokens, self.base_url)
+
+    def _flight_key(self, cache_key: str) -> str:
+        """请求合并键：上游地址 + API Key 摘要 + 请求键，不同凭据的相同请求不会共用一次调用"""
+        credential = hashlib.sha256(self.api_key.encode("utf-8")).hexdigest()[:16]
+        return f"{self.base_url}|{credential}|{cache_key}"
 
     async def _collect_stream_text(
         self,
         messages: list,
         temperature: float = 0.7,
         response_format: dict | None = None,
+        use_cache: bool = False,
+        priority: Priority = Priority.INTERACTIVE,
+        step: str = "",
     ) -> str:
         """收集流式返回的文本到一个完整字符串"""
-        full_content = ""
-        async for chunk in self.stream_chat_completion(
+        return await StreamAccumulator.collect(self.stream_chat_completion(
             messages,
             temperature=temperature,
             response_format=response_format,
-        ):
-            full_content += chunk
-        return full_content
+            use_cache=use_cache,
+            priority=priority,
+            step=step,
+        ))
+
+    async def stream_document_analysis(
+        self,
+        system_prompt: str,
+        file_content: str,
+        analysis_name: str,
+        step: str,
+        temperature: float = 0.3,
+    ) -> AsyncGenerator[str, None]:
+        """流式分析招标文件
+
+        超过 analysis_chunk_chars 的文件按页切块并发提取（map），再把各块结果合并去重后流式输出（reduce），
+        避免整份文件塞进一个 prompt 超出上下文。完整结果按文件内容缓存，提示词或模型变化后自动失效。
+        """
+        md5 = content_md5(file_content)
+        version = artifact_version(
+            system_prompt, ANALYSIS_PROMPT, ANALYSIS_MAP_PROMPT, ANALYSIS_REDUCE_PROMPT, analysis_name, temperature,
+            settings.analysis_chunk_chars, *(self.routed_model(name) for name in (step, f"{step}_map", f"{step}_reduce")),
+        )
+        if (cached := await artifact_cache.aget(md5, step, version)) is not None:
+            yield cached
+            return
+
+        parts, failed = StreamAccumulator(), False
+        async for chunk in self._stream_document_analysis(system_prompt, file_content, analysis_name, step, temperature):
+            # 错误信息作为独立片段输出，出现过就不缓存
+            failed = failed or chunk.startswith("错误:")
+            parts.append(chunk)
+            yield chunk
+        if not failed:
+            await artifact_cache.aset(md5, step, version, parts.getvalue())
+
+    async def _stream_document_analysis(
+        self,
+        system_prompt: str,
+        file_content: str,
+        analysis_name: str,
+        step: str,
+        temperature: float,
+    ) -> AsyncGenerator[str, None]:
+        chunks = split_document(file_content, settings.analysis_chunk_chars)
+        if len(chunks) <= 1:
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": ANALYSIS_PROMPT.format(name=analysis_name, content=file_content)},
+            ]
+            async for chunk in self.stream_chat_completion(messages, temperature=temperature, use_cache=True, step=step):
+                yield chunk
+            return
+
+        async def extract(index: int, chunk: str) -> str:
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": ANALYSIS_MAP_PROMPT.format(
+                    index=index + 1, total=len(chunks), name=analysis_name, content=chunk)},
+            ]
+            return await self._collect_stream_text(messages, temperature=temperature, use_cache=True,
+                                                   priority=Priority.NORMAL, step=f"{step}_map")
+
+        partials = await map_concurrently(chunks, extract, settings.analysis_map_concurrency)
+        if error := next((p for p in partials if p.strip().startswith("错误:")), None):
+            yield error
+            return
+
+        sections = "\n\n".join(
+            f"【第 {i}/{len(chunks)} 部分】\n{partial.strip()}"
+            for i, partial in enumerate(partials, 1) if partial.strip() and partial.strip() != "无"
+        )
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": ANALYSIS_REDUCE_PROMPT.format(name=analysis_name, sections=sections)},
+        ]
+        async for chunk in self.stream_chat_completion(messages, temperature=temperature, use_cache=True, step=f"{step}_reduce"):
+            yield chunk
 
     async def _generate_with_json_check(
         self,
@@ -116,19 +369,39 @@ class OpenAIService:
         response_format: dict | None = None,
         log_prefix: str = "",
         raise_on_fail: bool = True,
+        use_cache: bool = False,
+        priority: Priority = Priority.NORMAL,
+        step: str = "",
     ) -> str:
+        """生成并校验 JSON 输出；step 缺省时以 log_prefix 作为遥测标签
+
+        use_cache 只应由抽取类调用开启（同一输入期望同一结果），采样生成的调用缓存后会对重复请求返回同一份"随机"输出。
+        """
         for attempt in range(max_retries + 1):
-            content = await self._collect_stream_text(
-                messages, temperature, response_format
+            # 最后一次尝试不提前终止，保证 raise_on_fail=False 时仍能拿到完整输出
+            validator = StreamingJsonValidator(schema) if attempt < max_retries else None
+            content, error_msg = await self._collect_json_stream(
+                messages, temperature, response_format, use_cache, priority, validator, step or log_prefix
             )
 
             if str(content).strip().startswith("错误:"):
                 raise Exception(content.strip())
 
-            is_valid, error_msg = check_json(str(content), schema)
+            if error_msg:
+                print(f"{log_prefix} 流式 JSON 校验提前终止: {error_msg}")
+                is_valid = False
+            else:
+                is_valid, error_msg = check_json(str(content), schema)
             if is_valid:
                 return content
 
+            # 不合格的结果不能留在缓存里，重试也不能再加入仍在进行的同一次调用，否则会一直拿到同一份坏数据
+            model, routed_temperature, max_tokens, _ = self._resolve_route(step or log_prefix, temperature, 4096)
+            key = self._cache_key(messages, routed_temperature, response_format, max_tokens, model)
+            llm_singleflight.forget(self._flight_key(key))
+            if use_cache:
+                await llm_cache.delete(key)
+
             if attempt >= max_retries:
                 prefix = f"{log_prefix} " if log_prefix else ""
                 print(f"{prefix}JSON 校验失败，已达最大重试次数: {error_msg}")
@@ -137,7 +410,40 @@ class OpenAIService:
                 return content
 
             print(f"{log_prefix} JSON 校验失败，第 {attempt + 1}/{max_retries} 次重试")
-            await asyncio.sleep(0.5)
+            if not validator or not validator.error:
+                await asyncio.sleep(0.5)
+
+    async def _collect_json_stream(
+        self,
+        messages: list,
+        temperature: float,
+        response_format: dict | None,
+        use_cache: bool,
+        priority: Priority,
+        validator: StreamingJsonValidator | None,
+        step: str = "",
+    ) -> tuple[str, str]:
+        """收集流式输出并增量校验 JSON 结构，发现违例时立即关闭上游流
+
+        返回 (已收到的文本, 违例描述)，未发现违例时违例描述为空字符串。
+        """
+        full_content = StreamAccumulator()
+        stream = self.stream_chat_completion(
+            messages,
+            temperature=temperature,
+            response_format=response_format,
+            use_cache=use_cache,
+            priority=priority,
+            step=step,
+        )
+        try:
+            async for chunk in stream:
+                full_content.append(chunk)
+                if validator and validator.feed(chunk):
+                    return full_content.getvalue(), validator.error
+        finally:
+            await stream.aclose()
+        return full_content.getvalue(), ""
 
     async def ocr_image(self, base64_image: str) -> str:
         """使用视觉模型进行 OCR 识别"""
@@ -161,33 +467,119 @@ class OpenAIService:
                 {"role": "user", "content": user_prompt}
             ]
 
-            response = await self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                temperature=0.1,
-                max_tokens=4096
-            )
-
-            return response.choices[0].message.content or ""
+            model, temperature, max_tokens, limiter = self._resolve_route("ocr", 0.1, 4096)
+            estimated_tokens = estimate_message_tokens(messages)
+            record = llm_metrics.start("ocr", model, messages)
+            status = "failed"
+            if limiter is not None:
+                await limiter.acquire()
+            try:
+                for attempt in range(settings.llm_max_retries + 1):
+                    record.retries = attempt
+                    try:
+                        async with llm_scheduler.slot(Priority.BACKGROUND, estimated_tokens) as ticket:
+                            response = await self.client.chat.completions.create(
+                                model=model,
+                                messages=messages,
+                                temperature=temperature,
+                                max_tokens=max_tokens
+                            )
+                        llm_scheduler.record_success()
+                        content = response.choices[0].message.content or ""
+                        ticket.add_tokens(estimate_tokens(content))
+                        record.add_output(content)
+                        record.set_usage(response.usage)
+                        status = "succeeded"
+                        return content
+                    except Exception as e:
+                        overloaded = is_overload_error(e)
+                        if not (overloaded or is_transient_error(e)) or attempt >= settings.llm_max_retries:
+                            raise
+                        if overloaded:
+                            llm_scheduler.record_overload()
+                        llm_scheduler.record_retry()
+                        await asyncio.sleep(backoff_delay(attempt, e))
+            except asyncio.CancelledError:
+                status = "cancelled"
+                raise
+            finally:
+                if limiter is not None:
+                    limiter.release()
+                llm_metrics.finish(record, status)
         except Exception as e:
             print(f"OCR 识别失败: {e}")
             return ""
 
-    async def generate_content_for_outline(self, outline: Dict[str, Any], project_overview: str = "") -> Dict[str, Any]:
+    async def generate_content_for_outline(self, outline: Dict[str, Any], project_overview: str = "", concurrency: int | None = None) -> Dict[str, Any]:
         """为目录结构生成内容"""
         try:
-            if not isinstance(outline, dict) or 'outline' not in outline:
-                raise Exception("无效的outline数据格式")
-            
-            result_outline = copy.deepcopy(outline)
-            await self._process_outline_recursive(result_outline['outline'], [], project_overview)
+            result_outline = None
+            async for event in self.generate_content_for_outline_stream(outline, project_overview, concurrency):
+                if event["type"] == "completed":
+                    result_outline = event["outline"]
             return result_outline
             
         except Exception as e:
             raise Exception(f"处理过程中发生错误: {e}") from e
-    
-    async def _process_outline_recursive(self, chapters: list, parent_chapters: list = None, project_overview: str = "") -> None:
-        """递归处理章节列表"""
+
+    async def generate_content_for_outline_stream(self, outline: Dict[str, Any], project_overview: str = "", concurrency: int | None = None, completed_contents: Dict[int, str] | None = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """并发生成目录中所有叶子章节的内容，并以事件形式流式返回进度
+
+        事件依次为 started、若干 leaf_started / leaf_completed（按实际完成顺序），最后是 completed，
+        其中 completed 携带填充好内容的完整目录，章节顺序与输入保持一致。
+        completed_contents 为 {叶子序号: 内容}，这些章节直接填入已有内容、不再生成（用于断点续跑）。
+        """
+        if not isinstance(outline, dict) or 'outline' not in outline:
+            raise Exception("无效的outline数据格式")
+
+        result_outline = copy.deepcopy(outline)
+        all_leaves = self._collect_leaf_chapters(result_outline['outline'])
+        completed_contents = completed_contents or {}
+        leaves = []
+        for i, leaf in enumerate(all_leaves):
+            if i in completed_contents:
+                if completed_contents[i]:
+                    leaf[0]['content'] = completed_contents[i]
+            else:
+                leaves.append((i, leaf))
+        limit = max(1, concurrency or settings.content_generation_concurrency)
+        sem = asyncio.Semaphore(limit)
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def run_leaf(index: int, chapter: dict, parents: list, siblings: list) -> None:
+            content, error = "", False
+            try:
+                async with sem:
+                    await queue.put({"type": "leaf_started", "index": index, "id": chapter.get('id', 'unknown')})
+                    content = await self._collect_chapter_content(chapter, parents, siblings, project_overview)
+                error = content.startswith("错误:")
+                # 错误信息只随事件上报，不写入目录正文
+                if content and not error:
+                    chapter['content'] = content
+            except Exception as e:
+                content, error = f"错误: {e}", True
+            finally:
+                await queue.put({"type": "leaf_completed", "index": index, "id": chapter.get('id', 'unknown'), "content": content, "error": error})
+
+        yield {"type": "started", "total": len(all_leaves), "skipped": len(all_leaves) - len(leaves), "concurrency": limit}
+        tasks = [asyncio.create_task(run_leaf(i, *leaf)) for i, leaf in leaves]
+        try:
+            completed = len(all_leaves) - len(leaves)
+            while completed < len(all_leaves):
+                event = await queue.get()
+                if event["type"] == "leaf_completed":
+                    completed += 1
+                    event.update(completed=completed, total=len(all_leaves))
+                yield event
+            yield {"type": "completed", "outline": result_outline}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _collect_leaf_chapters(chapters: list, parent_chapters: list = None) -> List[tuple]:
+        """深度优先收集叶子章节，返回 [(章节, 上级章节列表, 同级章节列表), ...]"""
+        leaves = []
         for chapter in chapters:
             is_leaf = 'children' not in chapter or not chapter.get('children', [])
             current_chapter_info = {
@@ -196,39 +588,24 @@ class OpenAIService:
                 'description': chapter.get('description', '')
             }
             
-            current_parent_chapters = (parent_chapters or []) + [current_chapter_info]
-            
             if is_leaf:
-                content = ""
-                async for chunk in self._generate_chapter_content(
-                    chapter, 
-                    current_parent_chapters[:-1],
-                    chapters,
-                    project_overview
-                ):
-                    content += chunk
-                if content:
-                    chapter['content'] = content
+                leaves.append((chapter, parent_chapters or [], chapters))
             else:
-                await self._process_outline_recursive(chapter['children'], current_parent_chapters, project_overview)
+                leaves.extend(OpenAIService._collect_leaf_chapters(chapter['children'], (parent_chapters or []) + [current_chapter_info]))
+        return leaves
+
+    async def _collect_chapter_content(self, chapter: dict, parent_chapters: list = None, sibling_chapters: list = None, project_overview: str = "") -> str:
+        """完整收集单个章节的生成内容"""
+        return await StreamAccumulator.collect(
+            self._generate_chapter_content(chapter, parent_chapters, sibling_chapters, project_overview)
+        )
     
     async def _generate_chapter_content(self, chapter: dict, parent_chapters: list = None, sibling_chapters: list = None, project_overview: str = "") -> AsyncGenerator[str, None]:
         """为单个章节流式生成内容"""
         try:
             chapter_id = chapter.get('id', 'unknown')
-            
-            # 1. 构建基础上下文
-            context_info = ""
-            if parent_chapters:
-                context_info += "上级章节信息：\n" + "".join(f"- {p.get('id')} {p.get('title')}\n  {p.get('description')}\n" for p in parent_chapters)
-            
-            if sibling_chapters:
-                context_info += "同级章节信息（请避免内容重复）：\n" + "".join(
-                    f"- {s.get('id')} {s.get('title')}\n  {s.get('description')}\n" 
-                    for s in sibling_chapters if s.get('id') != chapter_id
-                )
 
-            # 2. 尝试从 Milvus 检索相关上下文 (RAG)
+            # 尝试从 Milvus 检索相关上下文 (RAG)
             rag_context = ""
             try:
                 from .milvus_service import MilvusService
@@ -247,21 +624,33 @@ class OpenAIService:
                 print(f"Milvus 检索失败: {e}")
                 # RAG 失败不应阻断生成
 
-            # 3. 构建 Prompt
-            system_prompt = """你是一个专业的标书编写专家，负责为投标文件的技术标部分生成具体内容。
+            if settings.chapter_prompt_layout == "prefix":
+                messages = self._chapter_messages_prefix(chapter, parent_chapters, sibling_chapters, project_overview, rag_context)
+            else:
+                messages = self._chapter_messages_legacy(chapter, parent_chapters, sibling_chapters, project_overview, rag_context)
+            async for chunk in self.stream_chat_completion(messages, temperature=0.7, step="chapter"):
+                yield chunk
+        except Exception as e:
+            print(f"生成章节内容时出错: {e}")
+            yield f"错误: {e}"
 
-要求：
-1. 内容要专业、准确，与章节标题和描述保持一致
-2. 这是技术方案，不是宣传报告，注意朴实无华，不要假大空
-3. 语言要正式、规范，符合标书写作要求，但不要使用奇怪的连接词，不要让人觉得内容像是AI生成的
-4. 内容要详细具体，避免空泛的描述
-5. 注意避免与同级章节内容重复，保持内容的独特性和互补性
-6. 如果提供了参考资料库中的内容，请优先参考其中的事实、数据和技术参数，但不要生硬照搬
-7. 直接返回章节内容，不生成标题，不要任何额外说明或格式标记
-"""
-            project_info = f"项目概述信息：\n{project_overview}\n\n" if project_overview.strip() else ""
-            
-            user_prompt = f"""{project_info}{context_info}{rag_context}
+    @staticmethod
+    def _chapter_messages_legacy(chapter: dict, parent_chapters: list | None, sibling_chapters: list | None, project_overview: str, rag_context: str) -> list:
+        """原有布局：项目概述、上级/同级（不含本章）、参考资料与本章信息拼在同一条 user 消息中"""
+        chapter_id = chapter.get('id', 'unknown')
+        context_info = ""
+        if parent_chapters:
+            context_info += "上级章节信息：\n" + "".join(f"- {p.get('id')} {p.get('title')}\n  {p.get('description')}\n" for p in parent_chapters)
+        
+        if sibling_chapters:
+            context_info += "同级章节信息（请避免内容重复）：\n" + "".join(
+                f"- {s.get('id')} {s.get('title')}\n  {s.get('description')}\n" 
+                for s in sibling_chapters if s.get('id') != chapter_id
+            )
+
+        project_info = f"项目概述信息：\n{project_overview}\n\n" if project_overview.strip() else ""
+        
+        user_prompt = f"""{project_info}{context_info}{rag_context}
 当前章节信息：
 章节ID: {chapter_id}
 章节标题: {chapter.get('title')}
@@ -269,14 +658,74 @@ class OpenAIService:
 
 请根据项目概述信息、参考资料和上述章节层级关系，生成详细的专业内容。"""
 
-            messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
-            async for chunk in self.stream_chat_completion(messages, temperature=0.7):
-                yield chunk
-        except Exception as e:
-            print(f"生成章节内容时出错: {e}")
-            yield f"错误: {e}"
+        return [{"role": "system", "content": CHAPTER_SYSTEM_PROMPT}, {"role": "user", "content": user_prompt}]
+
+    @staticmethod
+    def _chapter_messages_prefix(chapter: dict, parent_chapters: list | None, sibling_chapters: list | None, project_overview: str, rag_context: str) -> list:
+        """前缀缓存友好布局：按稳定程度由高到低排列，使同一项目的各章节请求共享尽可能长的相同前缀
+
+        1. system：固定写作要求 + 项目概述（同一项目的所有章节完全一致）
+        2. user 开头：上级章节与完整的同级章节列表（同一父章节下的兄弟章节完全一致）
+        3. user 结尾：参考资料与本章信息（每章不同）
+        """
+        chapter_id = chapter.get('id', 'unknown')
+        system_prompt = CHAPTER_SYSTEM_PROMPT
+        if project_overview.strip():
+            system_prompt += f"\n项目概述信息：\n{project_overview}\n"
+
+        context_info = ""
+        if parent_chapters:
+            context_info += "上级章节信息：\n" + "".join(f"- {p.get('id')} {p.get('title')}\n  {p.get('description')}\n" for p in parent_chapters)
+        if sibling_chapters:
+            # 同级列表包含本章，保证兄弟章节之间这一段完全相同；本章在下方单独标出
+            context_info += "同级章节信息（请避免与其他同级章节内容重复）：\n" + "".join(
+                f"- {s.get('id')} {s.get('title')}\n  {s.get('description')}\n" for s in sibling_chapters
+            )
+
+        user_prompt = f"""{context_info}{rag_context}
+当前章节信息：
+章节ID: {chapter_id}
+章节标题: {chapter.get('title')}
+章节描述: {chapter.get('description')}
+
+请根据项目概述信息、参考资料和上述章节层级关系，生成详细的专业内容。"""
+
+        return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
             
     async def generate_outline_v2(self, overview: str, requirements: str, project_type: str = "general", project_sub_type: str = None) -> Dict[str, Any]:
+        level_l1, dist = await self._generate_level1_outline(overview, requirements, project_type, project_sub_type)
+        if not level_l1:
+            return {"outline": []}
+
+        # 并发度由全局 LLM 调度器统一控制
+        results = await asyncio.gather(*(
+            self._safe_process_level1_node(i, n, dist, level_l1, overview, requirements, project_type, project_sub_type)
+            for i, n in enumerate(level_l1)
+        ))
+        return {"outline": [chapter for _, chapter in results]}
+
+    async def generate_outline_v2_stream(self, overview: str, requirements: str, project_type: str = "general", project_sub_type: str = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """按章节流式生成目录：先返回一级提纲，再按完成顺序逐章返回二三级目录"""
+        level_l1, dist = await self._generate_level1_outline(overview, requirements, project_type, project_sub_type)
+        yield {
+            "type": "level1",
+            "chapters": [{"id": str(i + 1), "title": n.get("new_title", "")} for i, n in enumerate(level_l1)],
+        }
+
+        tasks = [
+            asyncio.create_task(self._safe_process_level1_node(i, n, dist, level_l1, overview, requirements, project_type, project_sub_type))
+            for i, n in enumerate(level_l1)
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                i, chapter = await finished
+                yield {"type": "chapter", "index": i, "id": str(i + 1), "chapter": chapter}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _generate_level1_outline(self, overview: str, requirements: str, project_type: str = "general", project_sub_type: str = None) -> tuple[list, dict]:
+        """生成一级提纲并计算各章节点分配，返回 (一级提纲列表, 节点分配)"""
         schema_json = json.dumps([{"rating_item": "原评分项", "new_title": "根据评分项修改的标题"}])
         type_hints = {
             "engineering": "工程类项目：提纲应侧重于技术细节、施工方案、安全质量保证和工艺流程。",
@@ -292,7 +741,7 @@ class OpenAIService:
         user_prompt = f"### 项目信息\n<overview>\n{overview}\n</overview>\n<requirements>\n{requirements}\n</requirements>"
         messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
 
-        full_content = await self._generate_with_json_check(messages, schema_json, response_format={"type": "json_object"}, log_prefix="一级提纲")
+        full_content = await self._generate_with_json_check(messages, schema_json, response_format={"type": "json_object"}, log_prefix="一级提纲", step="outline_l1")
         level_l1 = json.loads(clean_json_string(full_content))
         
         if len(level_l1) >= 2:
@@ -300,30 +749,27 @@ class OpenAIService:
         elif len(level_l1) == 1:
             index1, index2 = 0, 0
         else:
-            return {"outline": []}
+            return [], {}
 
         # 增加总叶子节点预估数量，确保大项目目录不会被过度压缩
         # 以前是 100000 // 1500 (约66个)，现在增加到 150 个左右
         total_leaf_nodes_limit = max(150, len(level_l1) * 10)
         dist = calculate_nodes_distribution(len(level_l1), (index1, index2), total_leaf_nodes_limit)
-        
-        sem = asyncio.Semaphore(5)  # 增加并发量
-        async def sem_node(i, node):
-            try:
-                async with sem: 
-                    return await self.process_level1_node(i, node, dist, level_l1, overview, requirements, project_type, project_sub_type)
-            except Exception as e:
-                print(f"处理第 {i+1} 章大纲时失败: {e}")
-                # 容错处理：返回一个基础结构的节点，而不是让整个大纲生成失败
-                return {
-                    "id": str(i + 1),
-                    "title": node.get("new_title", f"第 {i+1} 章"),
-                    "description": "该章节目录生成失败，请尝试重新生成或手动编辑",
-                    "children": []
-                }
+        return level_l1, dist
 
-        outline = await asyncio.gather(*(sem_node(i, n) for i, n in enumerate(level_l1)))
-        return {"outline": outline}
+    async def _safe_process_level1_node(self, i, node, dist, level_l1, overview, requirements, project_type: str = "general", project_sub_type: str = None) -> tuple[int, dict]:
+        """生成单章二三级目录，失败时返回占位节点，返回 (章节下标, 章节)"""
+        try:
+            return i, await self.process_level1_node(i, node, dist, level_l1, overview, requirements, project_type, project_sub_type)
+        except Exception as e:
+            print(f"处理第 {i+1} 章大纲时失败: {e}")
+            # 容错处理：返回一个基础结构的节点，而不是让整个大纲生成失败
+            return i, {
+                "id": str(i + 1),
+                "title": node.get("new_title", f"第 {i+1} 章"),
+                "description": "该章节目录生成失败，请尝试重新生成或手动编辑",
+                "children": []
+            }
     
     async def process_level1_node(self, i, node, dist, level_l1, overview, requirements, project_type: str = "general", project_sub_type: str = None) -> dict:
         json_outline = generate_one_outline_json_by_level1(node["new_title"], i + 1, dist)
@@ -340,5 +786,80 @@ class OpenAIService:
         sys_p = f"你是标书专家。\n### 任务\n1. 补全二三级目录\n### 行业要求\n{hint}\n### Output Format\n{json_outline}"
         user_p = f"### 项目信息\n<overview>\n{overview}\n</overview>\n<requirements>\n{requirements}\n</requirements>\n<other_outline>\n{other_outline}\n</other_outline>"
         
-        content = await self._generate_with_json_check([{"role": "system", "content": sys_p}, {"role": "user", "content": user_p}], json_outline, response_format={"type": "json_object"}, log_prefix=f"第{i+1}章", raise_on_fail=False)
-        return json.loads(content.strip())
+        # 整章只完整生成一轮（含一次重试），剩余的结构问题交给子树级修复，避免整章反复重写
+        content = await self._generate_with_json_check([{"role": "system", "content": sys_p}, {"role": "user", "content": user_p}], json_outline, max_retries=1, response_format={"type": "json_object"}, log_prefix=f"第{i+1}章", raise_on_fail=False, step="outline_l2")
+        data = json.loads(clean_json_string(content))
+        return await self._repair_outline_subtrees(data, json_outline, hint, user_p, log_prefix=f"第{i+1}章")
+
+    async def _repair_outline_subtrees(self, data: Any, skeleton: dict, hint: str, project_prompt: str, log_prefix: str = "", max_rounds: int = 2) -> Any:
+        """只针对校验失败的二级目录子树重新请求模型，并合并回整章结果
+
+        根节点缺失的 id/title/description 直接用骨架补齐；若问题出在子树之外（如缺少 children 或其类型错误），
+        无法局部修复，原样返回。
+        """
+        fillable_keys = ("id", "title", "description")
+        for _ in range(max_rounds):
+            errors = collect_json_errors(data, skeleton)
+            if not errors:
+                return data
+
+            broken, unrepairable = set(), []
+            for parts, message in errors:
+                if len(parts) >= 2 and parts[0] == "children" and isinstance(parts[1], int):
+                    broken.add(parts[1])
+                elif not parts and isinstance(data, dict) and all(key in data or key in fillable_keys for key in skeleton):
+                    for key in fillable_keys:
+                        data.setdefault(key, skeleton[key])
+                else:
+                    unrepairable.append(message)
+
+            if unrepairable:
+                print(f"{log_prefix} 目录结构无法局部修复: {'; '.join(unrepairable)}")
+                return data
+            if not broken:
+                continue
+
+            print(f"{log_prefix} 局部修复 {len(broken)} 个二级目录: {', '.join(str(j + 1) for j in sorted(broken))}")
+            indexes = sorted(broken)
+            results = await asyncio.gather(*(
+                self._regenerate_outline_subtree(data, skeleton, j, hint, project_prompt, log_prefix) for j in indexes
+            ))
+            for j, subtree in zip(indexes, results):
+                if subtree is not None:
+                    data["children"][j] = subtree
+        if errors := collect_json_errors(data, skeleton):
+            print(f"{log_prefix} {max_rounds} 轮局部修复后目录结构仍不符合要求: {errors[0][1]}")
+        return data
+
+    async def _regenerate_outline_subtree(self, data: dict, skeleton: dict, index: int, hint: str, project_prompt: str, log_prefix: str = "") -> dict | None:
+        """重新生成单个二级目录（含其三级目录），失败时返回 None"""
+        skeleton_children = skeleton.get("children") or []
+        if not skeleton_children:
+            return None
+        sub_skeleton = copy.deepcopy(skeleton_children[min(index, len(skeleton_children) - 1)])
+        sub_id = f"{skeleton['id']}.{index + 1}"
+        sub_skeleton["id"] = sub_id
+        for k, leaf in enumerate(sub_skeleton.get("children", [])):
+            leaf["id"] = f"{sub_id}.{k + 1}"
+
+        siblings = "\n".join(
+            f"{c.get('id', '')} {c.get('title', '')}"
+            for j, c in enumerate(data.get("children", []))
+            if j != index and isinstance(c, dict)
+        )
+        sub_schema = json.dumps(sub_skeleton, ensure_ascii=False)
+        sys_p = f"你是标书专家。\n### 任务\n1. 补全一级目录【{skeleton['title']}】下编号为 {sub_id} 的二级目录及其三级目录\n### 行业要求\n{hint}\n### Output Format\n{sub_schema}"
+        user_p = f"{project_prompt}\n<sibling_outline>\n{siblings}\n</sibling_outline>"
+        try:
+            content = await self._generate_with_json_check(
+                [{"role": "system", "content": sys_p}, {"role": "user", "content": user_p}],
+                sub_schema,
+                max_retries=2,
+                response_format={"type": "json_object"},
+                log_prefix=f"{log_prefix}-{sub_id}",
+                step="outline_l2_repair",
+            )
+            return json.loads(clean_json_string(content))
+        except Exception as e:
+            print(f"{log_prefix} 二级目录 {sub_id} 修复失败: {e}")
+            return None
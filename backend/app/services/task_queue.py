@@ -0,0 +1,358 @@
+"""通用后台任务队列
+
+文件解析、OCR、向量化等耗时工作提交为任务后立即返回 task_id，由固定数量的 worker 在后台执行，
+请求处理函数不再被长时间占用。任务状态、进度与结果都写入本地 SQLite（与生成任务共用同一个库）：
+
+- 多 worker 进程部署时各进程的 worker 通过原子 UPDATE 认领任务，任意进程都能查询和取消；
+- 失败的任务按指数退避重新排队，超过最大尝试次数后标记为 failed；
+- 执行中的任务定期心跳，所在进程退出后超时的任务会被其他 worker 重新认领（已用完尝试次数的记为 failed）。
+
+sqlite3 是同步调用（锁等待最长 30 秒），worker、心跳与对外接口的数据库读写都经 asyncio.to_thread 在线程中执行。
+"""
+import asyncio
+import functools
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from contextlib import suppress
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional
+
+from ..config import settings
+
+# 执行中的任务超过该时间没有心跳，视为所在进程已退出，重新排队
+STALE_AFTER_SECONDS = 60
+HEARTBEAT_INTERVAL = 10
+# 没有被本进程唤醒时，每隔多久检查一次其他进程提交的任务
+POLL_INTERVAL = 2.0
+FINAL_STATUSES = {"completed", "failed", "cancelled"}
+# UPDATE ... RETURNING 需要 SQLite 3.35+，更早的版本在写事务中先 SELECT 再按条件 UPDATE
+SQLITE_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+# 可认领的任务：到期的排队任务，或心跳超时且还有剩余尝试次数的执行中任务
+CLAIMABLE_CONDITION = "(status = 'pending' AND run_after <= ?) OR (status = 'running' AND updated_at < ? AND attempts < max_attempts)"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TaskContext:
+    """传给任务处理函数的上下文"""
+    task_id: str
+    attempt: int
+    max_attempts: int
+    report_progress: Callable[[Dict[str, Any]], Awaitable[None]]
+
+    @property
+    def is_last_attempt(self) -> bool:
+        return self.attempt >= self.max_attempts
+
+
+TaskHandler = Callable[[Dict[str, Any], TaskContext], Awaitable[Any]]
+
+
+class TaskQueue:
+    """SQLite 持久化的任务队列与进程内 worker 池"""
+
+    def __init__(self, db_path: str | Path, workers: int, max_attempts: int) -> None:
+        self.db_path = Path(db_path)
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self._handlers: Dict[str, tuple[TaskHandler, int]] = {}
+        self._worker_tasks: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._initialized = False
+        self.counters: Dict[str, int] = {"submitted": 0, "completed": 0, "failed": 0, "retried": 0, "cancelled": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS background_tasks (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    progress TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    run_after REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_background_tasks_pending
+                    ON background_tasks (status, run_after);
+            """)
+            self._initialized = True
+        return conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> int:
+        with self._connect() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def _load(self, task_id: str) -> Optional[sqlite3.Row]:
+        with self._connect() as conn:
+            return conn.execute("SELECT * FROM background_tasks WHERE id = ?", (task_id,)).fetchone()
+
+    def register(self, kind: str, handler: TaskHandler, max_attempts: Optional[int] = None) -> None:
+        """注册任务类型；handler(payload, context) 的返回值需可 JSON 序列化，作为任务结果保存"""
+        self._handlers[kind] = (handler, max_attempts or self.max_attempts)
+
+    async def submit(self, kind: str, payload: Dict[str, Any]) -> str:
+        """提交任务，返回 task_id"""
+        if kind not in self._handlers:
+            raise ValueError(f"未注册的任务类型: {kind}")
+        task_id = uuid.uuid4().hex
+        now = time.time()
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO background_tasks (id, kind, status, payload, max_attempts, run_after, created_at, updated_at) "
+            "VALUES (?, ?, 'pending', ?, ?, ?, ?, ?)",
+            (task_id, kind, json.dumps(payload, ensure_ascii=False), self._handlers[kind][1], now, now, now),
+        )
+        self.counters["submitted"] += 1
+        self.start()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return task_id
+
+    async def get_status(self, task_id: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._get_status, task_id)
+
+    def _get_status(self, task_id: str) -> Dict[str, Any]:
+        task = self._load(task_id)
+        if task is None:
+            raise KeyError(task_id)
+        return {
+            "task_id": task_id,
+            "kind": task["kind"],
+            "status": task["status"],
+            "attempts": task["attempts"],
+            "max_attempts": task["max_attempts"],
+            "progress": json.loads(task["progress"]) if task["progress"] else None,
+            "result": json.loads(task["result"]) if task["result"] else None,
+            "error": task["error"],
+            "created_at": task["created_at"],
+            "updated_at": task["updated_at"],
+        }
+
+    def _mark_cancel(self, task_id: str) -> None:
+        if self._load(task_id) is None:
+            raise KeyError(task_id)
+        now = time.time()
+        self._execute("UPDATE background_tasks SET status = 'cancelled', updated_at = ? WHERE id = ? AND status = 'pending'",
+                      (now, task_id))
+        self._execute("UPDATE background_tasks SET status = 'cancelling', updated_at = ? WHERE id = ? AND status = 'running'",
+                      (now, task_id))
+
+    async def cancel(self, task_id: str) -> Dict[str, Any]:
+        """取消任务：排队中的直接取消，执行中的由所在进程在心跳时发现后停止"""
+        await asyncio.to_thread(self._mark_cancel, task_id)
+        if task := self._running.get(task_id):
+            task.cancel()
+        return await self.get_status(task_id)
+
+    async def stream_events(self, task_id: str, poll_interval: float = 0.5) -> AsyncGenerator[Dict[str, Any], None]:
+        """轮询推送任务状态，状态或进度变化时产出一次，任务结束后停止"""
+        last = None
+        while True:
+            status = await self.get_status(task_id)
+            snapshot = (status["status"], status["attempts"], json.dumps(status["progress"], sort_keys=True))
+            if snapshot != last:
+                last = snapshot
+                yield {"type": "status", **status}
+            if status["status"] in FINAL_STATUSES:
+                return
+            await asyncio.sleep(poll_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM background_tasks GROUP BY status").fetchall()
+        return {
+            "workers": len(self._worker_tasks),
+            "running_here": len(self._running),
+            "by_status": {row["status"]: row["n"] for row in rows},
+            **self.counters,
+        }
+
+    def start(self) -> None:
+        """启动本进程的 worker（幂等）"""
+        if self._worker_tasks or self._stopping:
+            return
+        self._wakeup = asyncio.Event()
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """原子认领一个到期的排队任务（或心跳超时的执行中任务）"""
+        now = time.time()
+        stale = now - STALE_AFTER_SECONDS
+        with self._connect() as conn:
+            # 立即取得写锁，多进程的认领串行执行
+            conn.execute("BEGIN IMMEDIATE")
+            # 执行进程已退出的取消中任务直接记为已取消
+            conn.execute(
+                "UPDATE background_tasks SET status = 'cancelled', updated_at = ? WHERE status = 'cancelling' AND updated_at < ?",
+                (now, stale),
+            )
+            # 执行进程已退出且尝试次数已用完的任务不再认领，记为失败
+            conn.execute(
+                "UPDATE background_tasks SET status = 'failed', error = COALESCE(error, '执行进程已退出，且已达到最大尝试次数'), updated_at = ? "
+                "WHERE status = 'running' AND updated_at < ? AND attempts >= max_attempts",
+                (now, stale),
+            )
+            if SQLITE_HAS_RETURNING:
+                return conn.execute(
+                    f"""
+                    UPDATE background_tasks
+                    SET status = 'running', attempts = attempts + 1, updated_at = ?
+                    WHERE id = (
+                        SELECT id FROM background_tasks
+                        WHERE {CLAIMABLE_CONDITION}
+                        ORDER BY run_after
+                        LIMIT 1
+                    )
+                    RETURNING *
+                    """,
+                    (now, now, stale),
+                ).fetchone()
+            row = conn.execute(
+                f"SELECT id FROM background_tasks WHERE {CLAIMABLE_CONDITION} ORDER BY run_after LIMIT 1",
+                (now, stale),
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = conn.execute(
+                f"UPDATE background_tasks SET status = 'running', attempts = attempts + 1, updated_at = ? "
+                f"WHERE id = ? AND ({CLAIMABLE_CONDITION})",
+                (now, row["id"], now, stale),
+            ).rowcount
+            if not claimed:
+                return None
+            return conn.execute("SELECT * FROM background_tasks WHERE id = ?", (row["id"],)).fetchone()
+
+    async def _worker(self) -> None:
+        while not self._stopping:
+            try:
+                task = await asyncio.to_thread(self._claim)
+            except sqlite3.Error as e:
+                logger.error(f"认领后台任务失败: {e}")
+                task = None
+            if task is None:
+                self._wakeup.clear()
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+                continue
+            await self._run(task)
+
+    async def _heartbeat(self, task_id: str) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            task = await asyncio.to_thread(self._load, task_id)
+            if task is None or task["status"] == "cancelling":
+                if running := self._running.get(task_id):
+                    running.cancel()
+                return
+            await asyncio.to_thread(self._execute, "UPDATE background_tasks SET updated_at = ? WHERE id = ?", (time.time(), task_id))
+
+    async def _report_progress(self, task_id: str, progress: Dict[str, Any]) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE background_tasks SET progress = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(progress, ensure_ascii=False), time.time(), task_id),
+        )
+
+    def _finish(self, task_id: str, status: str, result: Any = None, error: Optional[str] = None, run_after: Optional[float] = None) -> Optional[str]:
+        """写入本次执行的结果，返回最终状态
+
+        只更新仍由本次执行持有的任务（running / cancelling）；执行期间被其他进程请求取消（cancelling）的任务
+        除已完成外一律记为 cancelled，不再放回队列。任务已不在执行中（如已被取消）时返回 None。
+        """
+        sql = (
+            "UPDATE background_tasks SET status = CASE WHEN status = 'cancelling' AND ? != 'completed' THEN 'cancelled' ELSE ? END, "
+            "result = ?, error = ?, run_after = COALESCE(?, run_after), updated_at = ? "
+            "WHERE id = ? AND status IN ('running', 'cancelling')"
+        )
+        params = (status, status, None if result is None else json.dumps(result, ensure_ascii=False), error, run_after, time.time(), task_id)
+        with self._connect() as conn:
+            if SQLITE_HAS_RETURNING:
+                row = conn.execute(f"{sql} RETURNING status", params).fetchone()
+            elif conn.execute(sql, params).rowcount:
+                row = conn.execute("SELECT status FROM background_tasks WHERE id = ?", (task_id,)).fetchone()
+            else:
+                row = None
+        return row["status"] if row else None
+
+    def _count_finish(self, status: Optional[str]) -> None:
+        if counter := {"completed": "completed", "pending": "retried", "failed": "failed", "cancelled": "cancelled"}.get(status or ""):
+            self.counters[counter] += 1
+
+    async def _run(self, task: sqlite3.Row) -> None:
+        task_id, attempt = task["id"], task["attempts"]
+        if task["kind"] not in self._handlers:
+            await asyncio.to_thread(self._finish, task_id, "failed", error=f"未注册的任务类型: {task['kind']}")
+            return
+        handler, _ = self._handlers[task["kind"]]
+        context = TaskContext(
+            task_id=task_id,
+            attempt=attempt,
+            max_attempts=task["max_attempts"],
+            report_progress=functools.partial(self._report_progress, task_id),
+        )
+        execution = asyncio.create_task(handler(json.loads(task["payload"]), context))
+        self._running[task_id] = execution
+        heartbeat = asyncio.create_task(self._heartbeat(task_id))
+        try:
+            result = await execution
+            self._count_finish(await asyncio.to_thread(self._finish, task_id, "completed", result=result))
+        except asyncio.CancelledError:
+            if self._stopping:
+                # 进程关闭：放回队列，重启后（或由其他进程）继续执行，本次不计入尝试次数；已请求取消的直接记为已取消
+                await asyncio.to_thread(
+                    self._execute,
+                    "UPDATE background_tasks SET status = CASE WHEN status = 'cancelling' THEN 'cancelled' ELSE 'pending' END, "
+                    "attempts = attempts - 1, updated_at = ? WHERE id = ? AND status IN ('running', 'cancelling')",
+                    (time.time(), task_id),
+                )
+                raise
+            self._count_finish(await asyncio.to_thread(self._finish, task_id, "cancelled"))
+        except Exception as e:
+            if attempt < task["max_attempts"]:
+                delay = min(settings.task_max_backoff, settings.task_base_backoff * (2 ** (attempt - 1)))
+                status = await asyncio.to_thread(self._finish, task_id, "pending", error=str(e), run_after=time.time() + delay)
+                if status == "pending":
+                    logger.warning(f"后台任务 {task['kind']} {task_id} 第 {attempt} 次执行失败，{delay:.0f} 秒后重试: {e}")
+            else:
+                logger.error(f"后台任务 {task['kind']} {task_id} 失败: {e}")
+                status = await asyncio.to_thread(self._finish, task_id, "failed", error=str(e))
+            self._count_finish(status)
+        finally:
+            self._running.pop(task_id, None)
+            heartbeat.cancel()
+            with suppress(asyncio.CancelledError):
+                await heartbeat
+
+    async def shutdown(self) -> None:
+        """应用关闭时停止 worker，执行中的任务放回队列"""
+        self._stopping = True
+        for task in self._running.values():
+            task.cancel()
+        for worker in self._worker_tasks:
+            worker.cancel()
+        for worker in self._worker_tasks:
+            with suppress(BaseException):
+                await worker
+        self._worker_tasks = []
+
+
+# 全局后台任务队列
+task_queue = TaskQueue(settings.job_db_path, workers=settings.task_workers, max_attempts=settings.task_max_attempts)
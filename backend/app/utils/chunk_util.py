@@ -0,0 +1,154 @@
+"""长文档分块、并发 map 与结果去重工具
+
+按 FileService 提取文本时写入的页标记（--- 第 N 页 ---）与表格块（[表格 N] ... [表格结束]）切分，
+再把相邻单元装箱成不超过上限的分块。表格尽量整体放在一个分块中；单张表格超过上限时按行切开，
+每一段都重复表格标记与表头行并补上结束标记，map 阶段仍能看出是在读表格。
+从页中间开始的分块（超长页或表格的续段）开头补上所在页的页标记，按页引用与定位章节时页码不会错位。
+"""
+import asyncio
+import re
+from typing import Awaitable, Callable, Dict, List, Sequence, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# 只在页标记所在行的行首切开：每个页标记恰好切一次，各段直接拼接即为原文
+_PAGE_MARKER = re.compile(r"(?:^|(?<=\n))(?=--- 第 \d+ 页 ---\n)")
+_PAGE_HEADER = re.compile(r"--- 第 (\d+) 页 ---\n")
+_PAGE_LABEL = re.compile(r"\s*(--- 第 \d+ 页 ---)")
+_TABLE_BLOCK = re.compile(r"(\n?\[表格(?: \d+|内容)\].*?\[表格结束\]\n?)", re.S)
+_TABLE_HEAD = re.compile(r"\n?(\[表格(?: \d+|内容)\])\n")
+_TABLE_END = "[表格结束]\n"
+_DEDUPE_IGNORED = re.compile(r"[\s，,。.；;：:、（）()《》“”\"'·\-]+")
+
+
+def _split_units(text: str) -> List[str]:
+    """按页切分，页内再把表格块单独作为一个单元"""
+    units: List[str] = []
+    for page in _PAGE_MARKER.split(text):
+        units.extend(part for part in _TABLE_BLOCK.split(page) if part.strip())
+    return units
+
+
+def split_pages(text: str) -> List[str]:
+    """按页标记切分，每页保留自己的页标记；没有页标记的文本整体作为一页"""
+    return [page for page in _PAGE_MARKER.split(text) if page.strip()]
+
+
+def replace_pages(text: str, replacements: Dict[int, str]) -> str:
+    """把指定页（页码从 1 开始）的内容替换为新文本，页标记、页序与页间分隔不变
+
+    页内容前后的空白原样保留；原页没有内容（如扫描页）时按提取时的拼接方式（以换行连接）放入新文本。
+    """
+    if not replacements:
+        return text
+    parts: List[str] = []
+    for page in _PAGE_MARKER.split(text):
+        if (match := _PAGE_HEADER.match(page)) and (number := int(match.group(1))) in replacements:
+            header, body = page[:match.end()], page[match.end():]
+            if body.strip():
+                lead = body[:len(body) - len(body.lstrip())]
+                trail = body[len(body.rstrip()):]
+                page = f"{header}{lead}{replacements[number]}{trail}"
+            elif replacements[number]:
+                page = f"{header}\n{replacements[number]}{body}"
+        parts.append(page)
+    return "".join(parts)
+
+
+def _hard_split(unit: str, max_chars: int) -> List[str]:
+    """单元本身超长时按行切分，单行仍超长则按字符截断"""
+    pieces: List[str] = []
+    current: List[str] = []
+    size = 0
+    for line in unit.splitlines(keepends=True):
+        if size + len(line) > max_chars and current:
+            pieces.append("".join(current))
+            current, size = [], 0
+        while len(line) > max_chars:
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        current.append(line)
+        size += len(line)
+    if current:
+        pieces.append("".join(current))
+    return pieces
+
+
+def _split_table(unit: str, max_chars: int) -> List[str]:
+    """超长表格按行切分：续段以"[表格 N]（续）"与表头行开头，每段都以结束标记收尾"""
+    match = _TABLE_HEAD.match(unit)
+    lines = unit[match.end():].splitlines(keepends=True) if match else []
+    if lines and lines[-1].strip() == _TABLE_END.strip():
+        lines.pop()
+    if len(lines) < 2:
+        return _hard_split(unit, max_chars)
+    header, rows = lines[0], lines[1:]
+    continuation = f"{match.group(1)}（续）\n{header}"
+    budget = max_chars - len(continuation) - len(_TABLE_END)
+    if budget <= 0:
+        return _hard_split(unit, max_chars)
+    pieces = _hard_split("".join(rows), budget)
+    opening = f"{match.group(1)}\n{header}"
+    return [f"{opening if index == 0 else continuation}{piece}{_TABLE_END}" for index, piece in enumerate(pieces)]
+
+
+def _split_unit(unit: str, max_chars: int) -> List[str]:
+    if len(unit) <= max_chars:
+        return [unit]
+    if _TABLE_HEAD.match(unit):
+        return _split_table(unit, max_chars)
+    return _hard_split(unit, max_chars)
+
+
+def split_document(text: str, max_chars: int) -> List[str]:
+    """把文档切成若干不超过 max_chars 字符的分块，尽量在页或表格边界处切开"""
+    if len(text) <= max_chars:
+        return [text] if text.strip() else []
+
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    marker = ""
+    for unit in _split_units(text):
+        if match := _PAGE_LABEL.match(unit):
+            marker = f"{match.group(1)}\n"
+        # 切分时为续段开头补的页标记预留长度
+        for piece in _split_unit(unit, max_chars - len(marker)):
+            if size + len(piece) > max_chars and current:
+                chunks.append("".join(current).strip())
+                current, size = [], 0
+            if not current and marker and not _PAGE_LABEL.match(piece):
+                piece = f"{marker}{piece}"
+            current.append(piece)
+            size += len(piece)
+    if current:
+        chunks.append("".join(current).strip())
+    return [chunk for chunk in chunks if chunk]
+
+
+async def map_concurrently(items: Sequence[T], func: Callable[[int, T], Awaitable[R]], concurrency: int) -> List[R]:
+    """并发执行 func(index, item)，同时最多 concurrency 个，结果按输入顺序返回"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(index: int, item: T) -> R:
+        async with semaphore:
+            return await func(index, item)
+
+    return list(await asyncio.gather(*(run(i, item) for i, item in enumerate(items))))
+
+
+def dedupe_key(text: str) -> str:
+    """去重用的归一化文本：忽略空白与常见标点"""
+    return _DEDUPE_IGNORED.sub("", str(text)).lower()
+
+
+def dedupe(items: Sequence[T], key: Callable[[T], str] = dedupe_key) -> List[T]:
+    """按归一化键去重并保持首次出现的顺序"""
+    seen = set()
+    result: List[T] = []
+    for item in items:
+        if (k := key(item)) and k not in seen:
+            seen.add(k)
+            result.append(item)
+    return result
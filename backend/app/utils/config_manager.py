@@ -1,7 +1,7 @@
 """配置管理工具"""
 import json
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 
 
 class ConfigManager:
@@ -32,13 +32,16 @@ class ConfigManager:
         
         return default_config
     
-    def save_config(self, api_key: str, base_url: str, model_name: str) -> bool:
-        """保存配置到本地JSON文件"""
-        config = {
+    def save_config(self, api_key: str, base_url: str, model_name: str, model_routes: Optional[Dict[str, Dict]] = None) -> bool:
+        """保存配置到本地JSON文件（保留文件中的其他字段，model_routes 为 None 时不修改已有路由）"""
+        config = self.load_config()
+        config.update({
             'api_key': api_key,
             'base_url': base_url,
             'model_name': model_name
-        }
+        })
+        if model_routes is not None:
+            config['model_routes'] = model_routes
         
         try:
             self.config_file.write_text(json.dumps(config, ensure_ascii=False, indent=2), encoding='utf-8')
@@ -1,6 +1,6 @@
 import json
 import re
-from typing import Tuple, Any
+from typing import Tuple, Any, List
 
 def clean_json_string(json_str: str) -> str:
     """
@@ -15,6 +15,53 @@ def clean_json_string(json_str: str) -> str:
     
     return json_str.strip()
 
+def format_json_path(parts: Tuple[str | int, ...]) -> str:
+    """将路径元组格式化为 '.children[0].title' 形式"""
+    return "".join(f"[{p}]" if isinstance(p, int) else f".{p}" for p in parts)
+
+
+def collect_json_errors(target: Any, template: Any, parts: Tuple[str | int, ...] = ()) -> List[Tuple[Tuple[str | int, ...], str]]:
+    """
+    按模板递归校验已解析的数据，返回全部不符合项 [(路径元组, 错误描述), ...]
+    """
+    path = format_json_path(parts)
+
+    # 处理数字类型
+    if isinstance(template, (int, float)) and isinstance(target, (int, float)):
+        return []
+
+    # 检查基本数据类型
+    if type(template) is not type(target):
+        # 宽松匹配策略：
+        # 1. 允许目标为 None 而模板为 str (视为 Optional[str] 字段缺失)
+        if isinstance(template, str) and target is None:
+            return []
+        # 2. 允许目标为数字而模板为 str (视为数字转字符串)
+        if isinstance(template, str) and isinstance(target, (int, float)):
+            return []
+
+        return [(parts, f"路径 '{path}' 的类型不匹配: 期望 {type(template).__name__}, 实际 {type(target).__name__}")]
+
+    errors = []
+    # 如果是列表类型
+    if isinstance(template, list):
+        # 模板列表为空时允许任何列表，目标列表为空（[]）也视为有效
+        if not template or not target:
+            return []
+        for i, item in enumerate(target):
+            errors.extend(collect_json_errors(item, template[0], parts + (i,)))
+
+    # 如果是字典类型
+    elif isinstance(template, dict):
+        for key in template:
+            if key not in target:
+                errors.append((parts, f"路径 '{path}' 缺少必需的键 '{key}'"))
+            else:
+                errors.extend(collect_json_errors(target[key], template[key], parts + (key,)))
+
+    return errors
+
+
 def check_json(json_str: str, schema: str | dict | list) -> Tuple[bool, str]:
     """
     根据模板 JSON 校验目标字符串的格式是否符合要求
@@ -36,54 +83,184 @@ def check_json(json_str: str, schema: str | dict | list) -> Tuple[bool, str]:
         except json.JSONDecodeError as e:
             return False, f"schema 解析错误: {e}"
         
-        def check_structure(target: Any, template: Any, path: str = "") -> Tuple[bool, str]:
-            # 处理数字类型
-            if isinstance(template, (int, float)) and isinstance(target, (int, float)):
-                return True, ""
-                
-            # 检查基本数据类型
-            if type(template) is not type(target):
-                # 宽松匹配策略：
-                # 1. 允许目标为 None 而模板为 str (视为 Optional[str] 字段缺失)
-                if isinstance(template, str) and target is None:
-                    return True, ""
-                # 2. 允许目标为数字而模板为 str (视为数字转字符串)
-                if isinstance(template, str) and isinstance(target, (int, float)):
-                    return True, ""
-                    
-                return False, f"路径 '{path}' 的类型不匹配: 期望 {type(template).__name__}, 实际 {type(target).__name__}"
-                
-            # 如果是列表类型
-            if isinstance(template, list):
-                if not template:  # 如果模板列表为空，则允许任何列表
-                    return True, ""
-                # 允许目标列表为空，即 [] 是有效的
-                if not target and target is not None:
-                    return True, ""
-                if target is None:
-                    return False, f"路径 '{path}' 的列表为 None，但期望有内容"
-                    
-                template_item = template[0]
-                for i, item in enumerate(target):
-                    is_valid, error = check_structure(item, template_item, f"{path}[{i}]")
-                    if not is_valid:
-                        return False, error
-                return True, ""
-                
-            # 如果是字典类型
-            elif isinstance(template, dict):
-                for key in template:
-                    if key not in target:
-                        return False, f"路径 '{path}' 缺少必需的键 '{key}'"
-                    is_valid, error = check_structure(target[key], template[key], f"{path}.{key}")
-                    if not is_valid:
-                        return False, error
-                return True, ""
-                
-            return True, ""
-                
-        is_valid, error = check_structure(data, schema)
-        return is_valid, error if not is_valid else ""
+        errors = collect_json_errors(data, schema)
+        return (False, errors[0][1]) if errors else (True, "")
         
     except Exception as e:
         return False, f"未预期的错误: {e}"
+
+
+_MISSING = object()
+
+
+class StreamingJsonValidator:
+    """
+    增量 JSON 校验器：随流式 chunk 逐字符解析，一旦出现与模板不符的结构立即报告，
+    用于在生成尚未结束时提前终止上游流。
+
+    与 check_json 的宽松规则保持一致：模板为数字时接受任意数字，模板为字符串时接受
+    字符串/数字/null，空列表模板接受任意元素，目标对象允许多余的键。
+    根节点之前的内容（如 ```json 标记）会被跳过，根节点闭合之后的内容被忽略。
+    """
+
+    _VALUE_START = {
+        "{": "dict", "[": "list", '"': "str",
+        "t": "bool", "f": "bool", "n": "NoneType",
+        "-": "number", **{d: "number" for d in "0123456789"},
+    }
+    _SCALAR_CHARS = set("0123456789+-.eEtruefalsn")
+
+    def __init__(self, schema: str | dict | list) -> None:
+        self.schema = json.loads(schema) if isinstance(schema, str) else schema
+        self.error = ""
+        self.done = False
+        self._started = False
+        # 栈帧: [类型, 模板, 路径, 状态, 当前键, 已出现的键, 列表下标]
+        self._stack: list = []
+        self._in_string = False
+        self._escape = False
+        self._string_is_key = False
+        self._key_chars: list = []
+        self._in_scalar = False
+
+    @staticmethod
+    def _compatible(template: Any, kind: str) -> bool:
+        if template is _MISSING or template is None:
+            return True
+        if isinstance(template, (int, float)):
+            return kind in ("number", "bool")
+        if isinstance(template, str):
+            return kind in ("str", "NoneType", "number", "bool")
+        if isinstance(template, list):
+            return kind == "list"
+        if isinstance(template, dict):
+            return kind == "dict"
+        return True
+
+    def _fail(self, message: str) -> str:
+        self.error = message
+        return message
+
+    @staticmethod
+    def _child_template(frame: list) -> Any:
+        kind, template = frame[0], frame[1]
+        if template is _MISSING or template is None:
+            return _MISSING
+        if kind == "list":
+            return template[0] if template else _MISSING
+        return template.get(frame[4], _MISSING)
+
+    @staticmethod
+    def _child_path(frame: list) -> str:
+        return f"{frame[2]}[{frame[6]}]" if frame[0] == "list" else f"{frame[2]}.{frame[4]}"
+
+    def _start_value(self, ch: str, template: Any, path: str) -> str:
+        kind = self._VALUE_START.get(ch)
+        if kind is None:
+            return self._fail(f"路径 '{path}' 出现非法字符 {ch!r}")
+        if not self._compatible(template, kind):
+            actual = "int" if kind == "number" else kind
+            return self._fail(f"路径 '{path}' 的类型不匹配: 期望 {type(template).__name__}, 实际 {actual}")
+        if kind == "dict":
+            self._stack.append(["dict", template, path, "key_or_end", None, set(), 0])
+        elif kind == "list":
+            self._stack.append(["list", template, path, "value_or_end", None, None, 0])
+        elif kind == "str":
+            self._in_string, self._string_is_key = True, False
+        else:
+            self._in_scalar = True
+        return ""
+
+    def _close_container(self) -> str:
+        frame = self._stack.pop()
+        if frame[0] == "dict" and isinstance(frame[1], dict):
+            for key in frame[1]:
+                if key not in frame[5]:
+                    return self._fail(f"路径 '{frame[2]}' 缺少必需的键 '{key}'")
+        self._value_finished()
+        return ""
+
+    def _value_finished(self) -> None:
+        if not self._stack:
+            self.done = True
+            return
+        self._stack[-1][3] = "comma_or_end"
+
+    def feed(self, chunk: str) -> str:
+        """喂入一段文本，返回首个违例描述（无违例时返回空字符串）"""
+        if self.error or self.done:
+            return self.error
+        for ch in chunk:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    if self._string_is_key:
+                        self._key_chars.append(ch)
+                elif ch == "\\":
+                    self._escape = True
+                    if self._string_is_key:
+                        self._key_chars.append(ch)
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        frame = self._stack[-1]
+                        frame[4] = json.loads(f'"{"".join(self._key_chars)}"')
+                        frame[5].add(frame[4])
+                        frame[3] = "colon"
+                    else:
+                        self._value_finished()
+                        if self.done:
+                            return ""
+                elif self._string_is_key:
+                    self._key_chars.append(ch)
+                continue
+
+            if self._in_scalar:
+                if ch in self._SCALAR_CHARS:
+                    continue
+                self._in_scalar = False
+                self._value_finished()
+
+            if ch.isspace():
+                continue
+
+            if not self._started:
+                if ch in "{[":
+                    self._started = True
+                    if self._start_value(ch, self.schema, ""):
+                        return self.error
+                continue
+
+            frame = self._stack[-1]
+            kind, state = frame[0], frame[3]
+            if state in ("key_or_end", "key"):
+                if ch == '"':
+                    self._in_string, self._string_is_key, self._key_chars = True, True, []
+                elif ch == "}" and state == "key_or_end":
+                    if self._close_container() or self.done:
+                        return self.error
+                else:
+                    return self._fail(f"路径 '{frame[2]}' 期望对象键，实际 {ch!r}")
+            elif state == "colon":
+                if ch != ":":
+                    return self._fail(f"路径 '{frame[2]}' 键 '{frame[4]}' 后缺少冒号")
+                frame[3] = "value"
+            elif state in ("value", "value_or_end"):
+                if ch == "]" and state == "value_or_end":
+                    if self._close_container() or self.done:
+                        return self.error
+                elif self._start_value(ch, self._child_template(frame), self._child_path(frame)):
+                    return self.error
+            else:  # comma_or_end
+                closer = "}" if kind == "dict" else "]"
+                if ch == ",":
+                    if kind == "dict":
+                        frame[3] = "key"
+                    else:
+                        frame[3], frame[6] = "value", frame[6] + 1
+                elif ch == closer:
+                    if self._close_container() or self.done:
+                        return self.error
+                else:
+                    return self._fail(f"路径 '{frame[2]}' 期望 ',' 或 '{closer}'，实际 {ch!r}")
+        return ""
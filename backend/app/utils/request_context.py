@@ -0,0 +1,35 @@
+"""请求级上下文（基于 contextvars）
+
+由 RequestContextMiddleware 在每个 HTTP 请求开始时设置，服务层无需层层传参即可读取。
+"""
+from contextvars import ContextVar
+
+# 请求头 X-LLM-Cache: bypass 时为 True，跳过 LLM 响应缓存的读取
+llm_cache_bypass: ContextVar[bool] = ContextVar("llm_cache_bypass", default=False)
+# 当前请求的路由路径，用于给 LLM 调用遥测打标签（后台任务继承创建时的值）
+request_endpoint: ContextVar[str] = ContextVar("request_endpoint", default="")
+
+LLM_CACHE_HEADER = b"x-llm-cache"
+LLM_CACHE_BYPASS_VALUES = {b"bypass", b"no-cache", b"refresh"}
+
+
+class RequestContextMiddleware:
+    """纯 ASGI 中间件：从请求头解析上下文变量（对流式响应同样生效）"""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        bypass = headers.get(LLM_CACHE_HEADER, b"").strip().lower() in LLM_CACHE_BYPASS_VALUES
+        bypass_token = llm_cache_bypass.set(bypass)
+        endpoint_token = request_endpoint.set(scope.get("path", ""))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_endpoint.reset(endpoint_token)
+            llm_cache_bypass.reset(bypass_token)
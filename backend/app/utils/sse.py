@@ -1,6 +1,10 @@
 """SSE (Server-Sent Events) 相关工具"""
+import asyncio
+from contextlib import suppress
 from typing import AsyncGenerator, Any, Dict, Optional
 
+import anyio
+from fastapi import Request
 from fastapi.responses import StreamingResponse
 
 
@@ -10,11 +14,15 @@ DEFAULT_SSE_HEADERS: Dict[str, str] = {
     "Content-Type": "text/event-stream",
 }
 
+# 客户端断开统计
+disconnect_stats: Dict[str, int] = {"disconnects": 0}
+
 
 def sse_response(
     generator: AsyncGenerator[str, Any],
     media_type: str = "text/event-stream",
     extra_headers: Optional[Dict[str, str]] = None,
+    request: Optional[Request] = None,
 ) -> StreamingResponse:
     """
     包装 SSE 异步生成器为 StreamingResponse，统一 headers 和 media_type。
@@ -23,11 +31,15 @@ def sse_response(
         generator: 异步生成器，yield 已经带好 "data: ..." 和 "\n\n" 的字符串
         media_type: 响应的 media_type，默认使用 text/event-stream
         extra_headers: 额外需要添加或覆盖的响应头
+        request: 传入时检测客户端断开，断开后立即关闭生成器（连带取消上游 LLM 流）
     """
     headers = DEFAULT_SSE_HEADERS.copy()
     if extra_headers:
         headers.update(extra_headers)
 
+    if request is not None:
+        generator = stop_on_disconnect(generator, request)
+
     return StreamingResponse(
         generator,
         media_type=media_type,
@@ -35,4 +47,79 @@ def sse_response(
     )
 
 
+async def with_heartbeat(
+    generator: AsyncGenerator[Any, None],
+    heartbeat: Any,
+    interval: float = 1.0,
+) -> AsyncGenerator[Any, None]:
+    """
+    在生成器长时间没有产出时插入心跳，保持 SSE 连接不被代理或浏览器断开。
+
+    Args:
+        generator: 原始异步生成器
+        heartbeat: 超过 interval 秒没有新数据时产出的心跳值
+        interval: 心跳间隔（秒）
+    """
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(generator.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield heartbeat
+                continue
+            finished, pending = pending, None
+            try:
+                item = finished.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        await _close_generator(generator, pending)
+
+
+async def stop_on_disconnect(
+    generator: AsyncGenerator[Any, None],
+    request: Request,
+    poll_interval: float = 0.5,
+) -> AsyncGenerator[Any, None]:
+    """
+    转发生成器的输出，同时轮询客户端连接状态；断开时取消正在等待的一步并关闭生成器。
+
+    生成器的 finally 会随之执行，从而关闭上游 LLM 流、取消其派生的后台任务。
+    """
+    async def wait_disconnect() -> None:
+        while not await request.is_disconnected():
+            await asyncio.sleep(poll_interval)
+
+    watcher = asyncio.ensure_future(wait_disconnect())
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(generator.__anext__())
+            await asyncio.wait({pending, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not pending.done():
+                disconnect_stats["disconnects"] += 1
+                print(f"客户端已断开，停止 {request.url.path} 的生成")
+                return
+            finished, pending = pending, None
+            try:
+                item = finished.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        watcher.cancel()
+        await _close_generator(generator, pending)
+
 
+async def _close_generator(generator: AsyncGenerator[Any, None], pending: Optional[asyncio.Future]) -> None:
+    """取消未完成的 __anext__ 并关闭生成器；屏蔽外层取消，保证清理能执行完"""
+    with anyio.CancelScope(shield=True):
+        if pending is not None and not pending.done():
+            pending.cancel()
+            with suppress(BaseException):
+                await pending
+        with suppress(RuntimeError):
+            await generator.aclose()
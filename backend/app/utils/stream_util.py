@@ -0,0 +1,81 @@
+"""LLM 流式输出处理工具"""
+from typing import AsyncIterable, List
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+class StreamAccumulator:
+    """收集流式片段，读取时才一次性拼接，避免 `text += chunk` 反复复制整段文本"""
+
+    __slots__ = ("_parts", "append")
+
+    def __init__(self) -> None:
+        self._parts: List[str] = []
+        # 直接绑定 list.append，热路径上没有额外的方法调用开销
+        self.append = self._parts.append
+
+    def getvalue(self) -> str:
+        if len(self._parts) > 1:
+            # 拼接结果缓存为唯一片段，重复读取不再复制
+            joined = "".join(self._parts)
+            self._parts.clear()
+            self._parts.append(joined)
+        return self._parts[0] if self._parts else ""
+
+    @classmethod
+    async def collect(cls, stream: AsyncIterable[str]) -> str:
+        accumulator = cls()
+        async for chunk in stream:
+            accumulator.append(chunk)
+        return accumulator.getvalue()
+
+
+def _partial_tag_suffix(text: str, tag: str) -> int:
+    """text 末尾与 tag 前缀重合的最大长度（标签可能被拆到下一个 chunk）"""
+    for size in range(min(len(text), len(tag) - 1), 0, -1):
+        if text.endswith(tag[:size]):
+            return size
+    return 0
+
+
+class ThinkTagFilter:
+    """逐块过滤 <think>...</think> 思考内容的状态机
+
+    标签被拆在多个 chunk 之间（如 "<thi" + "nk>"）时，暂存可能属于标签的末尾字符，等下一块再判断。
+    """
+
+    __slots__ = ("thinking", "_pending")
+
+    def __init__(self) -> None:
+        self.thinking = False
+        self._pending = ""
+
+    def feed(self, chunk: str) -> str:
+        """输入一个 chunk，返回其中应当输出的正文"""
+        if not self._pending and "<" not in chunk:
+            return "" if self.thinking else chunk
+
+        text = self._pending + chunk
+        self._pending = ""
+        visible: List[str] = []
+        while text:
+            tag = THINK_CLOSE if self.thinking else THINK_OPEN
+            index = text.find(tag)
+            if index >= 0:
+                if not self.thinking:
+                    visible.append(text[:index])
+                text = text[index + len(tag):]
+                self.thinking = not self.thinking
+                continue
+            keep = _partial_tag_suffix(text, tag)
+            if not self.thinking:
+                visible.append(text[:len(text) - keep])
+            self._pending = text[len(text) - keep:] if keep else ""
+            break
+        return "".join(visible)
+
+    def flush(self) -> str:
+        """流结束时返回暂存的正文（未闭合的思考内容直接丢弃）"""
+        pending, self._pending = self._pending, ""
+        return "" if self.thinking else pending
@@ -0,0 +1,107 @@
+"""招标文件规则预提取
+
+项目编号、截止时间、预算、采购人、代理机构等字段在招标公告中基本是"标签：值"的固定写法，
+用正则扫描全文即可取得，不必交给 LLM；资格要求、评标办法、技术规范等需要理解的内容，
+则按章节标题定位到所在页，只把这些页（加上公告所在的开头几页）发给 LLM。
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from .chunk_util import split_document, split_pages
+
+# 规则或定位策略变更时递增，使已缓存的解析结果失效
+EXTRACTOR_VERSION = 1
+
+# 没有页标记的文本（如 Word 提取结果）按此字数切成伪页
+PSEUDO_PAGE_CHARS = 3000
+
+_NUMBERING = r"(?:第[一二三四五六七八九十百\d]+[章节部分条]|[一二三四五六七八九十]+[、.．]|[（(][一二三四五六七八九十\d]+[)）]|\d+(?:\.\d+)*[、.．]?)?"
+_SEPARATOR = r"\s*(?:[:：|]\s*)"
+# 值在遇到这些内容时截断（同一行常并列多个字段）
+_VALUE_END = re.compile(r"[；;。]|\s{2,}|\s\|\s|(?:地址|联系人|联系方式|联系电话|电话|邮编)\s*[:：]")
+
+_DATE = (
+    r"\d{4}\s*[年\-/.]\s*\d{1,2}\s*[月\-/.]\s*\d{1,2}\s*日?"
+    r"(?:\s*[（(][^)）\n]{1,6}[)）])?"
+    r"(?:\s*(?:上午|下午|北京时间)?\s*\d{1,2}\s*[:：时点]\s*(?:\d{1,2}\s*分?)?)?"
+)
+_AMOUNT = r"(?:人民币)?\s*[¥￥]?\s*\d[\d,，]*(?:\.\d+)?\s*(?:万元|元|万)"
+
+# 字段 -> (标签, 值的模式)；值模式为 None 时取标签后到行尾（或截断符）的文本
+FIELD_RULES: Dict[str, Tuple[Tuple[str, ...], Optional[str]]] = {
+    "project_name": (("项目名称", "采购项目名称", "招标项目名称"), None),
+    "project_number": (("项目编号", "招标编号", "采购编号", "采购项目编号", "招标项目编号"), r"[A-Za-z0-9〔\[][A-Za-z0-9\-_/.〔〕\[\]第号]*"),
+    "tender_deadline": (("投标截止时间", "递交投标文件截止时间", "投标文件递交截止时间", "提交投标文件截止时间",
+                         "响应文件提交截止时间", "递交响应文件截止时间", "投标截止时间及开标时间", "开标时间"), _DATE),
+    "budget": (("预算金额", "项目预算", "采购预算", "预算资金", "招标控制价", "最高限价", "控制价"), _AMOUNT),
+    "purchaser": (("采购人", "招标人", "采购单位"), None),
+    "agency": (("采购代理机构", "招标代理机构", "代理机构"), None),
+}
+
+# 需要 LLM 理解的章节：字段 -> 章节标题关键字
+SECTION_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "qualifications": ("资格要求", "资格条件", "投标人资格", "供应商资格", "资格审查"),
+    "evaluation_method": ("评标办法", "评分标准", "评审办法", "评分办法", "评审标准", "评分细则"),
+    "technical_requirements": ("技术要求", "技术规范", "技术参数", "采购需求", "需求清单", "技术需求", "服务要求"),
+}
+
+
+def _compile_field(labels: Tuple[str, ...], value: Optional[str]) -> re.Pattern:
+    label = "|".join(sorted(map(re.escape, labels), key=len, reverse=True))
+    value_pattern = value or r"[^\n]{1,120}"
+    return re.compile(rf"(?:^|\n)[ \t]*{_NUMBERING}\s*(?:{label})(?:名称)?{_SEPARATOR}(?P<value>{value_pattern})")
+
+
+_FIELD_PATTERNS = {field: _compile_field(*rule) for field, rule in FIELD_RULES.items()}
+_SECTION_HEADINGS = {
+    field: re.compile(rf"(?:^|\n)[ \t]*{_NUMBERING}\s*(?:{'|'.join(keywords)})[^\n]{{0,30}}(?=\n|$)")
+    for field, keywords in SECTION_KEYWORDS.items()
+}
+
+
+def _clean_value(value: str) -> str:
+    if match := _VALUE_END.search(value):
+        value = value[:match.start()]
+    return value.strip(" \t|：:，,.")
+
+
+def extract_tender_fields(text: str) -> Dict[str, str]:
+    """从全文中按"标签：值"提取固定格式字段，只返回找到的字段（取首次出现的值）"""
+    fields: Dict[str, str] = {}
+    for field, pattern in _FIELD_PATTERNS.items():
+        for match in pattern.finditer(text):
+            if value := _clean_value(match.group("value")):
+                fields[field] = re.sub(r"\s+", " ", value).strip()
+                break
+    return fields
+
+
+def locate_sections(text: str, lead_pages: int = 2, follow_pages: int = 2) -> Tuple[str, Dict[str, List[int]]]:
+    """定位资格要求、评标办法、技术规范所在页
+
+    返回 (摘录文本, {字段: 命中的页序号})。摘录包含开头 lead_pages 页（招标公告）与每个章节标题所在页及其后 follow_pages 页，
+    不连续处以省略标记分隔。一个章节都没找到时返回全文。
+    """
+    pages = split_pages(text)
+    if len(pages) <= 1:
+        pages = split_document(text, PSEUDO_PAGE_CHARS)
+
+    hits: Dict[str, List[int]] = {}
+    selected = set(range(min(lead_pages, len(pages))))
+    for index, page in enumerate(pages):
+        for field, heading in _SECTION_HEADINGS.items():
+            if heading.search(page):
+                hits.setdefault(field, []).append(index)
+                selected.update(range(index, min(index + follow_pages + 1, len(pages))))
+
+    if not hits:
+        return text, hits
+
+    parts: List[str] = []
+    previous = -1
+    for index in sorted(selected):
+        if parts and index != previous + 1:
+            parts.append("\n……（中间内容省略）……\n")
+        parts.append(pages[index])
+        previous = index
+    return "\n".join(parts), hits
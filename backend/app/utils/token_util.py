@@ -0,0 +1,67 @@
+"""token 数量估算工具"""
+import threading
+from typing import Any, Callable
+
+try:
+    import tiktoken
+except ImportError:  # 可选依赖（见 requirements.txt），未安装时退回字符数估算
+    tiktoken = None
+
+# 图片输入按固定开销估算（视觉模型对单张中等分辨率图片的大致计费）
+IMAGE_TOKEN_ESTIMATE = 1000
+
+_encoding = None
+_encoding_failed = False
+_encoding_loading = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本 token 数：中文约 1 字 1 token，其余字符约 4 个 1 token"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _load_encoding() -> None:
+    global _encoding, _encoding_failed
+    try:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # 离线时词表下载失败等情况只提示一次
+        _encoding_failed = True
+        print(f"tiktoken 不可用，改用估算: {e}")
+    finally:
+        _encoding_loading.release()
+
+
+def count_tokens(text: str) -> int:
+    """较精确地统计 token 数：tiktoken 的 cl100k_base 词表已加载时用它分词，否则退回 estimate_tokens
+
+    首次调用 get_encoding 可能要联网下载词表，因此放在后台线程加载，加载完成前（或失败后）都用估算。
+    分词本身耗时随文本长度线性增长，长文本（如整份招标文件的 prompt）应经 asyncio.to_thread 调用。
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    if tiktoken is not None and not _encoding_failed and _encoding_loading.acquire(blocking=False):
+        threading.Thread(target=_load_encoding, name="tiktoken-load", daemon=True).start()
+    return estimate_tokens(text)
+
+
+def estimate_message_tokens(messages: list[dict[str, Any]], counter: Callable[[str], int] = estimate_tokens) -> int:
+    """估算 chat messages 的 prompt token 数（含多模态内容）"""
+    total = 0
+    for message in messages:
+        total += 4  # role 等固定开销
+        content = message.get("content")
+        if isinstance(content, str):
+            total += counter(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    total += counter(part.get("text", ""))
+                elif part.get("type") == "image_url":
+                    total += IMAGE_TOKEN_ESTIMATE
+    return total
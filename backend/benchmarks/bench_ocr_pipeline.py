@@ -0,0 +1,195 @@
+"""扫描件 OCR 流水线基准
+
+生成一份全部为扫描页的模拟 PDF，用模拟的视觉模型（固定延迟 + 随机抖动，不访问网络）比较：
+- 旧实现：先把所有页渲染成 JPEG/base64 放进内存，再一次性提交全部 OCR 请求（由上游限流排队）
+- 流水线：进程池按批渲染到有界队列，固定数量的 OCR 请求滑动在途（FileService.ocr_pdf_pages）
+
+每种方式在独立子进程中运行，报告耗时、页/秒与峰值 RSS。RSS 以主进程 + 渲染进程合计为准，并分别列出两者；
+RSS 采样依赖 /proc，仅支持 Linux。流水线的解析进程池在计时前预热（启动 worker 并完成 import），
+与常驻服务中进程池已启动的情况一致，进程启动时间不计入耗时。
+
+注意：流水线的内存上限只约束主进程（队列中待识别的页图片有界）；渲染进程常驻时各自还有 fitz 等
+import 后的固定开销，这部分不随页数增长，但会计入合计 RSS。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_ocr_pipeline.py --pages 120 --latency 0.5 --jitter 1.0
+"""
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import suppress
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fitz  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.services import openai_service  # noqa: E402
+from app.services.extraction_pool import extraction_pool  # noqa: E402
+from app.services.file_service import FileService  # noqa: E402
+
+SAMPLE_TEXT = "投标人应提供满足招标文件要求的设备及服务技术参数须逐条响应偏离项应在偏离表中注明营业执照资质证书"
+
+
+def make_scanned_pdf(path: Path, pages: int, seed: int = 7) -> None:
+    """把排满文字的页面按 150 dpi 渲染成 JPEG 再铺满新页面，得到接近真实扫描件的 PDF"""
+    rng = random.Random(seed)
+    with fitz.open() as source, fitz.open() as doc:
+        for page_num in range(pages):
+            page = source.new_page()
+            for line in range(48):
+                text = "".join(rng.choice(SAMPLE_TEXT) for _ in range(38))
+                page.insert_text((40, 50 + line * 15), text, fontname="china-s", fontsize=10)
+            jpeg = page.get_pixmap(dpi=150).tobytes("jpeg")
+            doc.new_page().insert_image(fitz.Rect(0, 0, 595, 842), stream=jpeg)
+        doc.save(str(path))
+
+
+class RssSampler:
+    """后台线程定时读取 /proc 下本进程与子进程（渲染进程）的 RSS，记录峰值（仅 Linux）
+
+    不用 ru_maxrss：fork 出的子进程会继承父进程的峰值。
+    """
+
+    def __init__(self, interval: float = 0.02) -> None:
+        self.interval = interval
+        self.peak_self = 0.0
+        self.peak_children = 0.0
+        self.peak_total = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def _rss_mb(pid: int | str) -> float:
+        with suppress(OSError):
+            return int(Path(f"/proc/{pid}/statm").read_text().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+        return 0.0
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            own = self._rss_mb("self")
+            children = sum(self._rss_mb(child.pid) for child in multiprocessing.active_children())
+            self.peak_self = max(self.peak_self, own)
+            self.peak_children = max(self.peak_children, children)
+            self.peak_total = max(self.peak_total, own + children)
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def install_fake_ocr(latency: float, jitter: float, upstream_concurrency: int) -> None:
+    """模拟视觉模型：上游（调度器 / 服务商限流）同时最多处理 upstream_concurrency 个请求"""
+    rng = random.Random(3)
+    limiter: list[asyncio.Semaphore] = []
+
+    async def fake_ocr(self, base64_image: str) -> str:
+        if not limiter:
+            limiter.append(asyncio.Semaphore(upstream_concurrency))
+        async with limiter[0]:
+            await asyncio.sleep(latency + rng.random() * jitter)
+        return f"识别文本 {len(base64_image)}"
+
+    openai_service.OpenAIService.ocr_image = fake_ocr
+
+
+async def legacy_ocr(pdf: Path) -> int:
+    """旧 perform_ocr_on_pdf：先在当前进程渲染全部页面，再 gather 全部 OCR 请求"""
+    service = openai_service.OpenAIService()
+    tasks = []
+    with fitz.open(str(pdf)) as doc:
+        for page_num in range(doc.page_count):
+            pix = doc[page_num].get_pixmap(matrix=fitz.Matrix(1.5, 1.5))
+            tasks.append(service.ocr_image(base64.b64encode(pix.tobytes("jpeg")).decode("utf-8")))
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    return sum(1 for res in results if res and not isinstance(res, Exception))
+
+
+async def pipeline_ocr(pdf: Path) -> int:
+    return len(await FileService.ocr_pdf_pages(pdf))
+
+
+async def timed(args: argparse.Namespace, sampler: RssSampler) -> dict:
+    pdf = Path(args.pdf)
+    try:
+        if args.child == "pipeline":
+            # 预热：启动全部解析进程并完成 import，不计入耗时
+            await asyncio.gather(*(extraction_pool.run(FileService._pdf_page_count, str(pdf))
+                                   for _ in range(extraction_pool.workers)))
+        func = legacy_ocr if args.child == "legacy" else pipeline_ocr
+        baseline = sampler._rss_mb("self")
+        started = time.perf_counter()
+        done = await func(pdf)
+        return {"pages": done, "seconds": time.perf_counter() - started, "baseline_mb": baseline}
+    finally:
+        extraction_pool.shutdown()
+
+
+def run_child(args: argparse.Namespace) -> None:
+    install_fake_ocr(args.latency, args.jitter, args.upstream_concurrency)
+    settings.ocr_max_in_flight = args.in_flight
+    settings.ocr_queue_size = args.queue_size
+    with RssSampler() as sampler:
+        result = asyncio.run(timed(args, sampler))
+    print(json.dumps({
+        **result,
+        "total_rss_mb": sampler.peak_total,
+        "rss_mb": sampler.peak_self,
+        "children_rss_mb": sampler.peak_children,
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="扫描件 OCR 流水线基准")
+    parser.add_argument("--pages", type=int, default=120)
+    parser.add_argument("--latency", type=float, default=0.5, help="模拟 OCR 基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=1.0, help="模拟 OCR 额外随机延迟上限（秒）")
+    parser.add_argument("--upstream-concurrency", type=int, default=8, help="模拟上游同时处理的 OCR 请求数")
+    parser.add_argument("--in-flight", type=int, default=settings.ocr_max_in_flight)
+    parser.add_argument("--queue-size", type=int, default=settings.ocr_queue_size)
+    parser.add_argument("--child", choices=["legacy", "pipeline"], help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = Path(tmp) / "scanned.pdf"
+        make_scanned_pdf(pdf, args.pages)
+        print(f"{args.pages} 页扫描件（{pdf.stat().st_size / 1024 / 1024:.1f} MB），"
+              f"模拟 OCR 延迟 {args.latency}~{args.latency + args.jitter} 秒，流水线在途 {args.in_flight}、队列 {args.queue_size}\n")
+        print(f"  {'方式':<10}{'完成页':>8}{'耗时(s)':>10}{'页/秒':>8}{'合计峰值RSS':>14}{'主进程峰值RSS(起始)':>22}{'渲染进程峰值RSS':>18}")
+        for mode in ("legacy", "pipeline"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", mode, "--pdf", str(pdf),
+                 "--latency", str(args.latency), "--jitter", str(args.jitter),
+                 "--upstream-concurrency", str(args.upstream_concurrency),
+                 "--in-flight", str(args.in_flight), "--queue-size", str(args.queue_size)],
+                check=True, capture_output=True, text=True,
+            ).stdout.strip().splitlines()[-1]
+            r = json.loads(output)
+            children = f"{r['children_rss_mb']:.0f} MB" if mode == "pipeline" else "-"
+            peak = f"{r['rss_mb']:.0f} MB ({r['baseline_mb']:.0f} MB)"
+            total = f"{r['total_rss_mb']:.0f} MB"
+            print(f"  {mode:<10}{r['pages']:>8}{r['seconds']:>10.2f}{r['pages'] / r['seconds']:>8.1f}{total:>14}{peak:>22}{children:>18}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""PDF 提取基准
+
+生成一份模拟招标文件 PDF（每隔 --table-every 页带一张参数表；也可用 --pdf 指定真实文件，如 标书资料 下的技术规范），比较：
+- 旧的逐页提取（每页都执行 find_tables）
+- 单进程逐页分类提取（_extract_pdf_pages，只在有矢量线条的页上识别表格）
+- 按页范围切段、在 1/2/4/... 个解析进程中并行提取后按页序合并
+
+并检查各方式结果逐字一致。并行加速比受 CPU 核心数限制，请在多核机器上运行。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_pdf_extract.py --pages 240 --workers 1,2,4,8
+    python benchmarks/bench_pdf_extract.py --pdf ../标书资料/xxx.pdf --shard-pages 16
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fitz  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.services import file_service  # noqa: E402
+from app.services.extraction_pool import ExtractionPool  # noqa: E402
+from app.services.file_service import FileService  # noqa: E402
+
+SAMPLE_LINE = "投标人应提供满足招标文件要求的设备及服务，技术参数须逐条响应，偏离项应在偏离表中注明。"
+
+
+def make_pdf(path: Path, pages: int, table_every: int) -> None:
+    """每页若干段正文，每 table_every 页加一张带边框的参数表（触发 find_tables）"""
+    with fitz.open() as doc:
+        for page_num in range(pages):
+            page = doc.new_page()
+            y = 60
+            page.insert_text((50, y), f"第 {page_num + 1} 页 技术规范", fontname="china-s", fontsize=12)
+            for line in range(12):
+                y += 16
+                page.insert_text((50, y), SAMPLE_LINE[: 30 + line], fontname="china-s", fontsize=9)
+            if table_every <= 0 or page_num % table_every:
+                continue
+            top, rows, cols, row_h, col_w = y + 30, 10, 4, 20, 120
+            for r in range(rows + 1):
+                page.draw_line((50, top + r * row_h), (50 + cols * col_w, top + r * row_h))
+            for c in range(cols + 1):
+                page.draw_line((50 + c * col_w, top), (50 + c * col_w, top + rows * row_h))
+            for r in range(rows):
+                for c in range(cols):
+                    page.insert_text((55 + c * col_w, top + r * row_h + 14), f"参数{r}-{c}", fontname="china-s", fontsize=9)
+        doc.save(str(path))
+
+
+def legacy_extract(pdf: Path) -> str:
+    """旧的 _extract_pdf_with_pymupdf：每页都执行 find_tables"""
+    extracted_text = []
+    with fitz.open(str(pdf)) as doc:
+        for page_num in range(doc.page_count):
+            page = doc[page_num]
+            extracted_text.append(f"\n--- 第 {page_num + 1} 页 ---\n")
+            if text := page.get_text("text", sort=True):
+                extracted_text.append(text)
+            if tabs := page.find_tables():
+                for table_num, table in enumerate(tabs.tables, 1):
+                    extracted_text.append(f"\n[表格 {table_num}]")
+                    for row in table.extract():
+                        if row:
+                            extracted_text.append(" | ".join(str(c) if c else "" for c in row))
+                    extracted_text.append("[表格结束]\n")
+    return "\n".join(extracted_text).strip()
+
+
+def bench_inline(func: Callable[[Path], str], pdf: Path, repeat: int) -> tuple[float, str]:
+    best, text = float("inf"), ""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        text = func(pdf)
+        best = min(best, time.perf_counter() - started)
+    return best, text
+
+
+async def bench_sharded(pdf: Path, workers: int, repeat: int) -> tuple[float, str]:
+    pool = ExtractionPool(workers, timeout=settings.extraction_timeout, memory_limit_mb=0)
+    file_service.extraction_pool = pool
+    try:
+        # 预热：启动全部 worker 进程并完成 import，不计入耗时
+        await asyncio.gather(*(pool.run(FileService._pdf_page_count, str(pdf)) for _ in range(workers * 2)))
+        best, text = float("inf"), ""
+        for _ in range(repeat):
+            started = time.perf_counter()
+            text, _ = await FileService._extract_pdf_sharded(pdf)
+            best = min(best, time.perf_counter() - started)
+        return best, text
+    finally:
+        pool.shutdown()
+
+
+async def run(args: argparse.Namespace) -> None:
+    settings.extraction_shard_pages = args.shard_pages
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = Path(args.pdf) if args.pdf else Path(tmp) / "tender.pdf"
+        if not args.pdf:
+            make_pdf(pdf, args.pages, args.table_every)
+        with fitz.open(str(pdf)) as doc:
+            pages = doc.page_count
+        print(f"{pdf.name}：{pages} 页，每段 {args.shard_pages} 页，CPU 核心数 {os.cpu_count()}\n")
+
+        legacy, expected = bench_inline(legacy_extract, pdf, args.repeat)
+        print(f"  {'旧逐页提取':<14}{legacy:>9.2f} s{pages / legacy:>10.1f} 页/s")
+        _, report = FileService._extract_pdf_pages(pdf)
+        baseline, text = bench_inline(lambda path: FileService._extract_pdf_pages(path)[0], pdf, args.repeat)
+        print(f"  {'单进程分类提取':<14}{baseline:>9.2f} s{pages / baseline:>10.1f} 页/s{legacy / baseline:>8.2f}x  "
+              f"结果{'一致' if text == expected else '不一致'}")
+        assert text == expected, "分类提取结果与旧提取不一致"
+        print(f"    {FileService.summarize_pdf_pages(report)}")
+
+        workers: List[int] = [int(w) for w in args.workers.split(",") if w.strip()]
+        for count in workers:
+            elapsed, text = await bench_sharded(pdf, count, args.repeat)
+            mark = "一致" if text == expected else "不一致"
+            print(f"  {f'{count} 进程分段':<14}{elapsed:>9.2f} s{pages / elapsed:>10.1f} 页/s"
+                  f"{baseline / elapsed:>8.2f}x  合并结果{mark}")
+            assert text == expected, "分段合并结果与整份提取不一致"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="PDF 提取基准")
+    parser.add_argument("--pdf", help="使用已有 PDF，不指定则生成模拟文件")
+    parser.add_argument("--pages", type=int, default=240, help="模拟 PDF 页数")
+    parser.add_argument("--table-every", type=int, default=4, help="模拟 PDF 每隔几页带一张表格，0 为不带")
+    parser.add_argument("--shard-pages", type=int, default=settings.extraction_shard_pages)
+    parser.add_argument("--workers", default="1,2,4,8", help="逗号分隔的进程数")
+    parser.add_argument("--repeat", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
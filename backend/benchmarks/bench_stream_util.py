@@ -0,0 +1,131 @@
+"""流式拼接与 think 过滤的微基准
+
+对约 100KB 的模拟输出（中文，每 chunk 2~6 字）比较：
+- 字符串 `+=` 拼接（局部变量 / 拼接结果同时被其他对象引用）与 StreamAccumulator
+- 旧的按 chunk split 的 think 过滤与 ThinkTagFilter 状态机（含标签跨 chunk 的正确性检查）
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_stream_util.py --size 100000 --repeat 5
+"""
+import argparse
+import random
+import sys
+import timeit
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.stream_util import StreamAccumulator, ThinkTagFilter  # noqa: E402
+
+SAMPLE = "本项目严格按照招标文件要求组织实施，建立完善的质量管理与进度控制机制，确保各项指标满足验收标准。"
+
+
+def make_chunks(size: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    text = (SAMPLE * (size // len(SAMPLE) + 1))[:size]
+    chunks, i = [], 0
+    while i < len(text):
+        step = rng.randint(2, 6)
+        chunks.append(text[i:i + step])
+        i += step
+    return chunks
+
+
+def concat_local(chunks: List[str]) -> str:
+    text = ""
+    for chunk in chunks:
+        text += chunk
+    return text
+
+
+def concat_shared(chunks: List[str]) -> str:
+    """拼接结果同时被其他对象持有（如写入 dict 供进度回调读取），CPython 无法原地扩展"""
+    holder = {"content": ""}
+    for chunk in chunks:
+        holder["content"] += chunk
+    return holder["content"]
+
+
+def concat_accumulator(chunks: List[str]) -> str:
+    accumulator = StreamAccumulator()
+    for chunk in chunks:
+        accumulator.append(chunk)
+    return accumulator.getvalue()
+
+
+def legacy_think_filter(chunks: List[str]) -> str:
+    """原 _filter_think 的逐 chunk split 实现"""
+    out, is_thinking = [], False
+    for content in chunks:
+        if "<think>" in content:
+            is_thinking = True
+            if parts := content.split("<think>")[0]:
+                out.append(parts)
+            continue
+        if "</think>" in content:
+            is_thinking = False
+            if parts := content.split("</think>")[1]:
+                out.append(parts)
+            continue
+        if not is_thinking:
+            out.append(content)
+    return "".join(out)
+
+
+def state_machine_filter(chunks: List[str]) -> str:
+    think_filter = ThinkTagFilter()
+    out = [think_filter.feed(chunk) for chunk in chunks]
+    out.append(think_filter.flush())
+    return "".join(out)
+
+
+def check_correctness() -> None:
+    cases = [
+        (["<think>", "思考", "</think>", "正文"], "正文"),
+        (["前言<thi", "nk>思考</th", "ink>正文"], "前言正文"),
+        (["<think>a</think>b<think>c</think>d"], "bd"),
+        (["a < b", " 且 c<", "d"], "a < b 且 c<d"),
+        (["正文<", "/p>"], "正文</p>"),
+    ]
+    for chunks, expected in cases:
+        got = state_machine_filter(chunks)
+        legacy = legacy_think_filter(chunks)
+        mark = "OK " if got == expected else "ERR"
+        print(f"  [{mark}] {chunks!r:<48} -> {got!r:<14} (旧实现: {legacy!r})")
+        assert got == expected
+
+
+def bench(name: str, func, chunks: List[str], repeat: int) -> float:
+    best = min(timeit.repeat(lambda: func(chunks), number=1, repeat=repeat))
+    print(f"  {name:<28}{best * 1000:>10.2f} ms")
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="流式拼接与 think 过滤微基准")
+    parser.add_argument("--size", type=int, default=100_000, help="模拟输出字数")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.size)
+    print(f"输出 {args.size} 字，{len(chunks)} 个 chunk\n")
+
+    print("拼接：")
+    baseline = bench("str += (局部变量)", concat_local, chunks, args.repeat)
+    shared = bench("str += (结果被共享引用)", concat_shared, chunks, args.repeat)
+    accumulated = bench("StreamAccumulator", concat_accumulator, chunks, args.repeat)
+    print(f"  加速比：相对局部 += {baseline / accumulated:.1f}x，相对共享 += {shared / accumulated:.1f}x\n")
+
+    think_chunks = ["<think>", *make_chunks(2000, seed=3), "</think>", *chunks]
+    print("think 过滤：")
+    legacy = bench("逐 chunk split (旧)", legacy_think_filter, think_chunks, args.repeat)
+    machine = bench("ThinkTagFilter", state_machine_filter, think_chunks, args.repeat)
+    print(f"  耗时比：{machine / legacy:.2f}x\n")
+
+    print("正确性（标签跨 chunk）：")
+    check_correctness()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""离线 OpenAI 兼容模拟服务
+
+用于在无网络、无付费 API 的环境中压测后端服务层。支持：
+- 可配置的首 token 延迟与输出速度（tokens/秒）
+- 按概率注入 429（带 Retry-After）与 502 错误
+- 可选在正文前输出 <think> 思考块
+- JSON 模式：系统提示中带 "### Output Format" 模板时按模板回填，
+  否则按提示关键字返回招标解析 / 风险分析 / Go-No-Go / 评分模拟的样例 JSON
+- stream_options.include_usage 时在末尾返回 usage
+- --prefix-cache：模拟服务商的前缀缓存，按块哈希 prompt 前缀，命中部分计入
+  usage.prompt_tokens_details.cached_tokens，且不计入 --prefill-ms-per-1k 的预填充耗时
+
+用法（在 backend 目录下）：
+    python benchmarks/mock_llm_server.py --port 9100 --ttft 0.3 --tokens-per-second 80 --error-429 0.05
+然后把后端配置的 base_url 指向 http://127.0.0.1:9100/v1（api_key 任意）。
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncGenerator, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+OUTPUT_FORMAT_MARKER = "### Output Format\n"
+FILLER_TEXT = (
+    "本项目严格按照招标文件要求组织实施，项目组由具备相应资质的技术人员组成，"
+    "实施过程中建立完善的质量管理与进度控制机制，确保各项指标满足验收标准。"
+)
+
+# 按用户提示中的关键字匹配的 JSON 样例（与 app/agents/tools 中的模板结构一致）
+JSON_FIXTURES: List[tuple] = [
+    ("Go/No-Go", {
+        "decision": True,
+        "score": 82,
+        "reasoning": "企业资质与业绩满足招标要求",
+        "pros": ["同类项目业绩丰富", "本地化服务团队"],
+        "cons": ["报价竞争激烈"],
+        "missing_capabilities": [],
+    }),
+    ("风险分析", {
+        "overall_risk": "medium",
+        "risks": [{
+            "clause": "合同签订后 30 日内完成交付",
+            "description": "工期紧张",
+            "level": "high",
+            "suggestion": "提前备货并明确分阶段验收",
+        }],
+        "summary": "整体风险可控，需重点关注工期条款",
+    }),
+    ("模拟技术和商务评分", {
+        "total_score": 86,
+        "win_probability": "中",
+        "items": [{
+            "item_name": "技术方案",
+            "max_score": 40,
+            "predicted_score": 34,
+            "analysis": "方案完整，针对性一般",
+            "optimization_suggestion": "补充与需求逐条对应的响应说明",
+        }],
+    }),
+    ("提取关键信息", {
+        "project_name": "某市智慧政务平台建设项目",
+        "project_number": "ZB-2024-001",
+        "tender_deadline": "2024-06-30 09:30",
+        "budget": "380万元",
+        "purchaser": "某市政务服务数据管理局",
+        "agency": "某招标代理有限公司",
+        "qualifications": ["具有独立法人资格", "近三年无重大违法记录"],
+        "evaluation_method": "综合评分法",
+        "technical_requirements": ["统一身份认证", "数据共享交换"],
+    }),
+]
+
+
+class MockState:
+    # 前缀缓存最多记录的块数
+    MAX_PREFIX_BLOCKS = 200_000
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.counters: Dict[str, int] = {
+            "requests": 0, "streams": 0, "injected_429": 0, "injected_502": 0,
+            "prompt_tokens": 0, "cached_tokens": 0,
+        }
+        self._prefixes: "OrderedDict[str, None]" = OrderedDict()
+
+    def cached_prefix_tokens(self, prompt_tokens: List[str]) -> int:
+        """返回此前请求中出现过的最长前缀 token 数（按块对累积前缀做哈希）"""
+        if not self.args.prefix_cache:
+            return 0
+        block = self.args.prefix_cache_block
+        digest, cached = hashlib.sha256(), 0
+        for end in range(block, len(prompt_tokens) + 1, block):
+            digest.update("".join(prompt_tokens[end - block:end]).encode("utf-8"))
+            key = digest.hexdigest()
+            if key in self._prefixes:
+                self._prefixes.move_to_end(key)
+                cached = end
+            else:
+                self._prefixes[key] = None
+        while len(self._prefixes) > self.MAX_PREFIX_BLOCKS:
+            self._prefixes.popitem(last=False)
+        return cached if cached >= self.args.prefix_cache_min else 0
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content")
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def _fill_template(template: Any, chapters: int) -> Any:
+    """按 Output Format 模板生成合法输出：顶层列表扩展为 chapters 项"""
+    if isinstance(template, list) and template:
+        items = []
+        for i in range(chapters):
+            item = json.loads(json.dumps(template[0], ensure_ascii=False))
+            if isinstance(item, dict) and "new_title" in item:
+                item["new_title"] = f"第{i + 1}章 技术方案"
+            items.append(item)
+        return items
+    return template
+
+
+def build_reply(body: Dict[str, Any], args: argparse.Namespace) -> str:
+    messages = body.get("messages") or []
+    system = next((_message_text(m) for m in messages if m.get("role") == "system"), "")
+    prompt = "\n".join(_message_text(m) for m in messages)
+    json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+
+    if OUTPUT_FORMAT_MARKER in system:
+        try:
+            template = json.loads(system.split(OUTPUT_FORMAT_MARKER, 1)[1].strip())
+            return json.dumps(_fill_template(template, args.outline_chapters), ensure_ascii=False)
+        except json.JSONDecodeError:
+            pass
+    if json_mode or "JSON" in prompt:
+        for keyword, fixture in JSON_FIXTURES:
+            if keyword in prompt:
+                return json.dumps(fixture, ensure_ascii=False)
+        if json_mode:
+            return json.dumps({"outline": [{"id": "1", "title": "技术方案", "description": "总体技术方案", "children": []}]}, ensure_ascii=False)
+
+    repeat = max(1, args.completion_chars // len(FILLER_TEXT))
+    return FILLER_TEXT * repeat
+
+
+def _split_tokens(text: str) -> List[str]:
+    """按约 1 token 切分：中文 1 字，其余 4 字符"""
+    pieces, buffer = [], ""
+    for ch in text:
+        if "一" <= ch <= "鿿":
+            if buffer:
+                pieces.append(buffer)
+                buffer = ""
+            pieces.append(ch)
+        else:
+            buffer += ch
+            if len(buffer) >= 4:
+                pieces.append(buffer)
+                buffer = ""
+    if buffer:
+        pieces.append(buffer)
+    return pieces
+
+
+def _chunk(completion_id: str, model: str, content: str | None = None, finish: str | None = None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {"content": content} if content is not None else {}, "finish_reason": finish}],
+    }
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="Mock LLM Server")
+    state = MockState(args)
+
+    @app.get("/v1/models")
+    async def list_models() -> dict:
+        return {"object": "list", "data": [{"id": args.model, "object": "model", "owned_by": "mock"}]}
+
+    @app.get("/mock/stats")
+    async def stats() -> dict:
+        return state.counters
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        state.counters["requests"] += 1
+
+        roll = random.random()
+        if roll < args.error_429:
+            state.counters["injected_429"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_error"}},
+                status_code=429,
+                headers={"retry-after": str(args.retry_after)},
+            )
+        if roll < args.error_429 + args.error_502:
+            state.counters["injected_502"] += 1
+            return JSONResponse({"error": {"message": "502 Bad Gateway (mock)"}}, status_code=502)
+
+        model = body.get("model") or args.model
+        reply = build_reply(body, args)
+        prompt_pieces = [piece for m in body.get("messages") or [] for piece in [f"<{m.get('role')}>", *_split_tokens(_message_text(m))]]
+        prompt_tokens = len(prompt_pieces)
+        cached_tokens = state.cached_prefix_tokens(prompt_pieces)
+        state.counters["prompt_tokens"] += prompt_tokens
+        state.counters["cached_tokens"] += cached_tokens
+        # 首 token 延迟 = 固定延迟 + 未命中缓存部分的预填充耗时
+        ttft = args.ttft + (prompt_tokens - cached_tokens) / 1000 * args.prefill_ms_per_1k / 1000
+        tokens = _split_tokens(reply)
+        if args.think:
+            tokens = ["<think>", *_split_tokens("先分析招标要求，再组织回答。"), "</think>", *tokens]
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + len(tokens) / args.tokens_per_second)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        state.counters["streams"] += 1
+
+        async def stream() -> AsyncGenerator[str, None]:
+            await asyncio.sleep(ttft)
+            # 每批至少 5ms，避免高速率下 sleep 精度成为瓶颈
+            batch = max(1, int(args.tokens_per_second * 0.005))
+            for i in range(0, len(tokens), batch):
+                for token in tokens[i:i + batch]:
+                    yield _chunk(completion_id, model, token)
+                await asyncio.sleep(batch / args.tokens_per_second)
+            yield _chunk(completion_id, model, finish="stop")
+            if include_usage:
+                payload = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                           "model": model, "choices": [], "usage": usage}
+                yield f"data: {json.dumps(payload)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="离线 OpenAI 兼容模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--model", default="mock-model")
+    parser.add_argument("--ttft", type=float, default=0.2, help="首 token 延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="每个流的输出速度")
+    parser.add_argument("--completion-chars", type=int, default=600, help="正文类回复的大致字数")
+    parser.add_argument("--outline-chapters", type=int, default=5, help="一级提纲返回的章节数")
+    parser.add_argument("--error-429", type=float, default=0.0, help="注入 429 的概率")
+    parser.add_argument("--error-502", type=float, default=0.0, help="注入 502 的概率")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 响应的 Retry-After（秒）")
+    parser.add_argument("--think", action="store_true", help="在正文前输出 <think> 块")
+    parser.add_argument("--prefix-cache", action="store_true", help="模拟服务商的 prompt 前缀缓存")
+    parser.add_argument("--prefix-cache-block", type=int, default=64, help="前缀缓存的块大小（token）")
+    parser.add_argument("--prefix-cache-min", type=int, default=0, help="命中前缀少于该 token 数时不计缓存")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=0.0, help="每 1k 未缓存 prompt token 的预填充耗时（毫秒）")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    cli_args = parse_args()
+    uvicorn.run(create_app(cli_args), host=cli_args.host, port=cli_args.port, log_level="warning")
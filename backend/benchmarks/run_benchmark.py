@@ -0,0 +1,308 @@
+"""端到端生成压测
+
+按指定并发驱动后端的目录生成、章节流式生成与招标分析接口，统计 p50/p95 延迟、首包延迟与吞吐量。
+
+默认 --spawn：在临时 HOME 下启动模拟 LLM 服务与后端（不触碰本机的用户配置、缓存与任务库），
+整个过程无需网络，适合在 CI 上比对服务层的性能回归：
+    python benchmarks/run_benchmark.py --scenarios outline,chapter,bidding-parse --concurrency 8 --requests 32
+
+压测已启动的后端（需已配置好 LLM）：
+    python benchmarks/run_benchmark.py --no-spawn --backend-url http://127.0.0.1:8000
+
+mock 相关参数（--ttft、--tokens-per-second、--error-429 等）会透传给 mock_llm_server.py。
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+SAMPLE_TENDER = (
+    "某市智慧政务平台建设项目招标公告\n项目编号：ZB-2024-001\n采购人：某市政务服务数据管理局\n"
+    "预算金额：380万元\n投标截止时间：2024年6月30日9时30分\n"
+    "一、资格要求：具有独立法人资格；近三年无重大违法记录。\n"
+    "二、技术要求：统一身份认证、数据共享交换、电子证照库。\n"
+    "三、评标办法：综合评分法，技术部分 60 分，商务部分 10 分，价格 30 分。\n"
+) * 20
+
+SAMPLE_TENDER_INFO = {
+    "project_name": "某市智慧政务平台建设项目",
+    "project_number": "ZB-2024-001",
+    "budget": "380万元",
+    "qualifications": ["具有独立法人资格"],
+    "evaluation_method": "综合评分法",
+    "technical_requirements": ["统一身份认证", "数据共享交换"],
+}
+SAMPLE_COMPANY = "公司成立于2010年，具备 CMMI5 认证，近三年完成政务云项目 12 个。"
+
+
+class Sample:
+    def __init__(self, ok: bool, latency: float, first_byte: Optional[float], error: str = "") -> None:
+        self.ok = ok
+        self.latency = latency
+        self.first_byte = first_byte
+        self.error = error
+
+
+async def _consume_sse(response: httpx.Response, started: float, is_payload: Callable[[dict], bool]) -> tuple[Optional[float], str]:
+    """读取 SSE 直到 [DONE]，返回 (首个有效数据到达时间, 错误信息)"""
+    first_byte, error = None, ""
+    async for line in response.aiter_lines():
+        if not line.startswith("data: "):
+            continue
+        data = line[6:]
+        if data == "[DONE]":
+            break
+        try:
+            event = json.loads(data)
+        except json.JSONDecodeError:
+            continue
+        if event.get("error") or event.get("status") == "error" or event.get("type") == "error":
+            error = event.get("message") or "error event"
+        if first_byte is None and is_payload(event):
+            first_byte = time.perf_counter() - started
+    return first_byte, error
+
+
+def _outline_request(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "overview": "建设统一的智慧政务平台，实现一网通办。",
+        "requirements": "技术方案（30分）；实施计划（10分）；售后服务（10分）；安全保障（10分）",
+        "project_type": "service",
+        "chapter_stream": args.chapter_stream,
+    }
+
+
+def build_scenarios(args: argparse.Namespace) -> Dict[str, Callable[[httpx.AsyncClient], Any]]:
+    async def sse(client: httpx.AsyncClient, path: str, body: dict, is_payload: Callable[[dict], bool]) -> Sample:
+        started = time.perf_counter()
+        async with client.stream("POST", path, json=body) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return Sample(False, time.perf_counter() - started, None, f"HTTP {response.status_code}")
+            first_byte, error = await _consume_sse(response, started, is_payload)
+        return Sample(not error, time.perf_counter() - started, first_byte, error)
+
+    async def post(client: httpx.AsyncClient, path: str, body: dict) -> Sample:
+        started = time.perf_counter()
+        response = await client.post(path, json=body)
+        latency = time.perf_counter() - started
+        ok = response.status_code == 200
+        return Sample(ok, latency, latency, "" if ok else f"HTTP {response.status_code}: {response.text[:200]}")
+
+    def outline_payload(event: dict) -> bool:
+        return bool(event.get("chunk")) or event.get("type") in ("level1", "chapter")
+
+    # 同一父章节下的若干叶子章节轮流请求，共享同一份较长的项目概述（用于观察前缀缓存命中）
+    siblings = [
+        {"id": f"1.1.{i + 1}", "title": title, "description": f"说明{title}的设计与实施要点"}
+        for i, title in enumerate(["总体技术架构", "数据资源体系", "应用支撑平台", "安全保障体系",
+                                   "运维服务方案", "系统集成方案", "培训方案", "质量保障措施"])
+    ]
+    chapter_counter = iter(range(1 << 30))
+
+    def chapter_body() -> dict:
+        return {
+            "chapter": siblings[next(chapter_counter) % len(siblings)],
+            "parent_chapters": [{"id": "1", "title": "技术方案", "description": "整体技术方案"},
+                                {"id": "1.1", "title": "总体设计", "description": "平台总体设计"}],
+            "sibling_chapters": siblings,
+            "project_overview": SAMPLE_TENDER,
+        }
+    analysis_body = {"tender_info": SAMPLE_TENDER_INFO, "company_info": SAMPLE_COMPANY}
+
+    return {
+        "outline": lambda c: sse(c, "/api/outline/generate", _outline_request(args), outline_payload),
+        "chapter": lambda c: sse(c, "/api/content/generate-chapter-stream", chapter_body(),
+                                 lambda e: e.get("status") == "streaming"),
+        "analyze": lambda c: sse(c, "/api/document/analyze-stream",
+                                 {"file_content": SAMPLE_TENDER, "analysis_type": "overview"},
+                                 lambda e: bool(e.get("chunk"))),
+        "bidding-parse": lambda c: post(c, "/api/bidding/parse", {"file_content": SAMPLE_TENDER}),
+        "bidding-risk": lambda c: post(c, "/api/bidding/risk-analysis", {"file_content": SAMPLE_TENDER}),
+        "bidding-gonogo": lambda c: post(c, "/api/bidding/analyze-bid", analysis_body),
+        "bidding-scoring": lambda c: post(c, "/api/bidding/scoring-simulation", analysis_body),
+        "bidding-full": lambda c: sse(c, "/api/bidding/full-analysis",
+                                      {"file_content": SAMPLE_TENDER, "company_info": SAMPLE_COMPANY},
+                                      lambda e: e.get("type") not in (None, "heartbeat", "error")),
+    }
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, call: Callable, requests: int, concurrency: int) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> Sample:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                return await call(client)
+            except Exception as e:
+                return Sample(False, time.perf_counter() - started, None, f"{e.__class__.__name__}: {e}")
+
+    started = time.perf_counter()
+    samples = await asyncio.gather(*(one() for _ in range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies = [s.latency for s in samples if s.ok]
+    first_bytes = [s.first_byte for s in samples if s.ok and s.first_byte is not None]
+    errors = [s.error for s in samples if not s.ok]
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "succeeded": len(latencies),
+        "failed": len(errors),
+        "first_error": errors[0] if errors else "",
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else 0.0,
+        "latency_p50": round(_percentile(latencies, 0.5), 3),
+        "latency_p95": round(_percentile(latencies, 0.95), 3),
+        "first_byte_p50": round(_percentile(first_bytes, 0.5), 3),
+        "first_byte_p95": round(_percentile(first_bytes, 0.95), 3),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"服务未在 {timeout}s 内就绪: {url}")
+
+
+def spawn_services(args: argparse.Namespace, mock_args: List[str]) -> tuple[str, List[subprocess.Popen], tempfile.TemporaryDirectory, int]:
+    """在临时 HOME 下启动 mock LLM 与后端，返回 (后端地址, 进程列表, 临时目录, mock 端口)"""
+    home = tempfile.TemporaryDirectory(prefix="bench_home_")
+    mock_port, backend_port = _free_port(), _free_port()
+    config_dir = Path(home.name) / ".ai_write_helper"
+    config_dir.mkdir(parents=True)
+    (config_dir / "user_config.json").write_text(json.dumps({
+        "api_key": "mock-key",
+        "base_url": f"http://127.0.0.1:{mock_port}/v1",
+        "model_name": "mock-model",
+    }), encoding="utf-8")
+
+    env = {**os.environ, "HOME": home.name, "USERPROFILE": home.name, "NO_PROXY": "127.0.0.1,localhost"}
+    output = None if args.verbose else subprocess.DEVNULL
+    mock = subprocess.Popen(
+        [sys.executable, str(Path(__file__).with_name("mock_llm_server.py")), "--port", str(mock_port), *mock_args],
+        cwd=BACKEND_DIR, env=env, stdout=output, stderr=output,
+    )
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(backend_port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=output, stderr=output,
+    )
+    return f"http://127.0.0.1:{backend_port}", [mock, backend], home, mock_port
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    header = f"{'scenario':<16}{'ok':>6}{'fail':>6}{'rps':>9}{'p50(s)':>9}{'p95(s)':>9}{'ttfb50':>9}{'ttfb95':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['scenario']:<16}{r['succeeded']:>6}{r['failed']:>6}{r['throughput_rps']:>9.2f}"
+              f"{r['latency_p50']:>9.3f}{r['latency_p95']:>9.3f}{r['first_byte_p50']:>9.3f}{r['first_byte_p95']:>9.3f}")
+        if r["first_error"]:
+            print(f"  首个错误: {r['first_error']}")
+
+
+async def main(args: argparse.Namespace, mock_args: List[str]) -> int:
+    processes: List[subprocess.Popen] = []
+    home = None
+    backend_url = args.backend_url
+    try:
+        if args.spawn:
+            backend_url, processes, home, mock_port = spawn_services(args, mock_args)
+            await _wait_ready(f"http://127.0.0.1:{mock_port}/v1/models")
+            await _wait_ready(f"{backend_url}/health")
+
+        scenarios = build_scenarios(args)
+        names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+        unknown = [name for name in names if name not in scenarios]
+        if unknown:
+            print(f"未知场景: {', '.join(unknown)}；可选: {', '.join(scenarios)}")
+            return 2
+
+        headers = {} if args.use_cache else {"X-LLM-Cache": "bypass"}
+        limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency)
+        results = []
+        async with httpx.AsyncClient(base_url=backend_url, headers=headers, limits=limits,
+                                     timeout=httpx.Timeout(args.timeout), trust_env=False) as client:
+            for name in names:
+                results.append(await run_scenario(client, name, scenarios[name], args.requests, args.concurrency))
+            metrics = (await client.get("/metrics")).json() if args.show_metrics else None
+
+        print_report(results)
+        if metrics:
+            print("\n后端 LLM 遥测（按 token 消耗排序）:")
+            for tag in metrics["llm"]["by_tag"]:
+                print(f"  {tag['endpoint']} [{tag['step']}] calls={tag['calls']} tokens={tag['total_tokens']} "
+                      f"ttft_p50={tag['ttft_p50']}s latency_p95={tag['latency_p95']}s retries={tag['retries']} "
+                      f"prompt_cache={tag['prompt_cache_ratio']:.0%}")
+        if args.json:
+            Path(args.json).write_text(json.dumps({"results": results, "metrics": metrics}, ensure_ascii=False, indent=2),
+                                       encoding="utf-8")
+        return 0 if all(r["failed"] == 0 for r in results) or args.allow_failures else 1
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if home is not None:
+            home.cleanup()
+
+
+def parse_args() -> tuple[argparse.Namespace, List[str]]:
+    parser = argparse.ArgumentParser(description="端到端生成压测", epilog="未识别的参数会透传给 mock_llm_server.py")
+    parser.add_argument("--scenarios", default="outline,chapter,bidding-parse,bidding-risk,bidding-gonogo,bidding-scoring",
+                        help="逗号分隔：outline, chapter, analyze, bidding-parse, bidding-risk, bidding-gonogo, bidding-scoring, bidding-full")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=32, help="每个场景的请求数")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--chapter-stream", action="store_true", help="outline 场景使用按章节推送模式")
+    parser.add_argument("--use-cache", action="store_true", help="允许命中 LLM 响应缓存（默认绕过）")
+    parser.add_argument("--spawn", dest="spawn", action="store_true", default=True)
+    parser.add_argument("--no-spawn", dest="spawn", action="store_false", help="压测已启动的后端")
+    parser.add_argument("--backend-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--show-metrics", action="store_true", help="结束后打印后端 /metrics 的 LLM 遥测")
+    parser.add_argument("--json", help="把结果写入 JSON 文件，便于 CI 比对")
+    parser.add_argument("--allow-failures", action="store_true", help="有失败请求时仍返回 0")
+    parser.add_argument("--verbose", action="store_true", help="显示子进程输出")
+    return parser.parse_known_args()
+
+
+if __name__ == "__main__":
+    cli_args, passthrough = parse_args()
+    sys.exit(asyncio.run(main(cli_args, passthrough)))
@@ -6,12 +6,16 @@ import multiprocessing
 if __name__ == "__main__":
     # 确保在正确的目录中运行
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
-    
+
+    workers = multiprocessing.cpu_count() * 2  # CPU核心数的2倍，最大化并发能力
+    # 各 worker 进程按进程数平分 LLM 额度与解析进程池等资源上限（见 config.py）
+    os.environ["WORKER_PROCESSES"] = str(workers)
+
     uvicorn.run(
         "app.main:app",
         host="127.0.0.1",
         port=8000,
         reload=False,  # 多进程模式下不支持reload
         log_level="info",
-        workers=multiprocessing.cpu_count() * 2  # CPU核心数的2倍，最大化并发能力
+        workers=workers
     )
\ No newline at end of file